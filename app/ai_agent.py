@@ -1,114 +1,436 @@
 import os
-import base64
+import asyncio
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from dotenv import load_dotenv
+import httpx
+from .cache import TTLCache
+from .credentials import get_imagen_token_provider
+from .http_client import get_http_client
+from .llm_providers import PLACEHOLDER_IMAGE_BASE64, Completion, LLMProvider, Prompt, StubProvider
+from .llm_router import model_router
+from .logging_config import log_payload
+from .metrics import observe_llm_call, observe_model_latency, record_llm_error, record_llm_usage
+from .prompts import estimate_tokens
+from .tracing import set_current_span_attributes, set_span_status_error, start_span
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+logger = logging.getLogger(__name__)
 
 # The PERSONALITY_PROMPTS dictionary is removed as this logic is now handled by get_personality_prompt in utils.py
 # The AIAgent class is removed as it's stateful and not suitable for the new API design.
 # A new stateless function call_gemini_api is added.
 
-# Initialize the generative model globally or ensure it's initialized before use.
-# It's good practice to initialize this once if the model doesn't change.
-try:
-    model = genai.GenerativeModel("gemini-2.5-flash-lite-preview-06-17") # Using gemini-1.5-flash as per original, updated to latest
-except Exception as e:
-    print(f"Error initializing GenerativeModel: {e}")
-    # Potentially raise the error or handle it as per application requirements
-    # For now, we'll let it proceed, and it will fail at the point of use if 'model' is not set.
-    model = None
-
-async def call_gemini_api(full_prompt: str) -> str:
+# LLM_PROVIDER picks the backend for every model call: "gemini" (Gemini and Imagen) or
+# "stub" (canned responses, no network; see llm_providers.StubProvider)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+
+# Point Gemini at another host (a local stand-in for benchmarks, or a proxy); the REST
+# transport is used then, since the default gRPC transport needs TLS
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite-preview-06-17")
+
+# The default Gemini model handle, set up by GeminiProvider (None under other providers,
+# or if initialization failed)
+model = None
+
+def _configure_gemini() -> None:
+    global model
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"), transport="rest",
+                        client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    try:
+        model = genai.GenerativeModel(GEMINI_MODEL)
+    except Exception as e:
+        logger.error("Error initializing GenerativeModel: %s", e)
+        # Calls report the AI service as not configured
+        model = None
+
+# The google-generativeai SDK is synchronous, so LLM calls run on a dedicated,
+# bounded thread pool instead of the event loop (or the default executor that
+# FastAPI shares with every sync route).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+_llm_stats_lock = threading.Lock()
+_llm_stats = {
+    "in_flight": 0,
+    "queued": 0,
+    "max_queue_depth": 0,
+    "completed": 0,
+    "failed": 0,
+    "cancelled": 0,
+}
+
+def configure_llm_pool(max_concurrency: int) -> None:
+    """Resize the LLM worker pool. Calls already submitted finish on the old pool."""
+    global _llm_executor, LLM_MAX_CONCURRENCY
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    old_executor = _llm_executor
+    LLM_MAX_CONCURRENCY = max_concurrency
+    _llm_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+    old_executor.shutdown(wait=False)
+
+def get_llm_pool_stats() -> dict:
+    """Snapshot of the LLM pool: configured size, running calls and queue depth."""
+    with _llm_stats_lock:
+        stats = dict(_llm_stats)
+    stats["max_concurrency"] = LLM_MAX_CONCURRENCY
+    return stats
+
+async def run_in_llm_pool(func, *args, **kwargs):
     """
-    Calls the Gemini API with the given prompt and returns the response text.
-    This is an asynchronous function.
+    Run a blocking LLM SDK call on the LLM pool and await its result.
+    Cancelling the await before a pool thread picks the call up means it never runs.
     """
-    if model is None:
-        # This can happen if the genai.configure(api_key=...) failed or
-        # genai.GenerativeModel(...) failed during startup.
-        # Consider how to handle this robustly - e.g., re-initialize or raise an error.
-        # For now, returning an error message.
+    with _llm_stats_lock:
+        _llm_stats["queued"] += 1
+        _llm_stats["max_queue_depth"] = max(_llm_stats["max_queue_depth"], _llm_stats["queued"])
+    started = abandoned = False
+
+    def _run():
+        nonlocal started
+        with _llm_stats_lock:
+            if abandoned:
+                return None
+            started = True
+            _llm_stats["queued"] -= 1
+            _llm_stats["in_flight"] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with _llm_stats_lock:
+                _llm_stats["in_flight"] -= 1
+
+    loop = asyncio.get_running_loop()
+    # Carry the request's context (log request id, current span) onto the pool thread
+    future = loop.run_in_executor(_llm_executor, contextvars.copy_context().run, _run)
+    try:
+        result = await future
+    except asyncio.CancelledError:
+        with _llm_stats_lock:
+            if not started:
+                abandoned = True
+                _llm_stats["queued"] -= 1
+            _llm_stats["cancelled"] += 1
+        raise
+    except BaseException:
+        with _llm_stats_lock:
+            _llm_stats["failed"] += 1
+        raise
+    with _llm_stats_lock:
+        _llm_stats["completed"] += 1
+    return result
+
+# One model handle per system instruction (persona and prompt version), so the persona
+# travels as a system_instruction instead of being prepended to every user prompt.
+# With GEMINI_CONTEXT_CACHE_TTL_SECONDS set, instructions long enough for Gemini's context
+# caching are uploaded once as cached content and billed at the cached-token rate.
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "0"))
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+
+_model_handles = TTLCache(
+    maxsize=int(os.getenv("MODEL_HANDLE_CACHE_SIZE", "256")),
+    # Handles backed by cached content are replaced a minute before the cache expires
+    ttl=max(GEMINI_CONTEXT_CACHE_TTL_SECONDS - 60, 60) if GEMINI_CONTEXT_CACHE_TTL_SECONDS > 0 else 86400
+)
+# Per-key creation locks, held only while a handle is being created
+_model_handle_locks = {}
+_model_handle_locks_lock = threading.Lock()
+_model_stats_lock = threading.Lock()
+_model_stats = {
+    "context_caches_created": 0,
+    "context_cache_failures": 0,
+}
+
+def _create_model_handle(system_instruction: Optional[str], model_name: str = GEMINI_MODEL):
+    if system_instruction and GEMINI_CONTEXT_CACHE_TTL_SECONDS > 0 \
+            and estimate_tokens(system_instruction) >= GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+        try:
+            cached_content = genai.caching.CachedContent.create(
+                model=model_name,
+                system_instruction=system_instruction,
+                ttl=timedelta(seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+            )
+            handle = genai.GenerativeModel.from_cached_content(cached_content)
+            with _model_stats_lock:
+                _model_stats["context_caches_created"] += 1
+            return handle
+        except Exception as e:
+            # Not every model version supports explicit caching
+            logger.warning("Context caching unavailable, using a plain system instruction: %s", e)
+            with _model_stats_lock:
+                _model_stats["context_cache_failures"] += 1
+    return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+def get_model_for(system_instruction: Optional[str] = None, model_name: Optional[str] = None):
+    """
+    The handle for a model (GEMINI_MODEL by default) and system instruction; the default
+    handle for the default model without one.
+    May create a context cache over the network, so call it from the LLM pool.
+    """
+    model_name = model_name or GEMINI_MODEL
+    if model is None or (model_name == GEMINI_MODEL and not system_instruction):
+        return model
+    key = hashlib.sha256(f"{model_name}\0{system_instruction or ''}".encode("utf-8")).hexdigest()
+    handle = _model_handles.get(key)
+    if handle is not None:
+        return handle
+    # Concurrent first calls for a key wait for one creation instead of each uploading
+    # its own cached content
+    with _model_handle_locks_lock:
+        lock = _model_handle_locks.setdefault(key, threading.Lock())
+    with lock:
+        handle = _model_handles.get(key)
+        if handle is None:
+            handle = _create_model_handle(system_instruction, model_name)
+            _model_handles.set(key, handle)
+    with _model_handle_locks_lock:
+        _model_handle_locks.pop(key, None)
+    return handle
+
+def get_model_stats() -> dict:
+    """
+    The provider, its models and its counters (handle and context caches for Gemini), and
+    which models served calls with their recent latencies, for /stats
+    """
+    provider = get_llm_provider()
+    return {
+        "provider": provider.name,
+        "model": provider.chat_model,
+        "image_model": provider.image_model,
+        **provider.stats(),
+        "routing": model_router.stats(),
+    }
+
+def _generate(prompt: Prompt, system_instruction: Optional[str] = None, model_name: Optional[str] = None, **kwargs):
+    return get_model_for(system_instruction, model_name).generate_content(prompt, **kwargs)
+
+def _response_text(response) -> str:
+    text = response.text if response else ""
+    if not text:
+        # Sometimes the text is empty but candidates carry content or safety ratings
+        logger.warning("Gemini response text is empty", extra={"candidates": getattr(response, "candidates", None)})
+    return text or ""
+
+def _usage_counts(usage_metadata):
+    counts = (getattr(usage_metadata, "prompt_token_count", None), getattr(usage_metadata, "candidates_token_count", None))
+    return tuple(count if isinstance(count, int) else None for count in counts)
+
+def _generate_response(provider: LLMProvider, prompt, system_instruction: Optional[str] = None,
+                       model_name: Optional[str] = None) -> Completion:
+    """A complete (non-streaming) generation, timed and with its token usage recorded"""
+    model_name = model_name or provider.chat_model
+    start = time.perf_counter()
+    with start_span(f"{provider.name}.generate", **{"gen_ai.request.model": model_name}) as span, \
+            observe_llm_call(provider.name, "generate"):
+        completion = provider.generate(prompt, system_instruction, model_name)
+        _set_usage_attributes(span, completion)
+    # Recorded here rather than by the caller, so hedges that lost still count
+    elapsed = time.perf_counter() - start
+    model_router.record_latency(model_name, elapsed)
+    observe_model_latency(provider.name, model_name, elapsed)
+    record_llm_usage(provider.name, completion.prompt_tokens, completion.output_tokens)
+    return completion
+
+async def _routed_generate(provider: LLMProvider, prompt, system_instruction: Optional[str] = None) -> Completion:
+    """_generate_response on the LLM pool, with hedging and fallback across models"""
+    completion, model_name, role = await model_router.run(
+        provider.name, provider.chat_model,
+        lambda model_name: run_in_llm_pool(_generate_response, provider, prompt, system_instruction, model_name)
+    )
+    set_current_span_attributes({"gen_ai.response.model": model_name, "llm.route": role})
+    return completion
+
+def _set_usage_attributes(span, completion: Optional[Completion]) -> None:
+    if completion is None:
+        return
+    for count, key in ((completion.prompt_tokens, "gen_ai.usage.input_tokens"),
+                       (completion.output_tokens, "gen_ai.usage.output_tokens")):
+        if count is not None:
+            span.set_attribute(key, count)
+
+async def call_gemini_api(full_prompt: str, system_instruction: Optional[str] = None) -> str:
+    """
+    Calls the configured provider (Gemini unless LLM_PROVIDER says otherwise) with the
+    given prompt and returns the response text, or an error message.
+    The blocking SDK call runs on the LLM pool, so the event loop stays free.
+    """
+    provider = get_llm_provider()
+    if not provider.is_configured():
         # In a real app, you might want to raise an HTTPException for FastAPI.
-        print("Error: GenerativeModel is not initialized.")
+        logger.error("LLM provider %s is not initialized", provider.name)
         return "Error: AI service is not configured."
 
     try:
-        # Assuming generate_content can be awaited if the SDK supports async,
-        # or it needs to be run in a thread pool if it's blocking.
-        # The google-generativeai library's generate_content is synchronous.
-        # To make this function truly async and non-blocking for FastAPI,
-        # the synchronous call should be wrapped with something like asyncio.to_thread.
-        # For simplicity in this step, we'll call it directly.
-        # If performance issues arise, this is an area for optimization.
-
-        # response = await asyncio.to_thread(model.generate_content, full_prompt) # Example for true async
-        response = model.generate_content(full_prompt) # Synchronous call
-
-        # Ensure there's content and text before trying to access.
-        if response and response.text:
-            return response.text
-        elif response and not response.text and response.candidates:
-            # Sometimes the text might be empty but candidates might have content or safety issues
-            # Log or handle as per requirements if parts or candidates exist
-            print(f"Warning: Gemini response text is empty. Candidates: {response.candidates}")
-            return "AI model returned an empty response."
-        else:
-            print("Warning: Gemini response or response.text is empty.")
-            return "AI model returned an empty or unexpected response."
+        completion = await _routed_generate(provider, full_prompt, system_instruction)
+        if completion.text:
+            return completion.text
+        return "AI model returned an empty response."
     except Exception as e:
-        print(f"Error calling Gemini API: {e}")
+        logger.error("Error calling %s: %s", provider.name, e)
         # In a FastAPI app, you might raise an HTTPException here.
         return f"Error communicating with AI service: {str(e)}"
 
+async def generate_text(prompt: Prompt, system_instruction: Optional[str] = None) -> str:
+    """
+    Like call_gemini_api, but raises instead of returning an error message, for callers
+    that must not mistake an error for model output (e.g. conversation summaries).
+    """
+    provider = get_llm_provider()
+    if not provider.is_configured():
+        raise RuntimeError("AI service is not configured.")
+    completion = await _routed_generate(provider, prompt, system_instruction)
+    if not completion.text:
+        raise RuntimeError("AI model returned an empty response.")
+    return completion.text
+
+_STREAM_END = object()
+
+async def stream_gemini_api(full_prompt: Prompt, system_instruction: Optional[str] = None):
+    """
+    Streams the configured provider's response for the given prompt, yielding text chunks
+    as they arrive. The blocking stream iterator runs on the LLM pool and feeds an asyncio queue.
+    A model that fails or times out before its first chunk falls back to the next one in
+    LLM_FALLBACK_MODELS; streams are not hedged, and once text has been yielded errors
+    propagate to the caller.
+    Raises RuntimeError if the provider is not configured; SDK errors propagate to the caller.
+    """
+    provider = get_llm_provider()
+    if not provider.is_configured():
+        logger.error("LLM provider %s is not initialized", provider.name)
+        raise RuntimeError("AI service is not configured.")
+
+    models = model_router.models(provider.chat_model)
+    for index, model_name in enumerate(models):
+        role = "primary" if index == 0 else "fallback"
+        started = False
+        try:
+            async for text in _stream_model(provider, model_name, full_prompt, system_instruction):
+                if not started:
+                    started = True
+                    model_router.record_attempt(provider.name, model_name, "ok")
+                    model_router.record_served(provider.name, model_name, role)
+                    set_current_span_attributes({"gen_ai.response.model": model_name, "llm.route": role})
+                yield text
+        except Exception as e:
+            if started:
+                raise
+            model_router.record_attempt(provider.name, model_name, "timeout" if isinstance(e, TimeoutError) else "error")
+            if index == len(models) - 1:
+                raise
+            logger.warning("Model %s failed before streaming, falling back to %s: %s", model_name, models[index + 1], e)
+            continue
+        if not started:
+            # An empty reply still counts as answered
+            model_router.record_attempt(provider.name, model_name, "ok")
+            model_router.record_served(provider.name, model_name, role)
+        return
+
+async def _stream_model(provider: LLMProvider, model_name: str, full_prompt: Prompt, system_instruction: Optional[str]):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def _put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # The event loop is gone (client disconnected during shutdown)
+            stop.set()
+
+    def _produce():
+        usage = Completion("", model_name)
+        try:
+            with start_span(f"{provider.name}.stream", **{"gen_ai.request.model": model_name}) as span, \
+                    observe_llm_call(provider.name, "stream"):
+                for chunk in provider.stream(full_prompt, system_instruction, model_name):
+                    if stop.is_set():
+                        break
+                    # Each chunk carries the running totals; the last one has the final counts
+                    usage.prompt_tokens = chunk.prompt_tokens if chunk.prompt_tokens is not None else usage.prompt_tokens
+                    usage.output_tokens = chunk.output_tokens if chunk.output_tokens is not None else usage.output_tokens
+                    if chunk.text:
+                        _put(chunk.text)
+                _set_usage_attributes(span, usage)
+            record_llm_usage(provider.name, usage.prompt_tokens, usage.output_tokens)
+        finally:
+            _put(_STREAM_END)
+
+    producer = asyncio.ensure_future(run_in_llm_pool(_produce))
+    first_chunk_timeout = model_router.attempt_timeout or None
+    try:
+        while True:
+            if first_chunk_timeout:
+                try:
+                    item = await asyncio.wait_for(queue.get(), first_chunk_timeout)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"{model_name} sent nothing within {first_chunk_timeout:g}s") from None
+                first_chunk_timeout = None
+            else:
+                item = await queue.get()
+            if item is _STREAM_END:
+                break
+            yield item
+        # Re-raise any error from the SDK iterator
+        await producer
+    finally:
+        stop.set()
+        if not producer.done():
+            producer.cancel()
+
+IMAGEN_MODEL = "imagen-4.0-generate-preview-06-06"
+IMAGEN_API_ENDPOINT = os.getenv("IMAGEN_API_ENDPOINT", "https://us-central1-aiplatform.googleapis.com").rstrip("/")
+
 async def generate_image_with_imagen(prompt: str) -> str:
     """
-    Generates an image using Imagen REST API based on the provided prompt.
-    Returns the URL of the generated image or an error message.
+    Generates an image with the configured provider (Imagen's REST API for Gemini).
+    Returns a data URI of the generated image or an error message.
     """
+    provider = get_llm_provider()
+    with start_span(f"{provider.name}.generate_image", **{"gen_ai.request.model": provider.image_model}) as span:
+        result = await provider.generate_image(prompt)
+        if result.startswith("Error"):
+            set_span_status_error(span, result)
+        return result
+
+async def _generate_image_with_imagen(prompt: str) -> str:
     try:
         # Check if Google Cloud credentials are available from environment variable
-        encoded_credentials = os.getenv("GOOGLE_CLOUD_CREDENTIALS")
-        if not encoded_credentials:
-            print("Google Cloud credentials not found. Using placeholder image for development.")
+        if not os.getenv("GOOGLE_CLOUD_CREDENTIALS"):
+            logger.warning("Google Cloud credentials not found, using a placeholder image")
             # Return a simple base64 encoded placeholder image
             # Simple 1x1 pixel PNG image with blue background
-            placeholder_base64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+            placeholder_base64 = PLACEHOLDER_IMAGE_BASE64
             return f"data:image/png;base64,{placeholder_base64}"
         
-        import requests
-        import json
-        from google.oauth2 import service_account
-        from google.auth.transport.requests import Request
-        
         # Get project ID
         project_id = os.getenv("GOOGLE_CLOUD_PROJECT_ID", "gen-lang-client-0204395031")
         
-        # Decode the base64 credentials and load service account credentials
+        # The service account is decoded once per process and its token reused until near expiry
         try:
-            # Decode the base64 string
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-            
-            # Parse the JSON
-            credentials_dict = json.loads(decoded_credentials)
-            
-            # Create credentials from dictionary
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_dict,
-                scopes=['https://www.googleapis.com/auth/cloud-platform']
-            )
-            credentials.refresh(Request())
-            access_token = credentials.token
+            with start_span("imagen.access_token"):
+                access_token = await get_imagen_token_provider().get_token()
         except Exception as e:
-            print(f"Error getting access token: {e}")
+            logger.error("Error getting access token: %s", e)
             # Return a simple base64 encoded placeholder image
             # Simple 1x1 pixel PNG image with blue background
-            placeholder_base64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+            placeholder_base64 = PLACEHOLDER_IMAGE_BASE64
             return f"data:image/png;base64,{placeholder_base64}"
         
         # Prepare the request
-        url = f"https://us-central1-aiplatform.googleapis.com/v1/projects/{project_id}/locations/us-central1/publishers/google/models/imagen-4.0-generate-preview-06-06:predict"
+        url = f"{IMAGEN_API_ENDPOINT}/v1/projects/{project_id}/locations/us-central1/publishers/google/models/{IMAGEN_MODEL}:predict"
         
         headers = {
             "Authorization": f"Bearer {access_token}",
@@ -127,8 +449,11 @@ async def generate_image_with_imagen(prompt: str) -> str:
         }
         
         # Make the request
-        print(f"🖼️ Generating image with prompt: {prompt}")
-        response = requests.post(url, headers=headers, json=data)
+        log_payload(logger, "Generating image", prompt=prompt)
+        with start_span("imagen.predict", **{"gen_ai.request.model": IMAGEN_MODEL}) as predict_span, \
+                observe_llm_call("imagen", "predict"):
+            response = await get_http_client().post(url, headers=headers, json=data)
+            predict_span.set_attribute("http.response.status_code", response.status_code)
         
         if response.status_code == 200:
             result = response.json()
@@ -137,18 +462,81 @@ async def generate_image_with_imagen(prompt: str) -> str:
                 image_data = result["predictions"][0]["bytesBase64Encoded"]
                 return f"data:image/png;base64,{image_data}"
             else:
-                print("No predictions in response")
+                record_llm_error("imagen", "predict")
+                logger.warning("No predictions in Imagen response")
                 return "Error: No images were generated."
         else:
-            print(f"Error: {response.status_code} - {response.text}")
+            record_llm_error("imagen", "predict")
+            logger.error("Imagen returned %s", response.status_code, extra={"body": response.text[:500]})
             return f"Error: {response.status_code} - {response.text}"
             
+    except httpx.TimeoutException as e:
+        logger.warning("Timed out calling Imagen: %r", e)
+        return "Error: Image generation timed out."
     except ImportError as e:
-        print(f"Error: Required libraries not installed: {e}")
+        logger.error("Required libraries not installed: %s", e)
         return "Error: Image generation library not installed."
     except Exception as e:
-        print(f"Error generating image with Imagen: {e}")
+        logger.exception("Error generating image with Imagen")
         # Fallback to placeholder image
         # Simple 1x1 pixel PNG image with blue background
-        placeholder_base64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
-        return f"data:image/png;base64,{placeholder_base64}"
\ No newline at end of file
+        placeholder_base64 = PLACEHOLDER_IMAGE_BASE64
+        return f"data:image/png;base64,{placeholder_base64}"
+
+class GeminiProvider(LLMProvider):
+    """Gemini through google-generativeai for text, Imagen's REST API for images"""
+
+    name = "gemini"
+    chat_model = GEMINI_MODEL
+    image_model = IMAGEN_MODEL
+
+    def __init__(self):
+        _configure_gemini()
+
+    def is_configured(self) -> bool:
+        return model is not None
+
+    def generate(self, prompt: Prompt, system_instruction: Optional[str] = None, model_name: Optional[str] = None) -> Completion:
+        response = _generate(prompt, system_instruction, model_name)
+        return Completion(_response_text(response), model_name or GEMINI_MODEL,
+                          *_usage_counts(getattr(response, "usage_metadata", None)))
+
+    def stream(self, prompt: Prompt, system_instruction: Optional[str] = None, model_name: Optional[str] = None):
+        for chunk in _generate(prompt, system_instruction, model_name, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) raise on .text
+                text = ""
+            yield Completion(text, model_name or GEMINI_MODEL, *_usage_counts(getattr(chunk, "usage_metadata", None)))
+
+    async def generate_image(self, prompt: str) -> str:
+        return await _generate_image_with_imagen(prompt)
+
+    def stats(self) -> dict:
+        with _model_stats_lock:
+            stats = dict(_model_stats)
+        return {
+            "context_cache_ttl_seconds": GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+            "handles": _model_handles.stats(),
+            **stats,
+        }
+
+def create_llm_provider(name: str) -> LLMProvider:
+    """The provider for an LLM_PROVIDER value"""
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "stub":
+        return StubProvider.from_env()
+    raise ValueError(f"Unknown LLM_PROVIDER {name!r} (expected gemini or stub)")
+
+_llm_provider = create_llm_provider(LLM_PROVIDER)
+
+def get_llm_provider() -> LLMProvider:
+    return _llm_provider
+
+def set_llm_provider(provider: LLMProvider) -> LLMProvider:
+    """Swap the provider for later calls (tests, benchmarks); returns the previous one"""
+    global _llm_provider
+    previous, _llm_provider = _llm_provider, provider
+    return previous
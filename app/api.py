@@ -1,35 +1,96 @@
-from fastapi import FastAPI, HTTPException, Depends, Path
+from fastapi import FastAPI, HTTPException, Depends, Path, Query, Request, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from sqlalchemy import func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
+import asyncio
+import base64
+from contextlib import asynccontextmanager, contextmanager
 from dotenv import load_dotenv
 from sqlalchemy.exc import NoResultFound
-from datetime import date
+from datetime import date, datetime
 
-from .ai_agent import call_gemini_api, generate_image_with_imagen
-from .database import SessionLocal, engine
-from .models import Base, User, Goal, Footprint, Path as PathModel
-from .auth import authenticate_user, create_user, create_access_token, verify_token
-from .utils import get_personalized_coach_prompt
+from .ai_agent import (
+    call_gemini_api, generate_text, stream_gemini_api, generate_image_with_imagen, get_llm_pool_stats, get_model_stats,
+    get_llm_provider, PLACEHOLDER_IMAGE_BASE64
+)
+from .database import AsyncSessionLocal, async_engine, engine, get_db, get_async_db, get_pool_stats
+from .models import Base, User, Goal, Footprint, Message, Path as PathModel
+from .migrations import ensure_columns, missing_indexes, backfill_ocean_scores
+from .auth import (
+    authenticate_user, create_user, create_access_token,
+    Principal, get_request_token, get_optional_principal, get_current_principal, profile_cache
+)
+from .utils import get_personalized_coach_prompt, normalize_dream
+from .prompts import prompt_registry, chat_persona_prompt, estimate_tokens
+from .cache import TTLCache
+from .image_store import image_store, prompt_key
+from .http_client import start_http_client, close_http_client, get_http_client_stats
+from .footprint_service import persist_footprints, apply_footprint_batch, footprint_to_dict, PersistResult, DEFAULT_PATH_COLOR
+from .pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
+from .streaming import FootprintStreamParser, format_sse
+from .conversation_service import (
+    ChatContext, open_conversation, build_context, append_turn, summarize_conversation, message_to_dict
+)
+from .metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, mark_worker_stopped, observe_stage, render_metrics
+from .tracing import TracingMiddleware, configure_tracing, start_span, trace_engine
+from .logging_config import REQUEST_ID_HEADER, RequestIdMiddleware, configure_logging, get_logging_stats, log_payload
 import json
+import logging
 # from .supabase_config import get_supabase_client
 
 # Load environment variables
 load_dotenv()
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
+if configure_tracing():
+    trace_engine(engine)
+    trace_engine(async_engine.sync_engine)
+
 # Create database tables (with error handling)
 try:
     Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created successfully")
+    added_columns = ensure_columns(engine)
+    if added_columns:
+        logger.info("Added missing columns", extra={"columns": added_columns})
+    logger.info("Database tables created successfully")
 except Exception as e:
-    print(f"⚠️  Warning: Could not create database tables: {e}")
-    print("   The app will continue but some features may not work properly")
+    logger.warning("Could not create database tables, some features may not work: %s", e)
 
-app = FastAPI(title="Omeyo AI Agent", version="1.0.0")
+# Building an index locks writes to its table and every worker runs this module, so
+# startup only reports missing indexes; python -m app.migrations builds them concurrently
+try:
+    pending_indexes = [index.name for index in missing_indexes(engine)]
+    if pending_indexes:
+        logger.warning("Missing indexes, run python -m app.migrations to create them",
+                       extra={"indexes": pending_indexes})
+except Exception as e:
+    logger.warning("Could not check for missing indexes: %s", e)
+
+try:
+    backfilled_users = backfill_ocean_scores(engine)
+    if backfilled_users:
+        logger.info("Backfilled OCEAN scores", extra={"users": backfilled_users})
+except Exception as e:
+    logger.warning("Could not backfill OCEAN scores: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One keep-alive HTTP client per worker for outbound Imagen calls
+    await start_http_client()
+    yield
+    await close_http_client()
+    mark_worker_stopped()
+
+app = FastAPI(title="Omeyo AI Agent", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -38,15 +99,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REQUEST_ID_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+# Outermost, so every response (including CORS preflights) carries a request id
+app.add_middleware(RequestIdMiddleware)
 
 # Mount static files (commented out since static directory doesn't exist)
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 
+FOOTPRINT_BATCH_MAX_OPERATIONS = int(os.getenv("FOOTPRINT_BATCH_MAX_OPERATIONS", "500"))
+
 # Pydantic models for API
 class ChatMessage(BaseModel):
     message: str
     personality: str = "coach"
+    # Continue a stored conversation (authenticated users); omit to start a new one
+    conversation_id: Optional[int] = None
 
 class ImageGenerationRequest(BaseModel):
     prompt: str
@@ -55,11 +125,11 @@ class UserCreate(BaseModel):
     name: str
     email: str
     password: str
-    personality: str = None
-    totem_animal: str = None
-    totem_emoji: str = None
-    totem_title: str = None
-    ocean_scores: dict = None
+    personality: Optional[str] = None
+    totem_animal: Optional[str] = None
+    totem_emoji: Optional[str] = None
+    totem_title: Optional[str] = None
+    ocean_scores: Optional[dict] = None
 
 class UserLogin(BaseModel):
     email: str
@@ -69,11 +139,12 @@ class UserResponse(BaseModel):
     id: int
     name: str
     email: str
-    personality: str = None
-    totem_animal: str = None
-    totem_emoji: str = None
-    totem_title: str = None
-    ocean_scores: dict = None
+    personality: Optional[str] = None
+    totem_animal: Optional[str] = None
+    totem_emoji: Optional[str] = None
+    totem_title: Optional[str] = None
+    ocean_scores: Optional[dict] = None
+    coach_personality: Optional[str] = None
 
 class GoalCreate(BaseModel):
     user_id: int
@@ -99,6 +170,14 @@ class FootprintResponse(BaseModel):
     is_completed: bool
     priority: int
 
+class FootprintOperation(BaseModel):
+    op: Literal["create", "complete", "delete"]
+    id: Optional[int] = None
+    footprint: Optional[FootprintCreate] = None
+
+class FootprintBatchRequest(BaseModel):
+    operations: List[FootprintOperation] = Field(..., max_length=FOOTPRINT_BATCH_MAX_OPERATIONS)
+
 class PathCreate(BaseModel):
     user_id: int
     name: str
@@ -115,14 +194,7 @@ class PathResponse(BaseModel):
     is_completed: bool
     created_at: str
     footprints: List[FootprintResponse] = []
-
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    footprint_errors: List[dict] = []
 
 @app.get("/")
 async def read_root():
@@ -142,160 +214,256 @@ async def test_supabase():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Supabase error: {str(e)}")
 
+def _build_chat_prompt(chat_data: ChatMessage, user: Optional[Principal]):
+    """
+    Build (system_instruction, prompt) for a chat turn from the authenticated user's profile.
+    The persona goes in the system instruction so its model handle (and any context cache)
+    is reused across turns; the prompt is only the user's message.
+    """
+    ocean_scores = user.ocean_scores if user else None
+    totem_profile = user.totem_profile if user else None
+    
+    # Use personalized coach prompt if user data is available, otherwise fall back to manual selection
+    if ocean_scores:
+        personality_instruction = get_personalized_coach_prompt(ocean_scores, totem_profile, user.coach_personality)
+    else:
+        personality_instruction = chat_persona_prompt(chat_data.personality)
+
+    full_prompt = chat_data.message
+
+    logger.debug("Chat prompt built", extra={
+        "personalized": ocean_scores is not None,
+        "personality": chat_data.personality,
+        "authenticated": user is not None,
+        "totem": user.totem_title if user else None,
+        "instruction_tokens": estimate_tokens(personality_instruction),
+    })
+    log_payload(logger, "Chat prompt", system_instruction=personality_instruction, user_message=full_prompt)
+
+    return personality_instruction, full_prompt
+
+CHAT_PATH_NAME = 'Personal Journey'
+CHAT_PATH_COLOR = 'bg-blue-100 text-blue-800'
+
+def _save_chat_footprints(db: Session, user_id: int, footprints_data: list) -> PersistResult:
+    """Persist footprints suggested in a chat reply in one transaction"""
+    if isinstance(footprints_data, dict):
+        footprints_data = [footprints_data]
+    return persist_footprints(
+        db, user_id, footprints_data,
+        path_name=CHAT_PATH_NAME,
+        path_color=CHAT_PATH_COLOR,
+        priority=1
+    )
+
+def _load_chat_context(db: Session, user_id: int, chat_data: ChatMessage):
+    conversation = open_conversation(db, user_id, chat_data.conversation_id)
+    context = build_context(db, conversation, reserve_tokens=estimate_tokens(chat_data.message))
+    return conversation.id, context
+
+@contextmanager
+def _chat_stage(endpoint: str, stage: str):
+    """A span for one stage of a chat turn, also recorded in the stage latency histogram"""
+    with start_span(f"{endpoint}.{stage}"), observe_stage(endpoint, stage):
+        yield
+
+def _timed_principal(endpoint: str):
+    """get_optional_principal, recorded as the auth stage of a chat endpoint"""
+    async def dependency(token: Optional[str] = Depends(get_request_token), db: AsyncSession = Depends(get_async_db)):
+        with _chat_stage(endpoint, "auth"):
+            return await get_optional_principal(token, db)
+    return dependency
+
+async def _open_chat_context(db: AsyncSession, chat_data: ChatMessage, user: Optional[Principal]):
+    """
+    The conversation id and packed history for an authenticated chat turn; (None, None) for
+    guests. A new conversation has no id and an empty context until append_turn stores it.
+    """
+    if user is None:
+        return None, None
+    if chat_data.conversation_id is None:
+        # Nothing to read, and nothing is written before the model has answered
+        return None, ChatContext()
+    return await db.run_sync(_load_chat_context, user.id, chat_data)
+
 @app.post("/chat")
-async def chat_with_agent(chat_data: ChatMessage, token: Optional[str] = None, db: Session = Depends(get_db)):
-    """Chat with the AI agent"""
+async def chat_with_agent(chat_data: ChatMessage, background_tasks: BackgroundTasks, user: Optional[Principal] = Depends(_timed_principal("chat")), db: AsyncSession = Depends(get_async_db)):
+    """
+    Chat with the AI agent. Turns of authenticated users are stored: pass the returned
+    conversation_id to continue, and only the new message needs to be sent.
+    """
+    with _chat_stage("chat", "prompt_build"):
+        conversation_id, context = await _open_chat_context(db, chat_data, user)
+        try:
+            system_instruction, full_prompt = _build_chat_prompt(chat_data, user)
+            if context is not None:
+                full_prompt = context.contents(full_prompt)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"AI Agent error: {str(e)}")
     try:
-        # Get user data if token is provided
-        user = None
-        ocean_scores = None
-        totem_profile = None
-        
-        if token:
-            payload = verify_token(token)
-            if payload and payload.get("sub"):
-                user = db.query(User).filter(User.email == payload["sub"]).first()
-                if user:
-                    # Parse ocean_scores if available
-                    if user.ocean_scores:
-                        try:
-                            ocean_scores = json.loads(user.ocean_scores)
-                        except:
-                            ocean_scores = None
-                    # Build full totem_profile dict if possible
-                    totem_profile = {
-                        "animal": user.totem_animal,
-                        "emoji": getattr(user, 'totem_emoji', None),
-                        "title": user.totem_title,
-                        "description": getattr(user, 'totem_description', None),
-                        "motivation": getattr(user, 'totem_motivation', None)
-                    }
-                    # Remove keys with None values
-                    totem_profile = {k: v for k, v in totem_profile.items() if v is not None}
-        
-        # Use personalized coach prompt if user data is available, otherwise fall back to manual selection
-        if ocean_scores:
-            personality_instruction = get_personalized_coach_prompt(ocean_scores, totem_profile)
-            print("=== DEBUG: Using personalized prompt ===")
-        else:
-            # Fallback to manual personality selection
-            personality_prompts = {
-                "coach": "You are a motivational coach. Be encouraging, goal-oriented, and help users stay focused on their objectives. If you suggest any actionable steps, output them as a JSON array at the end of your response, wrapped in [FOOTPRINTS] and [/FOOTPRINTS] tags, like this:\n[FOOTPRINTS]\n[\n  {\"action\": \"Drink a glass of water\", \"due_time\": \"Today\"},\n  {\"action\": \"Meditate for 5 minutes\", \"due_time\": \"Tomorrow\"}\n]\n[/FOOTPRINTS]",
-                "mentor": "You are a wise mentor. Provide thoughtful guidance, share insights, and help users think through their challenges. If you suggest any actionable steps, output them as a JSON array at the end of your response, wrapped in [FOOTPRINTS] and [/FOOTPRINTS] tags, like this:\n[FOOTPRINTS]\n[\n  {\"action\": \"Drink a glass of water\", \"due_time\": \"Today\"},\n  {\"action\": \"Meditate for 5 minutes\", \"due_time\": \"Tomorrow\"}\n]\n[/FOOTPRINTS]",
-                "friend": "You are a supportive friend. Be warm, understanding, and provide emotional support while being encouraging. If you suggest any actionable steps, output them as a JSON array at the end of your response, wrapped in [FOOTPRINTS] and [/FOOTPRINTS] tags, like this:\n[FOOTPRINTS]\n[\n  {\"action\": \"Drink a glass of water\", \"due_time\": \"Today\"},\n  {\"action\": \"Meditate for 5 minutes\", \"due_time\": \"Tomorrow\"}\n]\n[/FOOTPRINTS]",
-                "therapist": "You are an empathetic therapist. Listen carefully, validate feelings, and provide therapeutic insights and coping strategies. If you suggest any actionable steps, output them as a JSON array at the end of your response, wrapped in [FOOTPRINTS] and [/FOOTPRINTS] tags, like this:\n[FOOTPRINTS]\n[\n  {\"action\": \"Drink a glass of water\", \"due_time\": \"Today\"},\n  {\"action\": \"Meditate for 5 minutes\", \"due_time\": \"Tomorrow\"}\n]\n[/FOOTPRINTS]"
-            }
-            personality_instruction = personality_prompts.get(chat_data.personality, personality_prompts["coach"])
-            print("=== DEBUG: Using fallback prompt ===")
-        
-        print(f"Personality instruction length: {len(personality_instruction)}")
-        print(f"Contains [FOOTPRINTS]: {personality_instruction.find('[FOOTPRINTS]') != -1}")
-        
-        full_prompt = f"{personality_instruction}\n\nUser: {chat_data.message}\n\nResponse:"
-        
-        print("=" * 50)
-        print("🔍 DEBUG: CHAT REQUEST")
-        print("=" * 50)
-        print(f"📝 Message: {chat_data.message}")
-        print(f"🎭 Received personality: '{chat_data.personality}'")
-        print(f"👤 User authenticated: {user is not None}")
-        print(f"🧠 User has ocean scores: {ocean_scores is not None}")
-        if user:
-            print(f"🐾 User totem: {user.totem_title}")
-            print(f"🐾 User totem animal: {user.totem_animal}")
-        print(f"📋 Using personalized prompt: {ocean_scores is not None}")
-        print("=" * 50)
-        print("🤖 FULL PROMPT SENT TO AI:")
-        print("-" * 30)
-        print(full_prompt)
-        print("-" * 30)
-        print("=" * 50)
-        
-        response = await call_gemini_api(full_prompt)
-        
-        print("=== DEBUG: AI RESPONSE ===")
-        print(f"AI Response: {response}")
-        print("=== END DEBUG ===")
+        try:
+            with _chat_stage("chat", "llm_call"):
+                response = await generate_text(full_prompt, system_instruction=system_instruction)
+        except Exception as e:
+            # Every model failed or none is configured; nothing is stored for this turn
+            logger.error("Chat model call failed: %s", e)
+            raise HTTPException(status_code=503, detail=f"AI service unavailable: {str(e)}")
+        log_payload(logger, "Chat response", response=response)
 
         # Extract footprints from AI response
         footprints = []
-        import re
-        footprints_match = re.search(r'\[FOOTPRINTS\](.*?)\[/FOOTPRINTS\]', response, re.DOTALL)
-        
-        if footprints_match and token:
-            try:
-                footprints_data = json.loads(footprints_match.group(1))
-                print(f"Extracted footprints from AI response: {footprints_data}")
-                
-                # Get user_id from token
-                payload = verify_token(token)
-                if payload and payload.get("sub"):
-                    user = db.query(User).filter(User.email == payload["sub"]).first()
-                    if user:
-                        user_id = user.id
-                        
-                        # Convert due_time strings to proper date format
-                        from datetime import datetime, timedelta
-                        
-                        for fp_data in footprints_data:
-                            try:
-                                # Parse due_time
-                                due_time_str = fp_data.get('due_time', 'Today')
-                                if due_time_str.lower() == 'today':
-                                    due_date = datetime.now().date()
-                                elif due_time_str.lower() == 'tomorrow':
-                                    due_date = (datetime.now() + timedelta(days=1)).date()
-                                elif due_time_str.lower() == 'tonight':
-                                    due_date = datetime.now().date()
-                                else:
-                                    # Try to parse as date
-                                    due_date = datetime.strptime(due_time_str, "%Y-%m-%d").date()
-                                
-                                # Create footprint in database
-                                db_footprint = Footprint(
-                                    user_id=user_id,
-                                    action=fp_data.get('action', ''),
-                                    path_name='Personal Journey',
-                                    path_color='bg-blue-100 text-blue-800',
-                                    due_time=due_date,
-                                    is_completed=0,
-                                    priority=1
-                                )
-                                db.add(db_footprint)
-                                db.commit()
-                                db.refresh(db_footprint)
-                                
-                                # Add to response
-                                footprints.append({
-                                    "id": db_footprint.id,
-                                    "user_id": user_id,
-                                    "action": fp_data.get('action', ''),
-                                    "path_name": 'Personal Journey',
-                                    "path_color": 'bg-blue-100 text-blue-800',
-                                    "due_time": due_date.strftime("%Y-%m-%d"),
-                                    "is_completed": False,
-                                    "priority": 1
-                                })
-                                
-                            except Exception as e:
-                                print(f"Error creating footprint: {e}")
-                                continue
-                                
-            except json.JSONDecodeError as e:
-                print(f"Error parsing footprints JSON: {e}")
-                print(f"Raw footprints text: {footprints_match.group(1)}")
-            except Exception as e:
-                print(f"Error processing footprints: {e}")
+        footprint_errors = []
+        footprints_data = None
+        with _chat_stage("chat", "footprint_parse"):
+            import re
+            footprints_match = re.search(r'\[FOOTPRINTS\](.*?)\[/FOOTPRINTS\]', response, re.DOTALL)
+
+            if footprints_match and user:
+                try:
+                    footprints_data = json.loads(footprints_match.group(1))
+                except json.JSONDecodeError as e:
+                    logger.warning("Could not parse chat footprints JSON: %s", e)
+                    log_payload(logger, "Unparsable chat footprints", footprints=footprints_match.group(1))
+
+        with _chat_stage("chat", "db_write"):
+            if footprints_data is not None:
+                try:
+                    saved = await db.run_sync(_save_chat_footprints, user.id, footprints_data)
+                    footprints = saved.footprints
+                    footprint_errors = saved.errors
+                except Exception:
+                    logger.exception("Error saving chat footprints")
+
+            if context is not None:
+                messages = await db.run_sync(append_turn, conversation_id, chat_data.message, response, user.id)
+                conversation_id = messages[0].conversation_id
+        if conversation_id is not None and context.needs_summary:
+            background_tasks.add_task(summarize_conversation, conversation_id)
 
         return {
             "response": response,
             "personality": chat_data.personality,
+            "conversation_id": conversation_id,
             "conversation": [{"role": "user", "content": chat_data.message}, {"role": "assistant", "content": response}],
-            "footprints": footprints
+            "footprints": footprints,
+            "footprint_errors": footprint_errors
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI Agent error: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_with_agent_stream(chat_data: ChatMessage, user: Optional[Principal] = Depends(_timed_principal("chat_stream")), db: AsyncSession = Depends(get_async_db)):
+    """
+    Chat with the AI agent, streaming the reply as Server-Sent Events.
+    Emits `token` events with visible text, a `footprints` event once the
+    [FOOTPRINTS] block closes, then `done` (or `error`).
+    """
+    with _chat_stage("chat_stream", "prompt_build"):
+        conversation_id, context = await _open_chat_context(db, chat_data, user)
+        try:
+            system_instruction, full_prompt = _build_chat_prompt(chat_data, user)
+            if context is not None:
+                full_prompt = context.contents(full_prompt)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"AI Agent error: {str(e)}")
+    user_id = user.id if user else None
+
+    async def event_stream():
+        nonlocal conversation_id
+        parser = FootprintStreamParser()
+        visible_parts = []
+        saved_footprints = []
+        footprint_errors = []
+
+        async def handle(events):
+            for event, payload in events:
+                if event == "text":
+                    visible_parts.append(payload)
+                    yield format_sse("token", {"text": payload})
+                else:
+                    footprints = payload
+                    errors = []
+                    if user_id is not None:
+                        # The request-scoped session may already be closed while streaming
+                        with _chat_stage("chat_stream", "db_write"):
+                            async with AsyncSessionLocal() as stream_db:
+                                saved = await stream_db.run_sync(_save_chat_footprints, user_id, payload)
+                        footprints, errors = saved.footprints, saved.errors
+                        saved_footprints.extend(footprints)
+                        footprint_errors.extend(errors)
+                    yield format_sse("footprints", {"footprints": footprints, "footprint_errors": errors})
+
+        try:
+            # The whole stream, including footprint saves made while it is open
+            with _chat_stage("chat_stream", "llm_call"):
+                async for chunk in stream_gemini_api(full_prompt, system_instruction=system_instruction):
+                    async for message in handle(parser.feed(chunk)):
+                        yield message
+                async for message in handle(parser.close()):
+                    yield message
+        except Exception as e:
+            logger.warning("Error streaming AI response: %s", e)
+            yield format_sse("error", {"detail": f"AI Agent error: {str(e)}"})
+            return
+
+        for error in parser.errors:
+            logger.warning("Footprints in streamed response: %s", error)
+        response = "".join(visible_parts)
+        if context is not None:
+            with _chat_stage("chat_stream", "db_write"):
+                async with AsyncSessionLocal() as stream_db:
+                    messages = await stream_db.run_sync(append_turn, conversation_id, chat_data.message, response, user_id)
+            conversation_id = messages[0].conversation_id
+        yield format_sse("done", {
+            "response": response,
+            "personality": chat_data.personality,
+            "conversation_id": conversation_id,
+            "conversation": [{"role": "user", "content": chat_data.message}, {"role": "assistant", "content": response}],
+            "footprints": saved_footprints,
+            "footprint_errors": footprint_errors
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(summarize_conversation, conversation_id) if context is not None and context.needs_summary else None
+    )
+
+class ConversationMessageResponse(BaseModel):
+    id: int
+    role: str
+    content: str
+    created_at: Optional[str] = None
+
+@app.get("/conversations/{conversation_id}/messages", response_model=List[ConversationMessageResponse])
+def get_conversation_messages(
+    conversation_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """
+    A stored conversation's messages, newest first. Pass the X-Next-Cursor response header
+    back as `cursor` to page further into the past.
+    """
+    conversation = open_conversation(db, user.id, conversation_id)
+    query = db.query(Message).filter(Message.conversation_id == conversation.id)
+    if cursor:
+        (before_id,) = decode_cursor(cursor, int)
+        query = query.filter(Message.id < before_id)
+
+    messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    if len(messages) > limit:
+        messages = messages[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(messages[-1].id)
+
+    return [ConversationMessageResponse(**message_to_dict(message)) for message in messages]
+
 @app.post("/auth/register", response_model=dict)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
@@ -315,14 +483,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         # Create access token
         access_token = create_access_token(data={"sub": db_user.email})
         
-        # Fetch the full user object (with all fields)
-        user_obj = db.query(User).filter(User.email == db_user.email).first()
-        ocean_scores = None
-        if user_obj.ocean_scores:
-            try:
-                ocean_scores = json.loads(user_obj.ocean_scores)
-            except:
-                pass
+        user_obj = db_user
         
         return {
             "id": user_obj.id,
@@ -334,7 +495,8 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
             "totem_title": user_obj.totem_title,
             "totem_description": getattr(user_obj, "totem_description", None),
             "totem_motivation": getattr(user_obj, "totem_motivation", None),
-            "ocean_scores": ocean_scores,
+            "ocean_scores": user_obj.ocean_scores,
+            "coach_personality": user_obj.coach_personality,
             "access_token": access_token,
             "token_type": "bearer"
         }
@@ -355,14 +517,6 @@ def login_user(user: UserLogin, db: Session = Depends(get_db)):
     # Create access token
     access_token = create_access_token(data={"sub": user_obj.email})
     
-    # Parse ocean_scores if available
-    ocean_scores = None
-    if user_obj.ocean_scores:
-        try:
-            ocean_scores = json.loads(user_obj.ocean_scores)
-        except:
-            pass
-    
     return {
         "id": user_obj.id,
         "name": user_obj.name,
@@ -371,46 +525,15 @@ def login_user(user: UserLogin, db: Session = Depends(get_db)):
         "totem_animal": user_obj.totem_animal,
         "totem_emoji": user_obj.totem_emoji,
         "totem_title": user_obj.totem_title,
-        "ocean_scores": ocean_scores,
+        "ocean_scores": user_obj.ocean_scores,
+        "coach_personality": user_obj.coach_personality,
         "access_token": access_token,
         "token_type": "bearer"
     }
 
 @app.get("/auth/me", response_model=UserResponse)
-def get_current_user(token: str, db: Session = Depends(get_db)):
+def get_current_user(user: Principal = Depends(get_current_principal)):
     """Get current user information"""
-    payload = verify_token(token)
-    if payload is None:
-        raise HTTPException(
-            status_code=401,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    email = payload.get("sub")
-    if email is None:
-        raise HTTPException(
-            status_code=401,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise HTTPException(
-            status_code=401,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Parse ocean_scores if available
-    ocean_scores = None
-    if user.ocean_scores:
-        try:
-            ocean_scores = json.loads(user.ocean_scores)
-        except:
-            pass
-    
     return UserResponse(
         id=user.id,
         name=user.name,
@@ -419,7 +542,8 @@ def get_current_user(token: str, db: Session = Depends(get_db)):
         totem_animal=user.totem_animal,
         totem_emoji=user.totem_emoji,
         totem_title=user.totem_title,
-        ocean_scores=ocean_scores
+        ocean_scores=user.ocean_scores,
+        coach_personality=user.coach_personality
     )
 
 @app.get("/users/", response_model=List[dict])
@@ -461,10 +585,6 @@ def get_user_goals(user_id: int, db: Session = Depends(get_db)):
 
 @app.post("/footprints/", response_model=FootprintResponse)
 def create_footprint(footprint: FootprintCreate, db: Session = Depends(get_db)):
-    print(f"Received footprint data: {footprint}")
-    print(f"Footprint type: {type(footprint)}")
-    print(f"Footprint dict: {footprint.dict()}")
-    
     # Convert string date to date object for database
     from datetime import datetime
     try:
@@ -498,21 +618,59 @@ def create_footprint(footprint: FootprintCreate, db: Session = Depends(get_db)):
         priority=db_footprint.priority
     )
 
+@app.post("/footprints/batch", response_model=dict)
+def batch_footprints(batch: FootprintBatchRequest, db: Session = Depends(get_db)):
+    """
+    Apply a list of create/complete/delete footprint operations in one transaction.
+    Returns one result per operation, in order, with status "ok" or "error".
+    """
+    results = apply_footprint_batch(db, [op.model_dump() for op in batch.operations])
+    return {
+        "results": results,
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] == "error")
+    }
+
 @app.get("/footprints/{user_id}", response_model=List[FootprintResponse])
-def get_footprints(user_id: int, db: Session = Depends(get_db)):
-    footprints = db.query(Footprint).filter(Footprint.user_id == user_id).all()
-    return [
-        FootprintResponse(
-            id=fp.id,
-            user_id=fp.user_id,
-            action=fp.action,
-            path_name=fp.path_name,
-            path_color=fp.path_color,
-            due_time=fp.due_time.strftime("%Y-%m-%d"),
-            is_completed=bool(fp.is_completed),
-            priority=fp.priority
-        ) for fp in footprints
-    ]
+def get_footprints(
+    user_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    due_from: Optional[date] = None,
+    due_to: Optional[date] = None,
+    is_completed: Optional[bool] = None,
+    path_id: Optional[int] = None,
+    priority: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get a user's footprints ordered by (due_time, id), optionally filtered by due date range
+    (inclusive), completion, path and priority. Pass the X-Next-Cursor response header back
+    as `cursor` to get the next page.
+    """
+    query = db.query(Footprint).filter(Footprint.user_id == user_id)
+    if due_from is not None:
+        query = query.filter(Footprint.due_time >= due_from)
+    if due_to is not None:
+        query = query.filter(Footprint.due_time <= due_to)
+    if is_completed is not None:
+        query = query.filter(Footprint.is_completed == (1 if is_completed else 0))
+    if path_id is not None:
+        query = query.filter(Footprint.path_id == path_id)
+    if priority is not None:
+        query = query.filter(Footprint.priority == priority)
+    if cursor:
+        # Footprints without a due date sort with a null key
+        due_time, footprint_id = decode_cursor(cursor, (date, type(None)), int)
+        query = query.filter(tuple_(Footprint.due_time, Footprint.id) > tuple_(due_time, footprint_id))
+
+    footprints = query.order_by(Footprint.due_time, Footprint.id).limit(limit + 1).all()
+    if len(footprints) > limit:
+        footprints = footprints[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(footprints[-1].due_time, footprints[-1].id)
+
+    return [FootprintResponse(**footprint_to_dict(fp)) for fp in footprints]
 
 @app.patch("/footprints/{footprint_id}/complete", response_model=FootprintResponse)
 def complete_footprint(footprint_id: int = Path(...), db: Session = Depends(get_db)):
@@ -547,137 +705,77 @@ class DreamFootprintRequest(BaseModel):
     dream: str
     user_id: int
 
+# Generated step lists keyed on (dream prompt version, normalized dream). Each hit still
+# creates a fresh Path and footprints for the requesting user.
+dream_plan_cache = TTLCache(
+    maxsize=int(os.getenv("DREAM_PLAN_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("DREAM_PLAN_CACHE_TTL_SECONDS", "86400"))
+)
+
 @app.post("/generate-footprints-from-dream")
-async def generate_footprints_from_dream(request: DreamFootprintRequest, db: Session = Depends(get_db)):
+async def generate_footprints_from_dream(request: DreamFootprintRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Generate actionable footprints from a user's dream/goal using AI
     """
     try:
-        # Create a personalized prompt for footprint generation
-        dream_prompt = f"""
-You are a motivational coach helping someone achieve their dream. The user has shared their dream: "{request.dream}"
-
-Based on this dream, create 5-8 actionable, specific steps that will help them achieve their goal. Each step should be:
-- Specific and actionable
-- Realistic and achievable
-- Time-bound with clear deadlines
-- Progressive (building towards the final goal)
-
-Output the steps as a JSON array wrapped in [FOOTPRINTS] and [/FOOTPRINTS] tags, like this:
-[FOOTPRINTS]
-[
-  {{"action": "Research the best online courses for web development", "due_time": "Today"}},
-  {{"action": "Enroll in a beginner-friendly coding bootcamp", "due_time": "Tomorrow"}},
-  {{"action": "Practice coding for 1 hour daily", "due_time": "This week"}},
-  {{"action": "Build your first simple website", "due_time": "Next week"}},
-  {{"action": "Create a portfolio of 3 projects", "due_time": "Next month"}}
-]
-[/FOOTPRINTS]
-
-Make sure the steps are tailored to their specific dream and will create a clear path to success.
-"""
-
-        # Call the AI to generate footprints
-        response = await call_gemini_api(dream_prompt)
-        
-        # Extract footprints from AI response
+        with start_span("dream.plan_cache") as span:
+            cache_key = (prompt_registry.get("dream").version, normalize_dream(request.dream))
+            footprints_data = dream_plan_cache.get(cache_key)
+            cached = footprints_data is not None
+            span.set_attribute("cache.hit", cached)
+
+        if not cached:
+            # Create a personalized prompt for footprint generation
+            with start_span("dream.prompt_build"):
+                dream_prompt = prompt_registry.render("dream", dream=request.dream)
+
+            # Call the AI to generate footprints
+            with start_span("dream.llm_call"):
+                response = await call_gemini_api(dream_prompt)
+            
+            # Extract footprints from AI response
+            with start_span("dream.footprint_parse"):
+                import re
+                footprints_match = re.search(r'\[FOOTPRINTS\](.*?)\[/FOOTPRINTS\]', response, re.DOTALL)
+
+                if footprints_match:
+                    try:
+                        footprints_data = json.loads(footprints_match.group(1))
+                    except json.JSONDecodeError as e:
+                        logger.warning("Could not parse dream footprints JSON: %s", e)
+                        log_payload(logger, "Unparsable dream footprints", footprints=footprints_match.group(1))
+                    if isinstance(footprints_data, list) and footprints_data:
+                        dream_plan_cache.set(cache_key, footprints_data)
+                    else:
+                        footprints_data = None
+        else:
+            logger.debug("Using cached dream plan")
+
         footprints = []
-        import re
-        footprints_match = re.search(r'\[FOOTPRINTS\](.*?)\[/FOOTPRINTS\]', response, re.DOTALL)
-        
-        if footprints_match:
+        footprint_errors = []
+        path_id = None
+        if footprints_data:
             try:
-                footprints_data = json.loads(footprints_match.group(1))
-                print(f"Generated footprints from dream: {footprints_data}")
-                
-                # First, create a Path record for this dream
-                from .models import Path as PathModel
-                from datetime import datetime
-                
-                db_path = PathModel(
-                    user_id=request.user_id,
-                    name=request.dream,
-                    color="bg-purple-100 text-purple-800",
-                    is_active=True,
-                    is_completed=False,
-                    created_at=datetime.utcnow()
-                )
-                db.add(db_path)
-                db.commit()
-                db.refresh(db_path)
-                
-                # Convert due_time strings to proper date format
-                from datetime import timedelta
-                
-                for i, fp_data in enumerate(footprints_data):
-                    try:
-                        # Parse due_time
-                        due_time_str = fp_data.get('due_time', 'Today')
-                        if due_time_str.lower() == 'today':
-                            due_date = datetime.now().date()
-                        elif due_time_str.lower() == 'tomorrow':
-                            due_date = (datetime.now() + timedelta(days=1)).date()
-                        elif due_time_str.lower() == 'tonight':
-                            due_date = datetime.now().date()
-                        elif 'week' in due_time_str.lower():
-                            if 'next week' in due_time_str.lower():
-                                due_date = (datetime.now() + timedelta(days=7)).date()
-                            else:
-                                due_date = (datetime.now() + timedelta(days=7)).date()
-                        elif 'month' in due_time_str.lower():
-                            if 'next month' in due_time_str.lower():
-                                due_date = (datetime.now() + timedelta(days=30)).date()
-                            else:
-                                due_date = (datetime.now() + timedelta(days=30)).date()
-                        else:
-                            # Try to parse as date
-                            try:
-                                due_date = datetime.strptime(due_time_str, "%Y-%m-%d").date()
-                            except:
-                                due_date = datetime.now().date()
-                        
-                        # Create footprint in database with path_id
-                        db_footprint = Footprint(
-                            user_id=request.user_id,
-                            path_id=db_path.id,  # Link to the created path
-                            action=fp_data.get('action', ''),
-                            path_name=request.dream,  # Use the actual dream name
-                            path_color="bg-purple-100 text-purple-800",
-                            due_time=due_date,
-                            is_completed=0,
-                            priority=i + 1
-                        )
-                        db.add(db_footprint)
-                        db.commit()
-                        db.refresh(db_footprint)
-                        
-                        # Add to response
-                        footprints.append({
-                            "id": db_footprint.id,
-                            "user_id": request.user_id,
-                            "action": fp_data.get('action', ''),
-                            "path_name": request.dream,
-                            "path_color": "bg-purple-100 text-purple-800",
-                            "due_time": due_date.strftime("%Y-%m-%d"),
-                            "is_completed": False,
-                            "priority": i + 1
-                        })
-                        
-                    except Exception as e:
-                        print(f"Error creating footprint: {e}")
-                        continue
-                        
-            except json.JSONDecodeError as e:
-                print(f"Error parsing footprints JSON: {e}")
-                print(f"Raw footprints text: {footprints_match.group(1)}")
-            except Exception as e:
-                print(f"Error processing footprints: {e}")
+                # Create the Path for this dream and all of its footprints in one transaction
+                with start_span("dream.db_write", **{"footprints.count": len(footprints_data)}):
+                    saved = await db.run_sync(
+                        persist_footprints, request.user_id, footprints_data,
+                        path={"name": request.dream, "color": DEFAULT_PATH_COLOR, "is_active": True},
+                        due_fallback=datetime.now().date()
+                    )
+                footprints = saved.footprints
+                footprint_errors = saved.errors
+                path_id = saved.path["id"]
+            except Exception:
+                logger.exception("Error saving dream footprints")
 
         return {
             "message": "Footprints generated successfully from your dream!",
             "footprints": footprints,
             "total_generated": len(footprints),
-            "path_id": db_path.id if 'db_path' in locals() else None
+            "path_id": path_id,
+            "footprint_errors": footprint_errors,
+            "cached": cached
         }
         
     except Exception as e:
@@ -685,68 +783,75 @@ Make sure the steps are tailored to their specific dream and will create a clear
 
 @app.post("/paths/", response_model=PathResponse)
 def create_path(path: PathCreate, db: Session = Depends(get_db)):
-    """Create a new path and (optionally) its footprints."""
-    from .models import Path as PathModel, Footprint as FootprintModel
-    from datetime import datetime
-    db_path = PathModel(
-        user_id=path.user_id,
-        name=path.name,
-        color=path.color,
-        is_active=path.is_active,
-        is_completed=False,
-        created_at=datetime.utcnow()
+    """Create a new path and (optionally) its footprints in one transaction."""
+    saved = persist_footprints(
+        db, path.user_id,
+        [fp.model_dump() for fp in path.footprints or []],
+        path={"name": path.name, "color": path.color, "is_active": path.is_active},
+        due_fallback=datetime.utcnow().date()
     )
-    db.add(db_path)
-    db.commit()
-    db.refresh(db_path)
-
-    footprints = []
-    if path.footprints:
-        for i, fp in enumerate(path.footprints):
-            due_date = None
-            try:
-                due_date = datetime.strptime(fp.due_time, "%Y-%m-%d").date()
-            except Exception:
-                due_date = datetime.utcnow().date()
-            db_fp = FootprintModel(
-                user_id=path.user_id,
-                path_id=db_path.id,
-                action=fp.action,
-                path_name=path.name,
-                path_color=path.color,
-                due_time=due_date,
-                is_completed=1 if fp.is_completed else 0,
-                priority=fp.priority
-            )
-            db.add(db_fp)
-            db.commit()
-            db.refresh(db_fp)
-            footprints.append(db_fp)
+    db_path = saved.path
 
     return PathResponse(
-        id=db_path.id,
-        user_id=db_path.user_id,
-        name=db_path.name,
-        color=db_path.color,
-        is_active=db_path.is_active,
-        is_completed=db_path.is_completed,
-        created_at=db_path.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
-        footprints=[FootprintResponse(
-            id=fp.id,
-            user_id=fp.user_id,
-            action=fp.action,
-            path_name=fp.path_name,
-            path_color=fp.path_color,
-            due_time=fp.due_time.strftime("%Y-%m-%d"),
-            is_completed=bool(fp.is_completed),
-            priority=fp.priority
-        ) for fp in footprints]
+        id=db_path["id"],
+        user_id=db_path["user_id"],
+        name=db_path["name"],
+        color=db_path["color"],
+        is_active=db_path["is_active"],
+        is_completed=db_path["is_completed"],
+        created_at=db_path["created_at"].strftime("%Y-%m-%dT%H:%M:%S"),
+        footprints=[FootprintResponse(**fp) for fp in saved.footprints],
+        footprint_errors=saved.errors
     )
 
 @app.get("/paths/{user_id}", response_model=List[PathResponse])
-def get_user_paths(user_id: int, db: Session = Depends(get_db)):
-    """Get paths for a specific user"""
-    paths = db.query(PathModel).filter(PathModel.user_id == user_id).all()
+def get_user_paths(
+    user_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    footprints_limit: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_db)
+):
+    """
+    Get paths for a specific user, oldest first, with their footprints.
+    Pages are keyed on (created_at, id): pass the X-Next-Cursor response header back as
+    `cursor` to get the next page. `footprints_limit` caps the footprints returned per
+    path (lowest priority first). Always two queries, however many paths are returned.
+    """
+    query = db.query(PathModel).filter(PathModel.user_id == user_id)
+    if cursor:
+        created_at, path_id = decode_cursor(cursor, datetime, int)
+        query = query.filter(tuple_(PathModel.created_at, PathModel.id) > tuple_(created_at, path_id))
+    paths = query.order_by(PathModel.created_at, PathModel.id).limit(limit + 1).all()
+
+    if len(paths) > limit:
+        paths = paths[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(paths[-1].created_at, paths[-1].id)
+
+    # Load the footprints of every path on the page in one batched query
+    footprints_by_path = {p.id: [] for p in paths}
+    if paths and footprints_limit != 0:
+        footprint_order = (Footprint.path_id, Footprint.priority, Footprint.id)
+        if footprints_limit is None:
+            footprint_query = db.query(Footprint).filter(Footprint.path_id.in_(footprints_by_path)).order_by(*footprint_order)
+        else:
+            ranked = db.query(
+                Footprint.id.label("id"),
+                func.row_number().over(
+                    partition_by=Footprint.path_id,
+                    order_by=(Footprint.priority, Footprint.id)
+                ).label("rank")
+            ).filter(Footprint.path_id.in_(footprints_by_path)).subquery()
+            footprint_query = (
+                db.query(Footprint)
+                .join(ranked, ranked.c.id == Footprint.id)
+                .filter(ranked.c.rank <= footprints_limit)
+                .order_by(*footprint_order)
+            )
+        for fp in footprint_query.all():
+            footprints_by_path[fp.path_id].append(fp)
+
     return [
         PathResponse(
             id=p.id,
@@ -756,16 +861,7 @@ def get_user_paths(user_id: int, db: Session = Depends(get_db)):
             is_active=p.is_active,
             is_completed=p.is_completed,
             created_at=p.created_at.strftime("%Y-%m-%dT%H:%M:%S"),
-            footprints=[FootprintResponse(
-                id=fp.id,
-                user_id=fp.user_id,
-                action=fp.action,
-                path_name=fp.path_name,
-                path_color=fp.path_color,
-                due_time=fp.due_time.strftime("%Y-%m-%d"),
-                is_completed=bool(fp.is_completed),
-                priority=fp.priority
-            ) for fp in p.footprints]
+            footprints=[FootprintResponse(**footprint_to_dict(fp)) for fp in footprints_by_path[p.id]]
         ) for p in paths
     ]
 
@@ -774,32 +870,88 @@ def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "Omeyo AI Agent is running!"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics: request, chat stage and model call latencies, errors and tokens"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/stats")
+def get_stats():
+    """Runtime statistics for the worker pools"""
+    return {
+        "llm_pool": get_llm_pool_stats(),
+        "logging": get_logging_stats(),
+        "db_pool": get_pool_stats(),
+        "dream_plan_cache": dream_plan_cache.stats(),
+        "http_client": get_http_client_stats(),
+        "profile_cache": profile_cache.stats(),
+        "prompts": prompt_registry.stats(),
+        "models": get_model_stats()
+    }
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PNG_DATA_URI_PREFIX = "data:image/png;base64,"
+
 @app.post("/generate-image")
-async def generate_image_endpoint(request_data: ImageGenerationRequest, token: Optional[str] = None, db: Session = Depends(get_db)):
+async def generate_image_endpoint(
+    request_data: ImageGenerationRequest,
+    request: Request,
+    token: Optional[str] = Depends(get_request_token),
+    user: Optional[Principal] = Depends(get_optional_principal)
+):
     """
     Generates an image based on the provided prompt using Imagen.
+    Generated images are saved to the image store and returned as a /images/{digest} URL;
+    a prompt that was generated before is served from the store without calling Imagen.
     """
     try:
-        # Optional: Verify token if image generation should be restricted to authenticated users
-        if token:
-            payload = verify_token(token)
-            if not payload or not payload.get("sub"):
-                raise HTTPException(status_code=401, detail="Invalid or expired token")
+        # Anonymous requests are allowed, but a token that was sent has to be valid
+        if token and user is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+        key = prompt_key(request_data.prompt, get_llm_provider().image_model)
+        digest = await asyncio.to_thread(image_store.lookup_prompt, key)
+        if digest:
+            return {"imageUrl": str(request.url_for("get_image", digest=digest))}
 
         image_output = await generate_image_with_imagen(request_data.prompt)
 
         if image_output.startswith("Error:"):
             raise HTTPException(status_code=500, detail=image_output)
 
+        if image_output.startswith(PNG_DATA_URI_PREFIX):
+            image_base64 = image_output[len(PNG_DATA_URI_PREFIX):]
+            digest = await asyncio.to_thread(image_store.put, base64.b64decode(image_base64))
+            # Don't pin the development placeholder to the prompt
+            if image_base64 != PLACEHOLDER_IMAGE_BASE64:
+                await asyncio.to_thread(image_store.remember_prompt, key, digest)
+            image_output = str(request.url_for("get_image", digest=digest))
+
         # Return as {"imageUrl": ...} for frontend compatibility
         return {"imageUrl": image_output}
 
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
-        print(f"Error in generate-image endpoint: {str(e)}")
+        logger.exception("Error in generate-image endpoint")
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
 
+@app.get("/images/{digest}", name="get_image")
+def get_image(digest: str, request: Request):
+    """Serve a stored image by its sha256 digest. Supports ETag revalidation and Range requests."""
+    path = image_store.path_for(digest)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/png", headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -1,11 +1,17 @@
 import hashlib
 import jwt
-import json
 from datetime import datetime, timedelta
+from dataclasses import dataclass
 from typing import Optional
-from fastapi import HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, status
+import os
 from .models import User
-from sqlalchemy.orm import Session
+from .database import get_async_db
+from .cache import TTLCache
+from .utils import OCEAN_TRAITS
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 
 # Secret key for JWT (in production, use a secure secret key)
 SECRET_KEY = "your-secret-key-change-in-production"
@@ -67,9 +73,6 @@ def create_user(db: Session, name: str, email: str, password: str, personality:
     # Hash the password
     hashed_password = hash_password(password)
     
-    # Convert ocean_scores to JSON string if provided
-    ocean_scores_json = json.dumps(ocean_scores) if ocean_scores else None
-    
     # Create new user
     db_user = User(
         name=name,
@@ -79,10 +82,130 @@ def create_user(db: Session, name: str, email: str, password: str, personality:
         totem_animal=totem_animal,
         totem_emoji=totem_emoji,
         totem_title=totem_title,
-        ocean_scores=ocean_scores_json
+        ocean_scores=ocean_scores  # fills the trait columns and coach_personality
     )
     
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    return db_user 
\ No newline at end of file
+    return db_user
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, as resolved once per request by get_optional_principal"""
+    id: int
+    email: str
+    name: Optional[str] = None
+    personality: Optional[str] = None
+    totem_animal: Optional[str] = None
+    totem_emoji: Optional[str] = None
+    totem_title: Optional[str] = None
+    ocean_scores: Optional[dict] = None
+    coach_personality: Optional[str] = None
+
+    @property
+    def totem_profile(self) -> dict:
+        """Totem fields for the personalized coach prompt, without empty values"""
+        profile = {
+            "animal": self.totem_animal,
+            "emoji": self.totem_emoji,
+            "title": self.totem_title
+        }
+        return {k: v for k, v in profile.items() if v is not None}
+
+def load_principal(db: Session, email: str) -> Optional[Principal]:
+    """Load only the columns a request needs to act on behalf of the user"""
+    row = db.query(
+        User.id, User.email, User.name, User.personality,
+        User.totem_animal, User.totem_emoji, User.totem_title, User.coach_personality,
+        *(getattr(User, trait) for trait in OCEAN_TRAITS)
+    ).filter(User.email == email).first()
+    if row is None:
+        return None
+    ocean_scores = {trait: getattr(row, trait) for trait in OCEAN_TRAITS if getattr(row, trait) is not None}
+    return Principal(
+        id=row.id,
+        email=row.email,
+        name=row.name,
+        personality=row.personality,
+        totem_animal=row.totem_animal,
+        totem_emoji=row.totem_emoji,
+        totem_title=row.totem_title,
+        ocean_scores=ocean_scores or None,
+        coach_personality=row.coach_personality
+    )
+
+# Resolved profiles keyed by email (the JWT subject). Committed writes through the ORM invalidate
+# the entry in this process; other workers pick up changes when the TTL runs out.
+profile_cache = TTLCache(
+    maxsize=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+)
+
+def invalidate_profile(email: Optional[str]) -> None:
+    """Drop a cached profile; call after changing a user outside the ORM (e.g. bulk UPDATE)"""
+    if email:
+        profile_cache.invalidate(email)
+
+# Flushed changes are only visible to other sessions once committed. Invalidating at flush
+# would let a concurrent request re-cache the old row in between, so the emails are
+# collected on the session and dropped from the cache after the commit.
+_PENDING_PROFILE_INVALIDATIONS = "pending_profile_invalidations"
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_changed_profile(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        invalidate_profile(target.email)
+        return
+    pending = session.info.setdefault(_PENDING_PROFILE_INVALIDATIONS, set())
+    pending.add(target.email)
+    # An email change leaves the old key behind
+    pending.update(inspect(target).attrs.email.history.deleted or ())
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_profiles(session):
+    for email in session.info.pop(_PENDING_PROFILE_INVALIDATIONS, ()):
+        invalidate_profile(email)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_profile_invalidations(session):
+    session.info.pop(_PENDING_PROFILE_INVALIDATIONS, None)
+
+def get_request_token(token: Optional[str] = Query(None), authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """The access token from the ?token= query parameter or an Authorization: Bearer header"""
+    if token:
+        return token
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[len("bearer "):].strip() or None
+    return None
+
+async def get_optional_principal(token: Optional[str] = Depends(get_request_token), db: AsyncSession = Depends(get_async_db)) -> Optional[Principal]:
+    """
+    Decode the JWT and load the user once per request. Returns None for anonymous
+    requests and for invalid tokens or unknown users.
+    """
+    if not token:
+        return None
+    payload = verify_token(token)
+    if not payload or not payload.get("sub"):
+        return None
+    email = payload["sub"]
+    principal = profile_cache.get(email)
+    if principal is None:
+        principal = await db.run_sync(load_principal, email)
+        if principal is not None:
+            profile_cache.set(email, principal)
+    return principal
+
+def get_current_principal(principal: Optional[Principal] = Depends(get_optional_principal)) -> Principal:
+    """Like get_optional_principal, but rejects the request with 401 when there is no valid user"""
+    if principal is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
@@ -0,0 +1,215 @@
+"""
+Server-side chat history: conversations, their messages, and the bounded context that a
+chat turn sends to the model (a rolling summary plus the most recent turns that fit a
+token budget).
+"""
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Union
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .ai_agent import generate_text
+from .database import AsyncSessionLocal
+from .models import Conversation, Message
+from .prompts import estimate_tokens, prompt_registry
+from .streaming import FOOTPRINTS_OPEN_TAG, FOOTPRINTS_CLOSE_TAG
+
+logger = logging.getLogger(__name__)
+
+# Tokens per turn for summary + history + the new message (the system instruction is extra)
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+# Summarize once this many tokens of history have fallen out of the window
+CHAT_SUMMARY_MIN_TOKENS = int(os.getenv("CHAT_SUMMARY_MIN_TOKENS", "500"))
+# At most this much history is folded into the summary per run, so backlogs shrink in steps
+CHAT_SUMMARY_CHUNK_TOKENS = int(os.getenv("CHAT_SUMMARY_CHUNK_TOKENS", "4000"))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "150"))
+
+_FOOTPRINTS_BLOCK = re.compile(
+    re.escape(FOOTPRINTS_OPEN_TAG) + ".*?" + re.escape(FOOTPRINTS_CLOSE_TAG), re.DOTALL
+)
+
+def visible_text(response: str) -> str:
+    """A reply without its [FOOTPRINTS] block, which is what the history stores"""
+    return _FOOTPRINTS_BLOCK.sub("", response).strip()
+
+def message_to_dict(message: Message) -> dict:
+    """Response representation of a message row"""
+    return {
+        "id": message.id,
+        "role": message.role,
+        "content": message.content,
+        "created_at": message.created_at.isoformat() if message.created_at else None
+    }
+
+@dataclass
+class ChatContext:
+    """The history build_context selected for the next turn"""
+    summary: Optional[str] = None
+    history: List[Message] = field(default_factory=list)  # oldest first
+    tokens: int = 0
+    # Unsummarized messages that no longer fit the budget, oldest first
+    omitted: List[Message] = field(default_factory=list)
+
+    @property
+    def omitted_tokens(self) -> int:
+        return sum(message.tokens or 0 for message in self.omitted)
+
+    @property
+    def needs_summary(self) -> bool:
+        return self.omitted_tokens >= CHAT_SUMMARY_MIN_TOKENS
+
+    def contents(self, message: str) -> Union[str, List[dict]]:
+        """
+        Gemini contents for the next turn. Without history this is just the message, so
+        the first turn of a conversation costs the same as a stateless chat.
+        """
+        if not self.summary and not self.history:
+            return message
+        contents = [
+            {"role": "model" if past.role == "assistant" else "user", "parts": [past.content]}
+            for past in self.history
+        ]
+        contents.append({"role": "user", "parts": [message]})
+        if self.summary:
+            # Turns alternate starting with the user, so the summary joins the first user turn
+            summary_part = f"Summary of our conversation so far:\n{self.summary}"
+            if contents[0]["role"] == "user":
+                contents[0]["parts"].insert(0, summary_part)
+            else:
+                contents.insert(0, {"role": "user", "parts": [summary_part]})
+        return contents
+
+def open_conversation(db: Session, user_id: int, conversation_id: Optional[int] = None) -> Conversation:
+    """
+    The user's conversation with this id (404 if there is none), or a new, unsaved one if
+    no id is given. append_turn stores a new conversation together with its first turn.
+    """
+    if conversation_id is None:
+        return Conversation(user_id=user_id)
+    conversation = db.query(Conversation).filter(
+        Conversation.id == conversation_id, Conversation.user_id == user_id
+    ).first()
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+def build_context(db: Session, conversation: Conversation, reserve_tokens: int = 0,
+                  budget_tokens: Optional[int] = None) -> ChatContext:
+    """
+    Pack the rolling summary and the newest unsummarized messages into the token budget,
+    keeping reserve_tokens free for the new message. The history never starts with an
+    assistant message unless the summary precedes it.
+    """
+    if conversation.id is None:
+        return ChatContext()
+    budget = CHAT_CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    context = ChatContext(summary=conversation.summary, tokens=conversation.summary_tokens or 0)
+    remaining = budget - reserve_tokens - context.tokens
+    # Rolling summarization keeps the unsummarized tail short
+    messages = db.query(Message).filter(
+        Message.conversation_id == conversation.id,
+        Message.id > (conversation.summarized_through_id or 0)
+    ).order_by(Message.id.desc()).all()
+
+    for index, message in enumerate(messages):
+        if message.tokens > remaining:
+            context.omitted = list(reversed(messages[index:]))
+            break
+        remaining -= message.tokens
+        context.tokens += message.tokens
+        context.history.append(message)
+    context.history.reverse()
+
+    if context.history and context.history[0].role == "assistant" and not context.summary:
+        dropped = context.history.pop(0)
+        context.tokens -= dropped.tokens
+        context.omitted.append(dropped)
+    return context
+
+def append_turn(db: Session, conversation_id: Optional[int], user_message: str, reply: str,
+                user_id: Optional[int] = None) -> List[Message]:
+    """
+    Store a user message and the visible part of the reply in one commit. Without a
+    conversation_id a new conversation for user_id is created in the same commit, so a
+    failed turn never leaves an empty one behind; read its id from the messages.
+    """
+    if conversation_id is None:
+        conversation = Conversation(user_id=user_id)
+        db.add(conversation)
+        db.flush()
+        conversation_id = conversation.id
+    else:
+        db.query(Conversation).filter(Conversation.id == conversation_id).update(
+            {Conversation.updated_at: datetime.utcnow()}, synchronize_session=False
+        )
+    messages = [
+        Message(conversation_id=conversation_id, role=role, content=content, tokens=estimate_tokens(content))
+        for role, content in (("user", user_message), ("assistant", visible_text(reply)))
+    ]
+    db.add_all(messages)
+    db.commit()
+    return messages
+
+def _summary_request(db: Session, conversation_id: int) -> Optional[tuple]:
+    """(prompt, previous summarized_through_id, new summarized_through_id), or None if not due"""
+    conversation = db.get(Conversation, conversation_id)
+    if conversation is None:
+        return None
+    context = build_context(db, conversation)
+    if not context.needs_summary:
+        return None
+
+    batch = []
+    batch_tokens = 0
+    for message in context.omitted:
+        if batch and batch_tokens + message.tokens > CHAT_SUMMARY_CHUNK_TOKENS:
+            break
+        batch.append(message)
+        batch_tokens += message.tokens
+    prompt = prompt_registry.render(
+        "conversation.summary",
+        max_words=CHAT_SUMMARY_MAX_WORDS,
+        summary=conversation.summary or "(none yet)",
+        transcript="\n".join(f"{message.role.capitalize()}: {message.content}" for message in batch)
+    )
+    return prompt, conversation.summarized_through_id or 0, batch[-1].id
+
+async def summarize_conversation(conversation_id: int) -> bool:
+    """
+    Fold the oldest messages outside the context window into the conversation summary.
+    Runs after the response (BackgroundTasks) with its own session. Returns True if the
+    summary moved forward; a concurrent run that got there first wins.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            request = await db.run_sync(_summary_request, conversation_id)
+            if request is None:
+                return False
+            prompt, previous_through_id, through_id = request
+            # Don't hold a transaction open while the model works
+            await db.commit()
+
+            summary = (await generate_text(prompt)).strip()
+            result = await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id, Conversation.summarized_through_id == previous_through_id)
+                .values(
+                    summary=summary,
+                    summary_tokens=estimate_tokens(summary),
+                    summarized_through_id=through_id,
+                    # A summary is not activity; keep the conversation where it is in the list
+                    updated_at=Conversation.updated_at
+                )
+            )
+            await db.commit()
+            return result.rowcount > 0
+        except Exception:
+            await db.rollback()
+            logger.exception("Error summarizing conversation", extra={"conversation_id": conversation_id})
+            return False
@@ -0,0 +1,103 @@
+import os
+import asyncio
+import base64
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CLOUD_PLATFORM_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+# A token this close to expiry is refreshed before it is handed out
+TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS", "60")))
+# Inside this window callers still get the current token, but a refresh starts in the background
+TOKEN_BACKGROUND_REFRESH_WINDOW = timedelta(seconds=int(os.getenv("GOOGLE_TOKEN_BACKGROUND_REFRESH_SECONDS", "300")))
+
+class ServiceAccountTokenProvider:
+    """
+    Process-wide OAuth access token source for a Google service account.
+
+    The base64 service account JSON is decoded once. Tokens are reused until they
+    get close to expiry; callers inside the background window keep the current
+    token while one refresh runs off the event loop, and concurrent callers that
+    do need a fresh token all await that same refresh.
+    """
+
+    def __init__(self, encoded_credentials: Optional[str] = None, credentials=None):
+        if credentials is None:
+            credentials = self._load_credentials(encoded_credentials)
+        self._credentials = credentials
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_lock = threading.Lock()
+        self.refresh_count = 0
+
+    @staticmethod
+    def _load_credentials(encoded_credentials: str):
+        from google.oauth2 import service_account
+
+        # Decode the base64 string and parse the JSON
+        decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
+        credentials_dict = json.loads(decoded_credentials)
+        return service_account.Credentials.from_service_account_info(
+            credentials_dict,
+            scopes=CLOUD_PLATFORM_SCOPES
+        )
+
+    @property
+    def project_id(self) -> Optional[str]:
+        return getattr(self._credentials, "project_id", None)
+
+    def _time_left(self) -> Optional[timedelta]:
+        if not self._credentials.token or self._credentials.expiry is None:
+            return None
+        # google-auth stores expiry as a naive UTC datetime
+        return self._credentials.expiry - datetime.utcnow()
+
+    def _refresh_sync(self) -> None:
+        from google.auth.transport.requests import Request
+
+        with self._refresh_lock:
+            self._credentials.refresh(Request())
+            self.refresh_count += 1
+
+    def _start_refresh(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        task = self._refresh_task
+        # Reuse an in-progress refresh; a task from another (finished) event loop can't be awaited here
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(asyncio.to_thread(self._refresh_sync))
+            task.add_done_callback(self._refresh_done)
+            self._refresh_task = task
+        return task
+
+    @staticmethod
+    def _refresh_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Error refreshing Google access token: %s", task.exception())
+
+    async def get_token(self) -> str:
+        """Return a valid access token, refreshing at most once per expiry across concurrent callers."""
+        time_left = self._time_left()
+        if time_left is None or time_left <= TOKEN_REFRESH_MARGIN:
+            await asyncio.shield(self._start_refresh())
+        elif time_left <= TOKEN_BACKGROUND_REFRESH_WINDOW:
+            self._start_refresh()
+        return self._credentials.token
+
+_imagen_token_provider: Optional[ServiceAccountTokenProvider] = None
+
+def get_imagen_token_provider() -> Optional[ServiceAccountTokenProvider]:
+    """
+    Shared token provider built from GOOGLE_CLOUD_CREDENTIALS (base64 service account JSON).
+    Returns None when the credentials are not configured.
+    """
+    global _imagen_token_provider
+    if _imagen_token_provider is None:
+        encoded_credentials = os.getenv("GOOGLE_CLOUD_CREDENTIALS")
+        if not encoded_credentials:
+            return None
+        _imagen_token_provider = ServiceAccountTokenProvider(encoded_credentials)
+    return _imagen_token_provider
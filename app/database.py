@@ -1,6 +1,10 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,10 +12,194 @@ load_dotenv()
 # Use SQLite as fallback if no DATABASE_URL is provided
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./omeyo.db")
 
-# For SQLite, we need to add check_same_thread=False for async compatibility
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+def is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url in ("sqlite://", "sqlite:///"))
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
\ No newline at end of file
+def to_async_url(url: str) -> str:
+    """
+    The async driver URL for a database URL: aiosqlite for SQLite, asyncpg for Postgres.
+    asyncpg takes ssl= instead of libpq's sslmode=.
+    """
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+")[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if driver in ("postgres", "postgresql"):
+        return f"postgresql+asyncpg://{rest}".replace("sslmode=", "ssl=")
+    return url
+
+if is_memory_sqlite(DATABASE_URL):
+    # An in-memory database only lives as long as its connections, and every connection
+    # normally gets its own. Both engines open the same named shared-cache database
+    # instead, and the sync engine's single static connection keeps it alive.
+    DATABASE_URL = "sqlite:///file:omeyo?mode=memory&cache=shared&uri=true"
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# Client-side pool, per worker process and per engine (sync and async)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+# Recycle connections before the server or a proxy drops them for being idle
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "true")
+# Postgres only; 0 disables
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Behind PgBouncer/Supavisor in transaction mode the server side does the pooling: the app
+# opens a connection per checkout, and asyncpg's prepared statements are disabled because
+# consecutive transactions may land on different server connections.
+DB_SERVER_POOLER = _env_flag("DB_SERVER_POOLER", "false")
+
+class _TimedPoolMixin:
+    """Times every checkout from the pool, including waits for a free connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            _record_wait(self, time.perf_counter() - start, timed_out=True)
+            raise
+        _record_wait(self, time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+_pool_stats_lock = threading.Lock()
+
+def _new_pool_stats() -> dict:
+    return {
+        "checkouts": 0,
+        "checked_out": 0,
+        "timeouts": 0,
+        "wait_seconds_total": 0.0,
+        "wait_seconds_max": 0.0,
+    }
+
+def _record_wait(pool, seconds: float, timed_out: bool = False) -> None:
+    with _pool_stats_lock:
+        stats = pool.stats
+        stats["wait_seconds_total"] += seconds
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], seconds)
+        if timed_out:
+            stats["timeouts"] += 1
+
+def engine_options(url: str, async_driver: bool = False) -> dict:
+    """create_engine / create_async_engine keyword arguments for a database URL"""
+    connect_args = {}
+    if url.startswith("sqlite"):
+        if async_driver:
+            # Opening a SQLite connection is cheap, and pooled aiosqlite connections each pin a thread
+            return {"poolclass": NullPool}
+        # For SQLite, we need to add check_same_thread=False for async compatibility
+        connect_args["check_same_thread"] = False
+        if "mode=memory" in url:
+            return {"connect_args": connect_args, "poolclass": StaticPool}
+    elif async_driver and DB_SERVER_POOLER:
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+    elif DB_STATEMENT_TIMEOUT_MS and not DB_SERVER_POOLER:
+        # Set once per connection; poolers reject startup options, see _set_local_statement_timeout
+        if async_driver:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    options = {"connect_args": connect_args} if connect_args else {}
+    if DB_SERVER_POOLER:
+        options["poolclass"] = NullPool
+        return options
+    options.update(
+        poolclass=TimedAsyncQueuePool if async_driver else TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+def _set_local_statement_timeout(connection):
+    # Scoped to the transaction, so it never leaks to another client of the pooler
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+def instrument_engine(sync_engine) -> dict:
+    """
+    Track checkouts and apply the pooler-mode statement timeout. Returns the engine's
+    pool stats, which also survive engine.dispose().
+    """
+    stats = _new_pool_stats()
+    sync_engine.pool.stats = stats
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, record, proxy):
+        with _pool_stats_lock:
+            stats["checkouts"] += 1
+            stats["checked_out"] += 1
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, record):
+        with _pool_stats_lock:
+            stats["checked_out"] -= 1
+
+    if DB_SERVER_POOLER and DB_STATEMENT_TIMEOUT_MS and sync_engine.dialect.name == "postgresql":
+        event.listen(sync_engine, "begin", _set_local_statement_timeout)
+    return stats
+
+def pool_snapshot(pool, pool_stats: dict) -> dict:
+    """Counters from instrument_engine plus the pool's current size and overflow"""
+    with _pool_stats_lock:
+        stats = dict(pool_stats)
+    stats["pool"] = type(pool).__name__
+    if isinstance(pool, QueuePool):
+        stats["size"] = pool.size()
+        stats["overflow"] = max(pool.overflow(), 0)
+        stats["max_overflow"] = pool._max_overflow
+        stats["idle"] = pool.checkedin()
+    waits = stats["checkouts"] if isinstance(pool, _TimedPoolMixin) else 0
+    stats["wait_ms_avg"] = stats["wait_seconds_total"] * 1000 / waits if waits else 0.0
+    return stats
+
+def get_pool_stats() -> dict:
+    """Connection pool usage for both engines, for /stats"""
+    return {
+        "server_pooler": DB_SERVER_POOLER,
+        "sync": pool_snapshot(engine.pool, _engine_pool_stats["sync"]),
+        "async": pool_snapshot(async_engine.sync_engine.pool, _engine_pool_stats["async"]),
+    }
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+async_engine = create_async_engine(to_async_url(DATABASE_URL), **engine_options(DATABASE_URL, async_driver=True))
+_engine_pool_stats = {
+    "sync": instrument_engine(engine),
+    "async": instrument_engine(async_engine.sync_engine),
+}
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Loaded objects stay usable after commit; lazy loads can't run on an async session
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Dependency to get database session
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency for async routes, so their queries don't block the event loop.
+# Sync services (footprint_service, conversation_service) run on it via run_sync.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
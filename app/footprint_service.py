@@ -0,0 +1,229 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from .models import Footprint, Path as PathModel
+
+DEFAULT_PATH_COLOR = "bg-purple-100 text-purple-800"
+
+def parse_due_time(due_time_str: str) -> Optional[date]:
+    """
+    Parse the due_time values the AI produces: relative phrases ("Today", "Tonight",
+    "Tomorrow", "This week", "Next month", ...) or an ISO date (YYYY-MM-DD).
+    Returns None when the value can't be understood.
+    """
+    if not isinstance(due_time_str, str):
+        return None
+    value = due_time_str.strip().lower()
+    today = datetime.now().date()
+    if value in ('today', 'tonight'):
+        return today
+    if value == 'tomorrow':
+        return today + timedelta(days=1)
+    if 'week' in value:
+        return today + timedelta(days=7)
+    if 'month' in value:
+        return today + timedelta(days=30)
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+def footprint_to_dict(footprint: Footprint) -> dict:
+    """Response representation of a footprint row"""
+    return {
+        "id": footprint.id,
+        "user_id": footprint.user_id,
+        "action": footprint.action,
+        "path_name": footprint.path_name,
+        "path_color": footprint.path_color,
+        "due_time": footprint.due_time.strftime("%Y-%m-%d"),
+        "is_completed": bool(footprint.is_completed),
+        "priority": footprint.priority
+    }
+
+@dataclass
+class PersistResult:
+    """Outcome of persist_footprints: the created path (if any), saved rows and per-row errors"""
+    path: Optional[dict] = None
+    footprints: List[dict] = field(default_factory=list)
+    errors: List[dict] = field(default_factory=list)
+
+def _build_row(index: int, item: Any, user_id: int, path_id: Optional[int], path_name: str,
+               path_color: str, priority: Optional[int], due_fallback: Optional[date]) -> dict:
+    """Validate one footprint item and turn it into an insert row; raises ValueError with the reason"""
+    if not isinstance(item, dict):
+        raise ValueError("footprint must be an object")
+    action = item.get('action')
+    if not isinstance(action, str) or not action.strip():
+        raise ValueError("missing action")
+    due_time = item.get('due_time', 'Today')
+    due_date = due_time if isinstance(due_time, date) else parse_due_time(due_time)
+    if due_date is None:
+        if due_fallback is None:
+            raise ValueError(f"unrecognised due_time: {due_time!r}")
+        due_date = due_fallback
+    row_priority = priority if priority is not None else item.get('priority', index + 1)
+    try:
+        row_priority = int(row_priority)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid priority: {row_priority!r}")
+    return {
+        "user_id": user_id,
+        "path_id": path_id,
+        "action": action,
+        "path_name": path_name,
+        "path_color": path_color,
+        "due_time": due_date,
+        "is_completed": 1 if item.get('is_completed') else 0,
+        "priority": row_priority
+    }
+
+def persist_footprints(db: Session, user_id: int, items: List[Any], path: Optional[dict] = None,
+                       path_name: Optional[str] = None, path_color: Optional[str] = None,
+                       priority: Optional[int] = None, due_fallback: Optional[date] = None) -> PersistResult:
+    """
+    Insert an optional Path and its footprints in a single transaction.
+
+    path holds the Path columns (name, color, is_active) to create; footprints are then
+    linked to it and inherit its name and color unless path_name/path_color are given.
+    Each item is validated on its own: invalid ones are reported in PersistResult.errors
+    as {"index", "error"} and the rest are inserted with one bulk INSERT ... RETURNING.
+    priority forces the same priority on every row; otherwise the item's priority or its
+    1-based position is used. due_fallback replaces unparseable due_time values instead
+    of rejecting the row.
+    """
+    result = PersistResult()
+    try:
+        path_id = None
+        if path is not None:
+            db_path = PathModel(
+                user_id=user_id,
+                name=path["name"],
+                color=path.get("color") or DEFAULT_PATH_COLOR,
+                is_active=path.get("is_active", True),
+                is_completed=False,
+                created_at=datetime.utcnow()
+            )
+            db.add(db_path)
+            db.flush()
+            path_id = db_path.id
+            result.path = {
+                "id": db_path.id,
+                "user_id": user_id,
+                "name": db_path.name,
+                "color": db_path.color,
+                "is_active": db_path.is_active,
+                "is_completed": db_path.is_completed,
+                "created_at": db_path.created_at
+            }
+            path_name = path_name or db_path.name
+            path_color = path_color or db_path.color
+
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                rows.append(_build_row(index, item, user_id, path_id, path_name, path_color, priority, due_fallback))
+            except ValueError as e:
+                result.errors.append({"index": index, "error": str(e)})
+
+        if rows:
+            # RETURNING every column keeps each result self-describing, so it doesn't
+            # matter in which order the database hands the inserted rows back
+            inserted = db.execute(
+                insert(Footprint).returning(
+                    Footprint.id, Footprint.user_id, Footprint.action, Footprint.path_name,
+                    Footprint.path_color, Footprint.due_time, Footprint.is_completed, Footprint.priority
+                ),
+                rows
+            ).all()
+            for row in sorted(inserted, key=lambda r: r.id):
+                result.footprints.append({
+                    "id": row.id,
+                    "user_id": row.user_id,
+                    "action": row.action,
+                    "path_name": row.path_name,
+                    "path_color": row.path_color,
+                    "due_time": row.due_time.strftime("%Y-%m-%d"),
+                    "is_completed": bool(row.is_completed),
+                    "priority": row.priority
+                })
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+def apply_footprint_batch(db: Session, operations: List[dict]) -> List[dict]:
+    """
+    Apply a list of mixed footprint operations in one transaction and return one result per operation.
+
+    Each operation is {"op": "create", "footprint": {...}} or {"op": "complete"|"delete", "id": ...}.
+    Operations run in order: a footprint deleted earlier in the batch can't be completed later.
+    Operations that fail validation or refer to a missing footprint get an error result and
+    don't stop the others; a database error rolls the whole batch back and is raised.
+    """
+    results: List[Optional[dict]] = [None] * len(operations)
+    target_ids = {op.get("id") for op in operations if op.get("op") in ("complete", "delete") and op.get("id") is not None}
+
+    try:
+        # One SELECT for every footprint the batch touches
+        existing = {}
+        if target_ids:
+            existing = {fp.id: fp for fp in db.query(Footprint).filter(Footprint.id.in_(target_ids)).all()}
+
+        created = []
+        deleted_ids = []
+        today = datetime.now().date()
+        for index, op in enumerate(operations):
+            kind = op.get("op")
+            if kind == "create":
+                data = op.get("footprint")
+                try:
+                    if not isinstance(data, dict):
+                        raise ValueError("create requires a footprint")
+                    if data.get("user_id") is None:
+                        raise ValueError("missing user_id")
+                    row = _build_row(index, data, data.get("user_id"), None, data.get("path_name"),
+                                     data.get("path_color"), None, today)
+                except ValueError as e:
+                    results[index] = {"index": index, "op": kind, "status": "error", "error": str(e)}
+                    continue
+                footprint = Footprint(**row)
+                db.add(footprint)
+                created.append((index, footprint))
+            elif kind in ("complete", "delete"):
+                footprint = existing.get(op.get("id"))
+                if footprint is None:
+                    results[index] = {"index": index, "op": kind, "status": "error", "id": op.get("id"), "error": "Footprint not found"}
+                    continue
+                if kind == "complete":
+                    footprint.is_completed = 1
+                    results[index] = {"index": index, "op": kind, "status": "ok", "footprint": footprint}
+                else:
+                    del existing[footprint.id]
+                    deleted_ids.append(footprint.id)
+                    db.expunge(footprint)
+                    results[index] = {"index": index, "op": kind, "status": "ok", "id": footprint.id}
+            else:
+                results[index] = {"index": index, "op": kind, "status": "error", "error": f"unknown op: {kind!r}"}
+
+        if deleted_ids:
+            db.execute(delete(Footprint).where(Footprint.id.in_(deleted_ids)))
+        # Creates and completions are written in a single flush
+        db.flush()
+        for index, footprint in created:
+            results[index] = {"index": index, "op": "create", "status": "ok", "footprint": footprint}
+        # Serialize before commit so the expired objects are not reloaded one by one
+        for result in results:
+            if isinstance(result.get("footprint"), Footprint):
+                result["footprint"] = footprint_to_dict(result["footprint"])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return results
@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Outbound HTTP (Imagen predict calls) goes through one shared keep-alive client
+# per worker, created in the app lifespan, instead of a new connection per request.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "60"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT_SECONDS", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_client: Optional[httpx.AsyncClient] = None
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "responses": 0,
+    "http2_responses": 0,
+    "new_connections": 0,
+    "tls_handshakes": 0,
+}
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+async def _trace(event_name: str, info: dict) -> None:
+    """httpcore trace hook: counts connections actually opened, as opposed to reused"""
+    if event_name == "connection.connect_tcp.complete":
+        _count("new_connections")
+    elif event_name == "connection.start_tls.complete":
+        _count("tls_handshakes")
+
+async def _on_request(request: httpx.Request) -> None:
+    request.extensions["trace"] = _trace
+    _count("requests")
+
+async def _on_response(response: httpx.Response) -> None:
+    _count("responses")
+    if response.http_version == "HTTP/2":
+        _count("http2_responses")
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build an AsyncClient with the configured pool limits and timeouts"""
+    try:
+        import h2  # noqa: F401
+        http2 = HTTP2_ENABLED
+    except ImportError:
+        logger.warning("h2 is not installed, outbound HTTP falls back to HTTP/1.1")
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT,
+            read=HTTP_READ_TIMEOUT,
+            write=HTTP_READ_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT,
+        ),
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+
+async def start_http_client() -> None:
+    """Create the shared client (called from the app lifespan)"""
+    global _client
+    if _client is None:
+        _client = create_http_client()
+
+async def close_http_client() -> None:
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client; created on first use when running outside the app lifespan (scripts, tests)"""
+    global _client
+    if _client is None:
+        _client = create_http_client()
+    return _client
+
+def get_http_client_stats() -> dict:
+    """Request and connection counters; reused_connections is requests that did not open a new connection"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["reused_connections"] = max(stats["requests"] - stats["new_connections"], 0)
+    stats["max_connections"] = HTTP_MAX_CONNECTIONS
+    stats["max_keepalive_connections"] = HTTP_MAX_KEEPALIVE_CONNECTIONS
+    stats["http2_enabled"] = HTTP2_ENABLED
+    return stats
@@ -0,0 +1,73 @@
+import os
+import hashlib
+import re
+import tempfile
+from typing import Optional
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "./generated_images")
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def prompt_key(prompt: str, model: str) -> str:
+    """Cache key for a generation request: the same prompt on the same model maps to the same image"""
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+class ImageStore:
+    """
+    Content-addressed image files on local disk.
+
+    Images live at images/<first two hex chars>/<sha256>, so a URL built from the
+    digest never changes content and can be cached forever. A small prompt index
+    (prompts/<prompt key> -> digest) lets repeated prompts skip generation.
+    """
+
+    def __init__(self, root: str = IMAGE_STORE_DIR):
+        self.root = root
+
+    def _image_path(self, digest: str) -> str:
+        return os.path.join(self.root, "images", digest[:2], digest)
+
+    def _prompt_path(self, key: str) -> str:
+        return os.path.join(self.root, "prompts", key[:2], key)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def put(self, data: bytes) -> str:
+        """Store image bytes and return their sha256 digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._image_path(digest)
+        if not os.path.exists(path):
+            self._write_atomic(path, data)
+        return digest
+
+    def path_for(self, digest: str) -> Optional[str]:
+        """Filesystem path of a stored image, or None for unknown or malformed digests"""
+        if not _DIGEST_RE.match(digest):
+            return None
+        path = self._image_path(digest)
+        return path if os.path.isfile(path) else None
+
+    def lookup_prompt(self, key: str) -> Optional[str]:
+        """Digest of the image previously generated for a prompt key, if it is still stored"""
+        try:
+            with open(self._prompt_path(key), "r") as index_file:
+                digest = index_file.read().strip()
+        except FileNotFoundError:
+            return None
+        return digest if self.path_for(digest) else None
+
+    def remember_prompt(self, key: str, digest: str) -> None:
+        self._write_atomic(self._prompt_path(key), digest.encode("ascii"))
+
+image_store = ImageStore()
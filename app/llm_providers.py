@@ -0,0 +1,216 @@
+"""
+Model providers behind the coach: chat completion, streaming and image generation.
+
+LLM_PROVIDER selects one per process (see ai_agent.create_llm_provider):
+  gemini  Gemini for text and Imagen for images (the default)
+  stub    canned, deterministic responses with simulated latency and no network access,
+          for load tests, CI and local development
+
+Blocking methods (generate, stream) run on the LLM pool; generate_image is a coroutine.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Union
+
+from .prompts import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Simple 1x1 pixel PNG image with blue background, returned when Imagen is unavailable
+PLACEHOLDER_IMAGE_BASE64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+
+# A single message, or Gemini contents (a list of {"role", "parts"} turns) for a
+# continued conversation
+Prompt = Union[str, List[dict]]
+
+def prompt_text(prompt: Prompt) -> str:
+    """The prompt as one stable string, for hashing, matching and token estimates"""
+    if isinstance(prompt, str):
+        return prompt
+    return json.dumps(prompt, sort_keys=True, ensure_ascii=False)
+
+@dataclass
+class Completion:
+    """
+    Generated text with the token counts the provider reported (None if it did not).
+    A streamed chunk carries its own text and the running totals so far.
+    """
+    text: str
+    model: str
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+class LLMProvider:
+    """Interface every provider implements"""
+
+    name = "base"
+    chat_model = None
+    image_model = None
+
+    def is_configured(self) -> bool:
+        """False if the provider failed to initialize; callers report the service as unavailable"""
+        return True
+
+    def generate(self, prompt: Prompt, system_instruction: Optional[str] = None,
+                 model_name: Optional[str] = None) -> Completion:
+        """A complete response from model_name (chat_model if None) (blocking)"""
+        raise NotImplementedError
+
+    def stream(self, prompt: Prompt, system_instruction: Optional[str] = None,
+               model_name: Optional[str] = None) -> Iterator[Completion]:
+        """The response as chunks, as they are produced (blocking iterator)"""
+        raise NotImplementedError
+
+    async def generate_image(self, prompt: str) -> str:
+        """A data:image/png;base64 URI, or a string starting with "Error" on failure"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+# Replies for the app's own prompts, so the stub drives every pipeline end to end:
+# chat turns with and without footprints, dream plans and conversation summaries
+DEFAULT_STUB_RESPONSES = {
+    "responses": [
+        {
+            "match": "has shared their dream",
+            "text": "Here is a plan to get you there.\n[FOOTPRINTS]\n" + json.dumps([
+                {"action": "Write down what achieving this dream looks like", "due_time": "Today"},
+                {"action": "Research what the first milestone needs", "due_time": "Tomorrow"},
+                {"action": "Spend 30 minutes on the first step", "due_time": "This week"},
+                {"action": "Review progress and adjust the plan", "due_time": "Next week"},
+                {"action": "Share your progress with a friend", "due_time": "Next month"},
+            ]) + "\n[/FOOTPRINTS]",
+        },
+        {
+            "match": "Summarize the conversation",
+            "text": "The user is working towards a personal goal, has committed to small daily steps "
+                    "and wants encouragement and concrete next actions.",
+        },
+        {
+            "text": [
+                "That's a great goal. Start small and build the habit one day at a time.",
+                "I hear you. Let's break this into steps you can start today.\n[FOOTPRINTS]\n" + json.dumps([
+                    {"action": "Write down the goal", "due_time": "Today"},
+                    {"action": "Block 20 minutes for it", "due_time": "Tomorrow"},
+                    {"action": "Review progress", "due_time": "This week"},
+                ]) + "\n[/FOOTPRINTS]",
+                "Nice progress! What felt easiest about it, and what got in the way?",
+            ],
+        },
+    ],
+    "image": PLACEHOLDER_IMAGE_BASE64,
+}
+
+class StubProvider(LLMProvider):
+    """
+    Replays canned responses without network access. The first entry whose "match"
+    substring occurs in the prompt or system instruction answers (an entry without
+    "match" answers anything); if its "text" is a list, the prompt's hash picks one.
+    Latency is `latency` plus up to +/- `jitter` seconds, also derived from the prompt
+    hash, so a given prompt always gets the same reply after the same delay.
+    """
+
+    name = "stub"
+    chat_model = "stub"
+    image_model = "stub-image"
+
+    def __init__(self, responses: Optional[dict] = None, latency: float = 0.0, jitter: float = 0.0,
+                 stream_chunks: int = 8):
+        responses = responses or DEFAULT_STUB_RESPONSES
+        self.rules = responses.get("responses", [])
+        self.image = responses.get("image", PLACEHOLDER_IMAGE_BASE64)
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = max(1, stream_chunks)
+        self._lock = threading.Lock()
+        self._calls = {"generate": 0, "stream": 0, "image": 0}
+
+    @classmethod
+    def from_env(cls) -> "StubProvider":
+        """Configured by LLM_STUB_RESPONSES (a JSON file), LLM_STUB_LATENCY_SECONDS and LLM_STUB_JITTER_SECONDS"""
+        responses = None
+        path = os.getenv("LLM_STUB_RESPONSES")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                responses = json.load(f)
+        return cls(
+            responses,
+            latency=float(os.getenv("LLM_STUB_LATENCY_SECONDS", "0")),
+            jitter=float(os.getenv("LLM_STUB_JITTER_SECONDS", "0")),
+            stream_chunks=int(os.getenv("LLM_STUB_STREAM_CHUNKS", "8")),
+        )
+
+    @staticmethod
+    def _hash(*parts: Optional[str]) -> int:
+        digest = hashlib.sha256("\0".join(part or "" for part in parts).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self._calls[kind] += 1
+
+    def delay(self, prompt: str, system_instruction: Optional[str] = None) -> float:
+        if not self.latency and not self.jitter:
+            return 0.0
+        offset = (self._hash("delay", system_instruction, prompt) % 2001) / 1000 - 1
+        return max(0.0, self.latency + offset * self.jitter)
+
+    def reply(self, prompt: str, system_instruction: Optional[str] = None) -> str:
+        haystack = f"{system_instruction or ''}\n{prompt}"
+        for rule in self.rules:
+            match = rule.get("match")
+            if match and match not in haystack:
+                continue
+            text = rule.get("text", "")
+            if isinstance(text, list):
+                text = text[self._hash(system_instruction, prompt) % len(text)] if text else ""
+            return text
+        return ""
+
+    def generate(self, prompt: Prompt, system_instruction: Optional[str] = None,
+                 model_name: Optional[str] = None) -> Completion:
+        self._count("generate")
+        prompt = prompt_text(prompt)
+        time.sleep(self.delay(prompt, system_instruction))
+        text = self.reply(prompt, system_instruction)
+        return Completion(text, model_name or self.chat_model, estimate_tokens(f"{system_instruction or ''}{prompt}"),
+                          estimate_tokens(text))
+
+    def stream(self, prompt: Prompt, system_instruction: Optional[str] = None,
+               model_name: Optional[str] = None) -> Iterator[Completion]:
+        # Half the delay before the first chunk, the rest spread over the chunks
+        self._count("stream")
+        prompt = prompt_text(prompt)
+        delay = self.delay(prompt, system_instruction)
+        text = self.reply(prompt, system_instruction)
+        prompt_tokens = estimate_tokens(f"{system_instruction or ''}{prompt}")
+        size = max(1, -(-len(text) // self.stream_chunks))
+        pieces: List[str] = [text[i:i + size] for i in range(0, len(text), size)]
+        time.sleep(delay / 2)
+        sent = ""
+        for piece in pieces:
+            sent += piece
+            yield Completion(piece, model_name or self.chat_model, prompt_tokens, estimate_tokens(sent))
+            time.sleep(delay / 2 / len(pieces))
+
+    async def generate_image(self, prompt: str) -> str:
+        self._count("image")
+        await asyncio.sleep(self.delay(prompt))
+        return f"data:image/png;base64,{self.image}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = dict(self._calls)
+        return {
+            "latency_seconds": self.latency,
+            "jitter_seconds": self.jitter,
+            "responses": len(self.rules),
+            "calls": calls,
+        }
@@ -0,0 +1,186 @@
+"""
+Hedged requests and model fallback for model calls, to cut tail latency.
+
+A call goes to the provider's chat model first. If it has not answered after the hedge
+delay, a hedged request goes to the next model in LLM_FALLBACK_MODELS (or the primary
+again if there is none) and the first answer wins. An error, or no answer within
+LLM_ATTEMPT_TIMEOUT_SECONDS, falls back to the next model. Attempts still pending once
+one succeeds are cancelled.
+
+The hedge delay is the LLM_HEDGE_PERCENTILE of the primary's recent latencies once
+LLM_HEDGE_MIN_SAMPLES have been recorded, and LLM_HEDGE_DELAY_SECONDS until then;
+LLM_HEDGE_DELAY_SECONDS=0 turns hedging off.
+
+A cancelled attempt that has not started on the LLM pool never runs. One already running
+in a pool thread (the SDK calls block) finishes there and its result is discarded.
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .metrics import record_model_attempt, record_model_served
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LLM_FALLBACK_MODELS = [name.strip() for name in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if name.strip()]
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "0"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+# Per attempt; 0 waits as long as the SDK does
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "0"))
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+class ModelRouter:
+    """Picks the models for each call and keeps per-model latency windows and counters"""
+
+    def __init__(self, fallback_models: Optional[List[str]] = None, hedge_delay: float = 0.0,
+                 hedge_percentile: float = 95.0, min_samples: int = 20, window: int = 200,
+                 attempt_timeout: float = 0.0):
+        self.fallback_models = list(fallback_models or [])
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.attempt_timeout = attempt_timeout
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._served: Dict[str, Dict[str, int]] = {}
+        self._attempts: Dict[str, Dict[str, int]] = {}
+
+    def models(self, primary: str) -> List[str]:
+        """The primary followed by its fallbacks, in order"""
+        return [primary] + [name for name in self.fallback_models if name != primary]
+
+    def record_latency(self, model: str, seconds: float) -> None:
+        """A successful call's latency; safe to call from pool threads"""
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def hedge_delay_for(self, model: str) -> Optional[float]:
+        """Seconds to wait for the model before hedging, or None if hedging is off"""
+        if self.hedge_delay <= 0:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.min_samples:
+            return self.hedge_delay
+        return _percentile(samples, self.hedge_percentile)
+
+    def record_attempt(self, provider: str, model: str, result: str) -> None:
+        """result is ok, error, timeout or cancelled"""
+        with self._lock:
+            counts = self._attempts.setdefault(model, {})
+            counts[result] = counts.get(result, 0) + 1
+        record_model_attempt(provider, model, result)
+
+    def record_served(self, provider: str, model: str, role: str) -> None:
+        """The model whose answer the caller got; role is primary, hedge or fallback"""
+        with self._lock:
+            counts = self._served.setdefault(model, {})
+            counts[role] = counts.get(role, 0) + 1
+        record_model_served(provider, model, role)
+
+    async def run(self, provider: str, primary: str, attempt: Callable[[str], Awaitable[T]]) -> Tuple[T, str, str]:
+        """
+        Await attempt(model) for the primary model, hedging and falling back as configured.
+        Returns (result, model, role) of the first attempt to succeed; raises the last
+        error if every model failed.
+        """
+        loop = asyncio.get_running_loop()
+        remaining = self.models(primary)[1:]
+        pending = {}
+        last_error = None
+
+        def launch(model: str, role: str) -> None:
+            deadline = loop.time() + self.attempt_timeout if self.attempt_timeout > 0 else None
+            pending[asyncio.ensure_future(attempt(model))] = (model, role, deadline)
+
+        def fall_back(model: str, error: BaseException) -> None:
+            nonlocal hedge_at
+            logger.warning("Model %s failed, %s: %s", model,
+                           f"falling back to {remaining[0]}" if remaining else "no fallback left", error)
+            if remaining:
+                # A fallback replaces the hedge
+                hedge_at = None
+                launch(remaining.pop(0), "fallback")
+
+        launch(primary, "primary")
+        delay = self.hedge_delay_for(primary)
+        hedge_at = loop.time() + delay if delay is not None else None
+        try:
+            while pending:
+                deadlines = [deadline for _, _, deadline in pending.values() if deadline is not None]
+                if hedge_at is not None:
+                    deadlines.append(hedge_at)
+                timeout = max(0.0, min(deadlines) - loop.time()) if deadlines else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    model, role, _ = pending.pop(task)
+                    if task.exception() is None:
+                        self.record_attempt(provider, model, "ok")
+                        self.record_served(provider, model, role)
+                        return task.result(), model, role
+                    last_error = task.exception()
+                    self.record_attempt(provider, model, "error")
+                    fall_back(model, last_error)
+
+                now = loop.time()
+                for task, (model, role, deadline) in list(pending.items()):
+                    if deadline is not None and now >= deadline:
+                        del pending[task]
+                        task.cancel()
+                        last_error = TimeoutError(f"{model} did not answer within {self.attempt_timeout:g}s")
+                        self.record_attempt(provider, model, "timeout")
+                        fall_back(model, last_error)
+
+                if hedge_at is not None and now >= hedge_at and pending:
+                    hedge_at = None
+                    launch(remaining.pop(0) if remaining else primary, "hedge")
+            raise last_error
+        finally:
+            for task, (model, _, _) in pending.items():
+                task.cancel()
+                self.record_attempt(provider, model, "cancelled")
+
+    def stats(self) -> dict:
+        """Configuration, per-model attempt and served counts, and recent latency percentiles"""
+        with self._lock:
+            latencies = {model: sorted(samples) for model, samples in self._latencies.items()}
+            attempts = {model: dict(counts) for model, counts in self._attempts.items()}
+            served = {model: dict(counts) for model, counts in self._served.items()}
+        return {
+            "fallback_models": self.fallback_models,
+            "hedge_delay_seconds": self.hedge_delay,
+            "hedge_percentile": self.hedge_percentile,
+            "attempt_timeout_seconds": self.attempt_timeout,
+            "attempts": attempts,
+            "served": served,
+            "latency_seconds": {
+                model: {
+                    "samples": len(samples),
+                    "p50": round(_percentile(samples, 50), 4),
+                    "p95": round(_percentile(samples, 95), 4),
+                    "p99": round(_percentile(samples, 99), 4),
+                }
+                for model, samples in latencies.items() if samples
+            },
+        }
+
+model_router = ModelRouter(
+    LLM_FALLBACK_MODELS,
+    hedge_delay=LLM_HEDGE_DELAY_SECONDS,
+    hedge_percentile=LLM_HEDGE_PERCENTILE,
+    min_samples=LLM_HEDGE_MIN_SAMPLES,
+    window=LLM_LATENCY_WINDOW,
+    attempt_timeout=LLM_ATTEMPT_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,203 @@
+"""
+Structured logging for the app: one JSON object per line, tagged with the id of the
+request that logged it.
+
+Log calls only build the record and put it on a bounded queue; a listener thread formats
+it and writes to stderr, so a request never waits on stdout. Prompts and model responses
+are only logged at DEBUG, for a sampled fraction of requests, and truncated.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for the log pipeline, "text" for reading locally
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of requests whose debug payloads (prompts, responses) are logged
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+# Records beyond this many waiting for the writer are dropped (and counted) rather than block
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Incoming ids are reused so a request can be followed across services; anything else is replaced
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_payload_sampled: ContextVar[Optional[bool]] = ContextVar("payload_sampled", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "taskName"}
+
+class RequestContextFilter(logging.Filter):
+    """Copies the current request id onto the record while still on the request's task"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message, request id and extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that leaves formatting to the listener thread and drops records when
+    the queue is full instead of raising.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.addFilter(RequestContextFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, in case they change before the listener formats them
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+access_logger = logging.getLogger("app.access")
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging(stream=None) -> None:
+    """Route the app's loggers through the queue to stderr (idempotent)"""
+    global _handler, _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+    app_logger = logging.getLogger("app")
+    app_logger.addHandler(_handler)
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.propagate = False
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread"""
+    global _handler, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger("app").removeHandler(_handler)
+    _handler = None
+    _listener = None
+
+def get_logging_stats() -> dict:
+    """Records waiting for the writer and records dropped because the queue was full"""
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+def payload_sampled() -> bool:
+    """Whether the current request logs debug payloads; decided once per request"""
+    sampled = _payload_sampled.get()
+    if sampled is None:
+        sampled = random.random() < LOG_PAYLOAD_SAMPLE_RATE
+        _payload_sampled.set(sampled)
+    return sampled
+
+def _truncate(value) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    if len(text) <= LOG_PAYLOAD_MAX_CHARS:
+        return text
+    return text[:LOG_PAYLOAD_MAX_CHARS] + f"... ({len(text)} chars)"
+
+def log_payload(logger: logging.Logger, message: str, /, **payloads) -> None:
+    """Log user content (prompts, responses) at DEBUG for sampled requests only, truncated"""
+    if not logger.isEnabledFor(logging.DEBUG) or not payload_sampled():
+        return
+    logger.debug(message, extra={key: _truncate(value) for key, value in payloads.items()})
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware that gives every HTTP request an id (the caller's X-Request-ID if it
+    is valid), makes it available to log records, echoes it in the response and writes
+    one access record per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        request_id_token = request_id_var.set(request_id)
+        sampled_token = _payload_sampled.set(None)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.lower().encode("latin-1"), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            access_logger.info(
+                "%s %s %s", scope["method"], scope["path"], status,
+                extra={"status": status, "duration_ms": round((time.perf_counter() - start) * 1000, 2)}
+            )
+            request_id_var.reset(request_id_token)
+            _payload_sampled.reset(sampled_token)
@@ -0,0 +1,164 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Under several uvicorn/gunicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory
+shared by the workers (and cleared on deploy): each worker then writes its samples to
+memory-mapped files there and a scrape of any worker aggregates all of them. Without it
+metrics live in the process, which is right for a single worker.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# The multiprocess directory must be known before prometheus_client is imported
+load_dotenv()
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Model calls and whole chat turns take seconds, well past the default buckets
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+HTTP_REQUESTS = Counter(
+    "omeyo_http_requests_total", "HTTP requests by route template and status",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "omeyo_http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route"], buckets=SLOW_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    "omeyo_http_requests_in_progress", "HTTP requests being handled",
+    ["method"], multiprocess_mode="livesum"
+)
+CHAT_STAGE_SECONDS = Histogram(
+    "omeyo_chat_stage_duration_seconds",
+    "Time spent in each stage of a chat turn (auth, prompt_build, llm_call, footprint_parse, db_write)",
+    ["endpoint", "stage"], buckets=SLOW_BUCKETS
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "omeyo_llm_request_duration_seconds", "Model API call latency (queueing on the LLM pool excluded)",
+    ["provider", "operation"], buckets=SLOW_BUCKETS
+)
+LLM_ERRORS = Counter(
+    "omeyo_llm_errors_total", "Model API calls that raised or returned an error status",
+    ["provider", "operation"]
+)
+LLM_TOKENS = Counter(
+    "omeyo_llm_tokens_total", "Tokens reported by the model API",
+    ["provider", "kind"]
+)
+LLM_MODEL_SECONDS = Histogram(
+    "omeyo_llm_model_duration_seconds", "Latency of successful model calls by model, including hedges that lost",
+    ["provider", "model"], buckets=SLOW_BUCKETS
+)
+LLM_MODEL_ATTEMPTS = Counter(
+    "omeyo_llm_model_attempts_total", "Model call attempts by model and result (ok, error, timeout, cancelled)",
+    ["provider", "model", "result"]
+)
+LLM_MODEL_SERVED = Counter(
+    "omeyo_llm_model_served_total", "Calls answered by each model, as primary, hedge or fallback",
+    ["provider", "model", "role"]
+)
+LLM_IN_PROGRESS = Gauge(
+    "omeyo_llm_requests_in_progress", "Model API calls in flight",
+    ["provider"], multiprocess_mode="livesum"
+)
+
+@contextmanager
+def observe_stage(endpoint: str, stage: str):
+    """Record the duration of one chat stage, whether or not it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        CHAT_STAGE_SECONDS.labels(endpoint, stage).observe(time.perf_counter() - start)
+
+@contextmanager
+def observe_llm_call(provider: str, operation: str):
+    """Time a model API call, counting it as in flight and as an error if it raises"""
+    in_progress = LLM_IN_PROGRESS.labels(provider)
+    in_progress.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        LLM_ERRORS.labels(provider, operation).inc()
+        raise
+    finally:
+        LLM_REQUEST_SECONDS.labels(provider, operation).observe(time.perf_counter() - start)
+        in_progress.dec()
+
+def record_llm_error(provider: str, operation: str) -> None:
+    """Count a call that failed without raising (e.g. an HTTP error status)"""
+    LLM_ERRORS.labels(provider, operation).inc()
+
+def observe_model_latency(provider: str, model: str, seconds: float) -> None:
+    LLM_MODEL_SECONDS.labels(provider, model).observe(seconds)
+
+def record_model_attempt(provider: str, model: str, result: str) -> None:
+    LLM_MODEL_ATTEMPTS.labels(provider, model, result).inc()
+
+def record_model_served(provider: str, model: str, role: str) -> None:
+    LLM_MODEL_SERVED.labels(provider, model, role).inc()
+
+def record_llm_usage(provider: str, prompt_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+    """Add a response's prompt and output token counts, if the provider reported them"""
+    for kind, count in (("prompt", prompt_tokens), ("output", output_tokens)):
+        if isinstance(count, int) and count > 0:
+            LLM_TOKENS.labels(provider, kind).inc(count)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware for request count, latency and in-flight gauges. Routes are labelled
+    by their template (/paths/{user_id}), never the raw path, to keep cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "<unmatched>"
+            HTTP_REQUESTS.labels(method, route_path, str(status)).inc()
+            HTTP_REQUEST_SECONDS.labels(method, route_path).observe(elapsed)
+
+def render_metrics() -> bytes:
+    """The text exposition of every metric, aggregated over workers in multiprocess mode"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_worker_stopped() -> None:
+    """Drop this worker's live gauges from the multiprocess aggregate (on shutdown)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
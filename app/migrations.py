@@ -0,0 +1,119 @@
+import json
+
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.engine import Engine
+
+from .models import Base, User
+from .utils import coerce_ocean_scores, match_ocean_to_coach_personality
+
+def ensure_columns(engine: Engine) -> list:
+    """
+    Add any nullable column declared on the models that is missing from an existing table.
+
+    Like indexes, new columns are only created by Base.metadata.create_all together with
+    their table. Returns the added columns as "table.column".
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as connection:
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+def missing_indexes(engine: Engine) -> list:
+    """
+    The indexes declared on the models that an existing table does not have yet.
+
+    Base.metadata.create_all only creates indexes together with new tables, so databases
+    created before an index was added lack them. Read-only; safe to run on every startup.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing_indexes)
+    return missing
+
+def ensure_indexes(engine: Engine) -> list:
+    """
+    Create the missing indexes (see missing_indexes). Returns the names of those created.
+
+    On PostgreSQL each index is built with CREATE INDEX CONCURRENTLY on an autocommit
+    connection, so writes to a large table are not locked while it builds. Run it once
+    per deploy (python -m app.migrations), not from every worker.
+    """
+    concurrently = engine.dialect.name == "postgresql"
+    created = []
+    for index in missing_indexes(engine):
+        if concurrently:
+            # Only for this statement: create_all must keep building indexes of new tables
+            # inside its transaction, where CONCURRENTLY is not allowed
+            options = index.dialect_options["postgresql"]
+            previous = options["concurrently"]
+            options["concurrently"] = True
+            try:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    index.create(bind=connection, checkfirst=True)
+            finally:
+                options["concurrently"] = previous
+        else:
+            index.create(bind=engine, checkfirst=True)
+        created.append(index.name)
+    return created
+
+def backfill_ocean_scores(engine: Engine, batch_size: int = 500) -> int:
+    """
+    Copy OCEAN scores from the legacy JSON column into the per-trait columns and set
+    coach_personality. Only touches rows that have JSON but no coach_personality yet, so it
+    can be re-run safely. Returns the number of users updated.
+    """
+    pending = select(User.id, User.ocean_scores_json.label("ocean_scores_json")).where(
+        User.ocean_scores_json.isnot(None), User.coach_personality.is_(None)
+    ).order_by(User.id).limit(batch_size)
+    updated = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(pending.where(User.id > last_id)).all()
+            if not rows:
+                return updated
+            for row in rows:
+                try:
+                    ocean_scores = json.loads(row.ocean_scores_json)
+                except ValueError:
+                    ocean_scores = None
+                if not isinstance(ocean_scores, dict):
+                    ocean_scores = None
+                scores = coerce_ocean_scores(ocean_scores)
+                # Unreadable JSON still gets "Default" so the row is not picked up again
+                connection.execute(
+                    update(User).where(User.id == row.id).values(
+                        **scores, coach_personality=match_ocean_to_coach_personality(scores)
+                    )
+                )
+            updated += len(rows)
+            last_id = rows[-1].id
+
+if __name__ == "__main__":
+    from .database import engine
+
+    added_columns = ensure_columns(engine)
+    print(f"Added columns: {', '.join(added_columns) if added_columns else 'none'}")
+    created_indexes = ensure_indexes(engine)
+    print(f"Created indexes: {', '.join(created_indexes) if created_indexes else 'none'}")
+    print(f"Backfilled OCEAN scores for {backfill_ocean_scores(engine)} users")
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, Date, Boolean, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import engine
+from .utils import OCEAN_TRAITS, coerce_ocean_scores, match_ocean_to_coach_personality
 
 Base = declarative_base()
 
@@ -16,10 +17,35 @@ class User(Base):
     totem_animal = Column(String)
     totem_emoji = Column(String)
     totem_title = Column(String)
-    ocean_scores = Column(String)  # JSON string of personality scores
+    # OCEAN personality scores, one column per trait (0-100)
+    openness = Column(Float)
+    conscientiousness = Column(Float)
+    extraversion = Column(Float)
+    agreeableness = Column(Float)
+    neuroticism = Column(Float)
+    # match_ocean_to_coach_personality(ocean_scores), kept in sync by the ocean_scores setter
+    coach_personality = Column(String, index=True)
+    # Legacy JSON string of the scores; only read by migrations.backfill_ocean_scores
+    ocean_scores_json = Column("ocean_scores", String)
     goals = relationship("Goal", back_populates="user")
     paths = relationship("Path", back_populates="user")
 
+    @property
+    def ocean_scores(self):
+        """The trait scores as a dict, without missing traits; None if there are none"""
+        scores = {trait: getattr(self, trait) for trait in OCEAN_TRAITS}
+        scores = {trait: score for trait, score in scores.items() if score is not None}
+        return scores or None
+
+    @ocean_scores.setter
+    def ocean_scores(self, ocean_scores):
+        scores = coerce_ocean_scores(ocean_scores)
+        for trait, score in scores.items():
+            setattr(self, trait, score)
+        self.coach_personality = match_ocean_to_coach_personality(scores) if any(
+            score is not None for score in scores.values()
+        ) else None
+
 class Path(Base):
     __tablename__ = "paths"
     id = Column(Integer, primary_key=True, index=True)
@@ -32,10 +58,15 @@ class Path(Base):
     user = relationship("User", back_populates="paths")
     footprints = relationship("Footprint", back_populates="path")
 
+    __table_args__ = (
+        # GET /paths/{user_id}: keyset pages ordered by (created_at, id)
+        Index("ix_paths_user_created", "user_id", "created_at", "id"),
+    )
+
 class Goal(Base):
     __tablename__ = "goals"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     description = Column(String)
     status = Column(String)
     user = relationship("User", back_populates="goals")
@@ -54,6 +85,47 @@ class Footprint(Base):
     user = relationship("User", backref="footprints")
     path = relationship("Path", back_populates="footprints")
 
+    __table_args__ = (
+        # GET /footprints/{user_id}: keyset pages ordered by (due_time, id), due date ranges
+        Index("ix_footprints_user_due", "user_id", "due_time", "id"),
+        # "Open items" / "done today" views filter on completion before due date
+        Index("ix_footprints_user_completed_due", "user_id", "is_completed", "due_time"),
+        # Footprints of a path in priority order (GET /paths/{user_id})
+        Index("ix_footprints_path_priority", "path_id", "priority"),
+    )
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    # Rolling summary of every message with id <= summarized_through_id
+    summary = Column(Text)
+    summary_tokens = Column(Integer, default=0)
+    summarized_through_id = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    messages = relationship("Message", back_populates="conversation")
+
+    __table_args__ = (
+        # A user's conversations, most recently active first
+        Index("ix_conversations_user_updated", "user_id", "updated_at"),
+    )
+
+class Message(Base):
+    __tablename__ = "messages"
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    role = Column(String(16))  # "user" or "assistant"
+    content = Column(Text)  # visible text only; footprint blocks live in the footprints table
+    tokens = Column(Integer)  # estimated once on insert, summed by the context builder
+    created_at = Column(DateTime, default=datetime.utcnow)
+    conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        # Context window and history pages walk a conversation by id
+        Index("ix_messages_conversation_id", "conversation_id", "id"),
+    )
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
@@ -0,0 +1,48 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque keyset cursor holding the sort key of the last row on a page"""
+    payload = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types: Any) -> List[Any]:
+    """
+    Decode a cursor made by encode_cursor into one value per expected type (a type, or a
+    tuple of types for a nullable key). Raises HTTP 400 if it is malformed or a value has
+    the wrong type, so a forged cursor never reaches the keyset comparison.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("unexpected cursor shape")
+        values = [_decode_value(v) for v in values]
+        for value, expected in zip(values, types):
+            # Exact types: bool is an int and datetime is a date, but neither belongs here
+            if type(value) not in (expected if isinstance(expected, tuple) else (expected,)):
+                raise ValueError(f"unexpected {type(value).__name__} in cursor")
+        return values
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
@@ -0,0 +1,245 @@
+"""
+Prompt registry: every template the app sends to the model, compiled once at import.
+
+Templates carry a version (bump it when the wording changes, so anything cached on the
+prompt is invalidated) and record their size in bytes and estimated tokens, along with
+how often and how much they are rendered, for /stats.
+"""
+import math
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional
+
+from .streaming import FOOTPRINTS_OPEN_TAG, FOOTPRINTS_CLOSE_TAG
+
+# Shared by every chat prompt that may return footprints
+FOOTPRINTS_FORMAT_INSTRUCTIONS = (
+    "If you suggest any actionable steps, output them as a JSON array at the end of your response, "
+    f"wrapped in {FOOTPRINTS_OPEN_TAG} and {FOOTPRINTS_CLOSE_TAG} tags, like this:\n"
+    f"{FOOTPRINTS_OPEN_TAG}\n[\n"
+    "  {\"action\": \"Drink a glass of water\", \"due_time\": \"Today\"},\n"
+    "  {\"action\": \"Meditate for 5 minutes\", \"due_time\": \"Tomorrow\"}\n"
+    f"]\n{FOOTPRINTS_CLOSE_TAG}"
+)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 bytes per token for English); exact counts need a model call"""
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    A str.format template. With footprints=True the shared footprint format instructions
+    are appended after formatting, so they never need brace escaping.
+    """
+    name: str
+    version: str
+    text: str
+    footprints: bool = False
+
+    @property
+    def fields(self) -> bool:
+        return "{" in self.text.replace("{{", "").replace("}}", "")
+
+    def render(self, **values) -> str:
+        text = self.text.format(**values) if self.fields else self.text
+        return text + FOOTPRINTS_FORMAT_INSTRUCTIONS if self.footprints else text
+
+class PromptRegistry:
+    """Named templates plus per-template size and usage counters"""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+        # Templates without fields are rendered once here instead of on every call
+        self._static: Dict[str, str] = {}
+        self._renders: Dict[str, int] = {}
+        self._rendered_bytes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, text: str, version: str = "1", footprints: bool = False) -> PromptTemplate:
+        if name in self._templates:
+            raise ValueError(f"Prompt template {name!r} is already registered")
+        template = PromptTemplate(name=name, version=version, text=text, footprints=footprints)
+        self._templates[name] = template
+        if not template.fields:
+            self._static[name] = template.render()
+        self._renders[name] = 0
+        self._rendered_bytes[name] = 0
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        """The template registered under name; KeyError if there is none"""
+        return self._templates[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def render(self, name: str, /, **values) -> str:
+        text = self._static.get(name)
+        if text is None:
+            text = self._templates[name].render(**values)
+        with self._lock:
+            self._renders[name] += 1
+            self._rendered_bytes[name] += len(text.encode("utf-8"))
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            renders = dict(self._renders)
+            rendered_bytes = dict(self._rendered_bytes)
+        templates = {}
+        for name, template in self._templates.items():
+            # Static templates report their final size; others their size before formatting
+            text = self._static.get(name) or template.text + (FOOTPRINTS_FORMAT_INSTRUCTIONS if template.footprints else "")
+            templates[name] = {
+                "version": template.version,
+                "bytes": len(text.encode("utf-8")),
+                "tokens": estimate_tokens(text),
+                "renders": renders[name],
+                "rendered_bytes": rendered_bytes[name],
+            }
+        return {
+            "templates": templates,
+            "coach_prompt_cache": _coach_prompt_cache_stats(),
+        }
+
+prompt_registry = PromptRegistry()
+
+# Manual personalities for users without OCEAN scores (ChatMessage.personality)
+prompt_registry.register(
+    "chat.coach",
+    "You are a motivational coach. Be encouraging, goal-oriented, and help users stay focused on their objectives. ",
+    footprints=True
+)
+prompt_registry.register(
+    "chat.mentor",
+    "You are a wise mentor. Provide thoughtful guidance, share insights, and help users think through their challenges. ",
+    footprints=True
+)
+prompt_registry.register(
+    "chat.friend",
+    "You are a supportive friend. Be warm, understanding, and provide emotional support while being encouraging. ",
+    footprints=True
+)
+prompt_registry.register(
+    "chat.therapist",
+    "You are an empathetic therapist. Listen carefully, validate feelings, and provide therapeutic insights and coping strategies. ",
+    footprints=True
+)
+
+# Coach personalities matched from OCEAN scores (utils.match_ocean_to_coach_personality)
+COACH_PERSONALITIES = {
+    "Openness": "You are an AI coach who is highly creative, imaginative, and encourages exploring new ideas and possibilities. Emphasize originality and unconventional thinking.",
+    "Conscientiousness": "You are an AI coach who is extremely organized, responsible, and detail-oriented. Focus on planning, setting achievable goals, and maintaining discipline.",
+    "Extraversion": "You are an AI coach who is very energetic, outgoing, and enthusiastic. Use a lively and engaging tone, and encourage social interaction and active participation.",
+    "Agreeableness": "You are an AI coach who is incredibly warm, empathetic, and cooperative. Show understanding, offer support, and promote harmony and positive relationships.",
+    "Neuroticism": "You are an AI coach who is very calm, reassuring, and emotionally stable. Help the user manage anxiety, provide a sense of security, and encourage coping strategies.",
+    "Default": "You are a helpful and encouraging AI coach, providing general support and guidance.",
+}
+for _personality, _text in COACH_PERSONALITIES.items():
+    prompt_registry.register(f"personality.{_personality}", _text)
+
+# Personalized system prompt for users with a totem profile
+prompt_registry.register(
+    "coach.totem",
+    "You are an AI companion for a user with the following personality profile:\n"
+    "Title: {title}\n"
+    "Description: {description}\n"
+    "Motivational Style: {motivation}\n\n"
+    "Your goal is to support the user in a way that fits their unique personality. "
+    "Focus on their strengths, communication style, and what motivates them. "
+    "Be supportive and adaptive—if their personality is more reserved, gentle, or cautious, match that tone. "
+    "If their personality is more energetic or optimistic, encourage them in a way that feels natural for them. "
+    "Do not mimic or reference the animal symbol; focus on the human personality and how best to help them grow. "
+    "\n\nThe idea of the AI is to constantly analyze the user's responses to see if it can generate actions, activatables, or areas for personal improvement, in order to create a plan that is divided into simple steps. ",
+    footprints=True
+)
+
+# Personalized system prompt from the coach personality alone
+prompt_registry.register(
+    "coach.personality",
+    "{personality_prompt}\n\nYou are an AI companion. Be supportive, positive, and help the user grow. "
+    "Constantly analyze the user's responses to generate actions, activatables, or areas for personal improvement, and create a plan divided into simple steps. ",
+    footprints=True
+)
+
+# /generate-footprints-from-dream; its version is part of the dream plan cache key
+prompt_registry.register("dream", """
+You are a motivational coach helping someone achieve their dream. The user has shared their dream: "{dream}"
+
+Based on this dream, create 5-8 actionable, specific steps that will help them achieve their goal. Each step should be:
+- Specific and actionable
+- Realistic and achievable
+- Time-bound with clear deadlines
+- Progressive (building towards the final goal)
+
+Output the steps as a JSON array wrapped in [FOOTPRINTS] and [/FOOTPRINTS] tags, like this:
+[FOOTPRINTS]
+[
+  {{"action": "Research the best online courses for web development", "due_time": "Today"}},
+  {{"action": "Enroll in a beginner-friendly coding bootcamp", "due_time": "Tomorrow"}},
+  {{"action": "Practice coding for 1 hour daily", "due_time": "This week"}},
+  {{"action": "Build your first simple website", "due_time": "Next week"}},
+  {{"action": "Create a portfolio of 3 projects", "due_time": "Next month"}}
+]
+[/FOOTPRINTS]
+
+Make sure the steps are tailored to their specific dream and will create a clear path to success.
+""")
+
+# Rolling summary of the turns that no longer fit a conversation's context window
+prompt_registry.register("conversation.summary", """
+Summarize the conversation between a user and their AI coach below in at most {max_words} words.
+Keep the user's goals, commitments, progress, preferences and open questions; drop small talk.
+Write it as notes the coach will read before the next turn.
+
+Summary so far:
+{summary}
+
+New messages:
+{transcript}
+""")
+
+def personality_prompt(personality: Optional[str]) -> str:
+    """The short persona description for a coach personality ("Default" if unknown)"""
+    name = f"personality.{personality}"
+    return prompt_registry.render(name if name in prompt_registry else "personality.Default")
+
+def chat_persona_prompt(persona: Optional[str]) -> str:
+    """System prompt for a manually selected chat personality ("coach" if unknown)"""
+    name = f"chat.{persona}"
+    return prompt_registry.render(name if name in prompt_registry else "chat.coach")
+
+def coach_system_prompt(coach_personality: Optional[str], totem_profile: Optional[dict] = None) -> str:
+    """
+    Personalized system prompt for a user. Only the fields the prompt actually uses make
+    up the cache key, so users sharing a profile share one rendered string.
+    """
+    if totem_profile:
+        key = ("coach.totem", totem_profile.get("title", ""),
+               totem_profile.get("description", ""), totem_profile.get("motivation", ""))
+    else:
+        key = ("coach.personality", coach_personality or "Default")
+    return _render_coach_prompt(key)
+
+USER_PROMPT_CACHE_SIZE = int(os.getenv("USER_PROMPT_CACHE_SIZE", "4096"))
+
+@lru_cache(maxsize=USER_PROMPT_CACHE_SIZE)
+def _render_coach_prompt(key: tuple) -> str:
+    if key[0] == "coach.totem":
+        _, title, description, motivation = key
+        return prompt_registry.render("coach.totem", title=title, description=description, motivation=motivation)
+    return prompt_registry.render("coach.personality", personality_prompt=personality_prompt(key[1]))
+
+def _coach_prompt_cache_stats() -> dict:
+    info = _render_coach_prompt.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
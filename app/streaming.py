@@ -0,0 +1,80 @@
+import json
+from typing import Any, List, Tuple
+
+FOOTPRINTS_OPEN_TAG = "[FOOTPRINTS]"
+FOOTPRINTS_CLOSE_TAG = "[/FOOTPRINTS]"
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of tag"""
+    for length in range(min(len(text), len(tag) - 1), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+class FootprintStreamParser:
+    """
+    Incrementally splits a streamed AI response into visible text and footprint blocks.
+
+    feed() returns a list of ("text", str) and ("footprints", list) events. Text that
+    could be the start of a [FOOTPRINTS] tag is held back until the next chunk decides
+    it, so the tags and the JSON between them never reach the visible output.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_block = False
+        self.footprints: List[dict] = []
+        self.errors: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self._buffer += chunk
+        events = []
+        while True:
+            if not self._in_block:
+                index = self._buffer.find(FOOTPRINTS_OPEN_TAG)
+                if index >= 0:
+                    if index:
+                        events.append(("text", self._buffer[:index]))
+                    self._buffer = self._buffer[index + len(FOOTPRINTS_OPEN_TAG):]
+                    self._in_block = True
+                    continue
+                hold = _partial_tag_length(self._buffer, FOOTPRINTS_OPEN_TAG)
+                visible = self._buffer[:len(self._buffer) - hold]
+                if visible:
+                    events.append(("text", visible))
+                self._buffer = self._buffer[len(visible):]
+                return events
+
+            index = self._buffer.find(FOOTPRINTS_CLOSE_TAG)
+            if index < 0:
+                return events
+            block = self._buffer[:index]
+            self._buffer = self._buffer[index + len(FOOTPRINTS_CLOSE_TAG):]
+            self._in_block = False
+            try:
+                parsed = json.loads(block)
+            except json.JSONDecodeError as e:
+                self.errors.append(f"Error parsing footprints JSON: {e}")
+                continue
+            if isinstance(parsed, dict):
+                parsed = [parsed]
+            elif not isinstance(parsed, list):
+                self.errors.append(f"Footprints block is a JSON {type(parsed).__name__}, expected a list")
+                continue
+            self.footprints.extend(parsed)
+            events.append(("footprints", parsed))
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """Flush held-back text at the end of the stream. An unterminated block is dropped."""
+        events = []
+        if self._in_block:
+            self.errors.append("Footprints block was not closed")
+        elif self._buffer:
+            events.append(("text", self._buffer))
+        self._buffer = ""
+        self._in_block = False
+        return events
@@ -0,0 +1,221 @@
+"""
+OpenTelemetry tracing: a span per HTTP request, per pipeline stage (chat, dream, image),
+per model call and per SQL statement, for latency waterfalls of slow requests.
+
+TRACING_EXPORTER selects where finished spans go:
+  none   tracing off; spans are the API's no-op spans (the default)
+  file   JSON lines in TRACING_FILE, one span per line
+  otlp   OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (a collector, Jaeger, Tempo...)
+Spans are exported in batches from a background thread.
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+
+from .logging_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "omeyo-api")
+# SQL text is kept on query spans up to this length (statements are parameterized, no values)
+TRACING_MAX_STATEMENT_CHARS = int(os.getenv("TRACING_MAX_STATEMENT_CHARS", "1000"))
+
+_tracer = trace.NoOpTracer()
+_provider = None
+
+def tracing_enabled() -> bool:
+    return _provider is not None
+
+class JsonLinesSpanExporter:
+    """Writes finished spans to a file, one compact JSON object per line"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def span_to_dict(span) -> dict:
+        context = span.get_span_context()
+        return {
+            "name": span.name,
+            "trace_id": format(context.trace_id, "032x"),
+            "span_id": format(context.span_id, "016x"),
+            "parent_span_id": format(span.parent.span_id, "016x") if span.parent else None,
+            "start_time_unix_nano": span.start_time,
+            "end_time_unix_nano": span.end_time,
+            "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+            "status": span.status.status_code.name,
+            "attributes": dict(span.attributes or {}),
+        }
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        lines = "".join(json.dumps(self.span_to_dict(span), default=str) + "\n" for span in spans)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+def _create_exporter(name: str):
+    if name == "file":
+        return JsonLinesSpanExporter(TRACING_FILE)
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {name!r} (expected none, file or otlp)")
+
+def configure_tracing(exporter=None, batch: bool = True) -> bool:
+    """
+    Install a tracer provider exporting to the given exporter, or to TRACING_EXPORTER.
+    Returns False (tracing stays off) if it is "none" or the SDK is not installed.
+    """
+    global _tracer, _provider
+    if _provider is not None:
+        return True
+    if exporter is None and TRACING_EXPORTER == "none":
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        if exporter is None:
+            exporter = _create_exporter(TRACING_EXPORTER)
+    except ImportError as e:
+        logger.warning("Tracing disabled, OpenTelemetry SDK or exporter not installed: %s", e)
+        return False
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter))
+    _tracer = _provider.get_tracer("app")
+    return True
+
+def shutdown_tracing() -> None:
+    """Flush and stop the exporter; later spans are no-ops"""
+    global _tracer, _provider
+    if _provider is None:
+        return
+    _provider.shutdown()
+    _provider = None
+    _tracer = trace.NoOpTracer()
+
+@contextmanager
+def start_span(name: str, **attributes):
+    """A child of the current span; records the exception and error status if the body raises"""
+    with _tracer.start_as_current_span(name, attributes=attributes or None) as span:
+        yield span
+
+def set_current_span_attributes(attributes: dict) -> None:
+    """Add attributes to the current span (a no-op outside a recording span)"""
+    trace.get_current_span().set_attributes(attributes)
+
+def set_span_status_error(span, description: str) -> None:
+    """Mark a span failed for an error that was handled rather than raised"""
+    span.set_status(Status(StatusCode.ERROR, description))
+
+def _start_query_span(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    span = _tracer.start_span("db.query", attributes={
+        "db.system": conn.dialect.name,
+        "db.statement": statement[:TRACING_MAX_STATEMENT_CHARS],
+        "db.operation": statement.lstrip().split(" ", 1)[0].upper(),
+    })
+    context._trace_span = span
+
+def _end_query_span(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rows", cursor.rowcount)
+        span.end()
+        context._trace_span = None
+
+def _fail_query_span(exception_context):
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        set_span_status_error(span, type(exception_context.original_exception).__name__)
+        span.end()
+        exception_context.execution_context._trace_span = None
+
+_QUERY_SPAN_LISTENERS = (
+    ("before_cursor_execute", _start_query_span),
+    ("after_cursor_execute", _end_query_span),
+    ("handle_error", _fail_query_span),
+)
+
+def trace_engine(sync_engine) -> None:
+    """A span per SQL statement on this engine (for an AsyncEngine pass its sync_engine)"""
+    from sqlalchemy import event
+
+    for name, listener in _QUERY_SPAN_LISTENERS:
+        if not event.contains(sync_engine, name, listener):
+            event.listen(sync_engine, name, listener)
+
+def untrace_engine(sync_engine) -> None:
+    """Undo trace_engine"""
+    from sqlalchemy import event
+
+    for name, listener in _QUERY_SPAN_LISTENERS:
+        if event.contains(sync_engine, name, listener):
+            event.remove(sync_engine, name, listener)
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens the root span of each HTTP request, named after the route
+    template once routing has matched it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracing_enabled():
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with _tracer.start_as_current_span(
+            f"{method} {scope['path']}", kind=trace.SpanKind.SERVER,
+            attributes={"http.request.method": method, "url.path": scope["path"]}
+        ) as span:
+            # Links the trace to the request's log lines
+            request_id = request_id_var.get()
+            if request_id:
+                span.set_attribute("request.id", request_id)
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.update_name(f"{method} {route}")
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status)
+                if status >= 500:
+                    set_span_status_error(span, f"HTTP {status}")
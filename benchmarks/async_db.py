@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent LLM-bound requests when every database statement is slow.
+
+Each request to /generate-footprints-from-dream waits on a fake model and then saves a
+path with its footprints. SQLite is given a fixed per-statement latency (like a remote
+Postgres round trip). Two modes are compared:
+
+  async     the route's AsyncSession (aiosqlite): statements wait off the event loop
+  blocking  the previous behaviour, a sync Session queried directly on the event loop
+
+"max loop lag" is the longest time the event loop could not run anything else.
+
+Usage:
+    python benchmarks/async_db.py --requests 32 --llm-latency 0.25 --db-latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.util import await_only
+
+from app.database import SessionLocal, async_engine, engine, get_async_db
+from app.main import app
+
+FOOTPRINTS = [{"action": f"Step {i}", "due_time": "This week"} for i in range(5)]
+
+
+def make_fake_model(latency: float):
+    fake_model = MagicMock()
+
+    def generate_content(prompt, **kwargs):
+        time.sleep(latency)
+        return MagicMock(text=f"[FOOTPRINTS]{json.dumps(FOOTPRINTS)}[/FOOTPRINTS]")
+
+    fake_model.generate_content.side_effect = generate_content
+    return fake_model
+
+
+def add_statement_latency(latency: float):
+    """Sleep before every statement, on whichever thread runs it"""
+    def slow(sql):
+        time.sleep(latency)
+
+    @event.listens_for(engine, "connect")
+    def on_sync_connect(dbapi_connection, record):
+        dbapi_connection.set_trace_callback(slow)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def on_async_connect(dbapi_connection, record):
+        await_only(dbapi_connection.driver_connection.set_trace_callback(slow))
+
+    # Connections opened at startup don't have the callback yet
+    engine.dispose()
+
+
+class BlockingSession:
+    """A sync session behind the AsyncSession.run_sync interface, run on the event loop"""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.session, *args, **kwargs)
+
+
+async def blocking_db():
+    db = SessionLocal()
+    try:
+        yield BlockingSession(db)
+    finally:
+        db.close()
+
+
+async def run_round(client: httpx.AsyncClient, total_requests: int, label: str):
+    lag = 0.0
+    running = True
+
+    async def watch_loop():
+        nonlocal lag
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - start - 0.005)
+
+    watcher = asyncio.create_task(watch_loop())
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.post("/generate-footprints-from-dream", json={"dream": f"{label} dream {i}", "user_id": 1})
+        for i in range(total_requests)
+    ))
+    elapsed = time.perf_counter() - start
+    running = False
+    await watcher
+    failed = [r for r in responses if r.status_code != 200 or not r.json()["footprints"]]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed, first: {failed[0].text}")
+    return elapsed, lag
+
+
+async def main(args):
+    add_statement_latency(args.db_latency)
+    transport = httpx.ASGITransport(app=app)
+    print(f"{'mode':>9} {'requests':>9} {'seconds':>9} {'req/s':>9} {'max loop lag':>13}")
+    with patch("app.ai_agent.model", make_fake_model(args.llm_latency)):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for mode in args.modes:
+                if mode == "blocking":
+                    app.dependency_overrides[get_async_db] = blocking_db
+                try:
+                    elapsed, lag = await run_round(client, args.requests, mode)
+                finally:
+                    app.dependency_overrides.pop(get_async_db, None)
+                print(f"{mode:>9} {args.requests:>9} {elapsed:>9.2f} {args.requests / elapsed:>9.1f} {lag:>12.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32, help="concurrent requests per round")
+    parser.add_argument("--llm-latency", type=float, default=0.25, help="simulated model latency in seconds")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="simulated latency per SQL statement")
+    parser.add_argument("--modes", nargs="+", choices=["async", "blocking"], default=["blocking", "async"])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent /chat throughput against the size of the LLM pool.
+
+The model provider is replaced with the stub, which sleeps for a fixed latency on the
+LLM pool, so the numbers show how many chat turns a single worker can overlap, not
+model speed.
+
+Usage:
+    python benchmarks/chat_concurrency.py --requests 64 --latency 0.25 --pool-sizes 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+import httpx
+
+from app import ai_agent
+from app.llm_providers import StubProvider
+from app.main import app
+
+
+def make_fake_provider(latency: float) -> StubProvider:
+    return StubProvider({"responses": [{"text": "Keep going, you are doing great!"}]}, latency=latency)
+
+
+async def run_round(client: httpx.AsyncClient, total_requests: int) -> float:
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.post("/chat", json={"message": f"message {i}", "personality": "coach"})
+        for i in range(total_requests)
+    ))
+    elapsed = time.perf_counter() - start
+    failed = [r for r in responses if r.status_code != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed, first: {failed[0].text}")
+    return elapsed
+
+
+async def main(args):
+    transport = httpx.ASGITransport(app=app)
+    print(f"{'pool':>6} {'requests':>9} {'seconds':>9} {'req/s':>9}")
+    previous = ai_agent.set_llm_provider(make_fake_provider(args.latency))
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for pool_size in args.pool_sizes:
+                ai_agent.configure_llm_pool(pool_size)
+                elapsed = await run_round(client, args.requests)
+                print(f"{pool_size:>6} {args.requests:>9} {elapsed:>9.2f} {args.requests / elapsed:>9.1f}")
+    finally:
+        ai_agent.set_llm_provider(previous)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64, help="concurrent /chat requests per round")
+    parser.add_argument("--latency", type=float, default=0.25, help="simulated model latency in seconds")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    asyncio.run(main(parser.parse_args()))
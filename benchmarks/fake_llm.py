@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the Gemini and Imagen APIs, for load tests.
+
+Serves the REST endpoints the app calls, after a configurable latency with jitter:
+
+  POST /v1beta/models/{model}:generateContent        one Gemini response
+  POST /v1beta/models/{model}:streamGenerateContent  the same reply as a streamed JSON array
+  POST /v1/projects/.../models/{model}:predict       one Imagen prediction (a 1x1 PNG)
+  POST /token                                        an OAuth token for a fake service account
+
+Point the app at it with GEMINI_API_ENDPOINT and IMAGEN_API_ENDPOINT (see
+service_account_credentials() for GOOGLE_CLOUD_CREDENTIALS).
+
+Usage:
+    python benchmarks/fake_llm.py --port 9100 --latency 0.3 --jitter 0.1
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PNG_1X1 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+
+REPLY = "That's a great goal. Start small and build the habit one day at a time."
+FOOTPRINTS = [
+    {"action": "Write down the goal", "due_time": "Today"},
+    {"action": "Block 20 minutes for it", "due_time": "Tomorrow"},
+    {"action": "Review progress", "due_time": "This week"},
+]
+
+
+class FakeLLMConfig:
+    """Shared by all handler threads; counters are for reporting"""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, footprint_ratio: float = 0.5,
+                 stream_chunks: int = 8, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.footprint_ratio = footprint_ratio
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def reply(self) -> str:
+        with self.lock:
+            with_footprints = self.random.random() < self.footprint_ratio
+        if not with_footprints:
+            return REPLY
+        return f"{REPLY}\n[FOOTPRINTS]{json.dumps(FOOTPRINTS)}[/FOOTPRINTS]"
+
+    def count(self, kind: str) -> None:
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def as_dict(self) -> dict:
+        return {
+            "latency": self.latency,
+            "jitter": self.jitter,
+            "footprint_ratio": self.footprint_ratio,
+            "stream_chunks": self.stream_chunks,
+        }
+
+
+def gemini_response(text: str, prompt_tokens: int = 0) -> dict:
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": prompt_tokens + len(text) // 4,
+        },
+    }
+
+
+def make_handler(config: FakeLLMConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, payload: dict, status: int = 200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data: str):
+            encoded = data.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(encoded), encoded))
+            self.wfile.flush()
+
+        def _stream(self, text: str, prompt_tokens: int, delay: float):
+            # Time to first chunk is half the latency; the rest is spread over the chunks
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(delay / 2)
+            size = max(1, -(-len(text) // config.stream_chunks))
+            pieces = [text[i:i + size] for i in range(0, len(text), size)]
+            for index, piece in enumerate(pieces):
+                prefix = "[" if index == 0 else ",\r\n"
+                self._write_chunk(prefix + json.dumps(gemini_response(piece, prompt_tokens)))
+                time.sleep(delay / 2 / len(pieces))
+            self._write_chunk("]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = self.path.split("?", 1)[0]
+            delay = config.delay()
+            if path == "/token":
+                config.count("token")
+                self._send_json({"access_token": "fake-token", "expires_in": 3600, "token_type": "Bearer"})
+            elif path.endswith(":generateContent"):
+                config.count("generate")
+                time.sleep(delay)
+                self._send_json(gemini_response(config.reply(), len(body) // 4))
+            elif path.endswith(":streamGenerateContent"):
+                config.count("stream")
+                self._stream(config.reply(), len(body) // 4, delay)
+            elif path.endswith(":predict"):
+                config.count("predict")
+                time.sleep(delay)
+                self._send_json({"predictions": [{"bytesBase64Encoded": PNG_1X1, "mimeType": "image/png"}]})
+            else:
+                self._send_json({"error": {"code": 404, "message": f"No fake for {path}"}}, status=404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class FakeLLMServer:
+    """The stand-in on a background thread; use as a context manager"""
+
+    def __init__(self, config: FakeLLMConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.server = ThreadingHTTPServer((host, port), make_handler(config))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def service_account_credentials(token_uri: str) -> str:
+    """
+    A base64 service account for GOOGLE_CLOUD_CREDENTIALS whose token endpoint is the
+    stand-in, so the app's Imagen token refresh runs unmodified. The key is generated
+    for each run and signs nothing that leaves this machine.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    info = {
+        "type": "service_account",
+        "project_id": "bench-project",
+        "private_key_id": "bench",
+        "private_key": private_key,
+        "client_email": "bench@bench-project.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": token_uri,
+    }
+    return base64.b64encode(json.dumps(info).encode()).decode()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.3, help="mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="uniform +/- jitter in seconds")
+    parser.add_argument("--footprint-ratio", type=float, default=0.5, help="fraction of replies with footprints")
+    args = parser.parse_args()
+    config = FakeLLMConfig(args.latency, args.jitter, args.footprint_ratio)
+    with FakeLLMServer(config, args.host, args.port) as server:
+        print(f"Fake Gemini/Imagen listening on {server.url}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
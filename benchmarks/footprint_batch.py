@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Compare POST /footprints/batch against the single-item footprint endpoints.
+
+Each round creates N footprints, completes half of them and deletes the other
+half, first with one request per operation and then with two batch requests
+(the creates, then the completes and deletes, which need the new ids).
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmarks/footprint_batch.py --sizes 10 50 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def footprint(i: int) -> dict:
+    return {"user_id": 1, "action": f"Step {i}", "path_name": "Benchmark", "path_color": "bg-gray",
+            "due_time": "2030-01-01", "priority": i}
+
+
+def run_single(client: TestClient, size: int) -> float:
+    start = time.perf_counter()
+    ids = [client.post("/footprints/", json=footprint(i)).json()["id"] for i in range(size)]
+    for footprint_id in ids[::2]:
+        client.patch(f"/footprints/{footprint_id}/complete")
+    for footprint_id in ids[1::2]:
+        client.delete(f"/footprints/{footprint_id}")
+    return time.perf_counter() - start
+
+
+def run_batch(client: TestClient, size: int) -> float:
+    start = time.perf_counter()
+    created = client.post("/footprints/batch", json={
+        "operations": [{"op": "create", "footprint": footprint(i)} for i in range(size)]
+    }).json()["results"]
+    ids = [result["footprint"]["id"] for result in created]
+    response = client.post("/footprints/batch", json={
+        "operations": [{"op": "complete", "id": i} for i in ids[::2]] + [{"op": "delete", "id": i} for i in ids[1::2]]
+    })
+    assert response.json()["failed"] == 0
+    return time.perf_counter() - start
+
+
+def main(args):
+    client = TestClient(app)
+    print(f"{'operations':>10} {'single (s)':>11} {'batch (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        single = run_single(client, size)
+        batch = run_batch(client, size)
+        # size creates + size completes/deletes
+        print(f"{size * 2:>10} {single:>11.3f} {batch:>10.3f} {single / batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="footprints per round")
+    main(parser.parse_args())
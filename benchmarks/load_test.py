@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the whole service.
+
+Boots app.main:app under uvicorn (a real server process, --workers N) against the local
+Gemini/Imagen stand-in in fake_llm.py (or, with --llm stub, the app's in-process stub
+provider, which skips the SDK and HTTP client entirely), seeds users with paths and footprints, then runs
+a closed loop of --concurrency clients, each picking the next request from a weighted
+mix of routes. Reports requests/s and p50/p95/p99 latency per route, and saves the
+results as JSON so runs can be compared between commits.
+
+Routes in the mix (weights with --mix name=weight ...):
+  chat               POST /chat, continuing the user's conversation
+  chat_stream        POST /chat/stream, read to the end
+  footprints         GET /footprints/{user_id}
+  footprint_create   POST /footprints/
+  footprint_complete PATCH /footprints/{footprint_id}/complete
+  paths              GET /paths/{user_id}
+  login              POST /auth/login
+  dream              POST /generate-footprints-from-dream
+  image              POST /generate-image
+
+Usage:
+    python benchmarks/load_test.py --duration 30 --concurrency 32 --latency 0.3 --jitter 0.1
+    python benchmarks/load_test.py --mix chat=1 login=1 --workers 4 --output before.json
+    python benchmarks/load_test.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm import FakeLLMConfig, FakeLLMServer, service_account_credentials  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+DEFAULT_MIX = {
+    "chat": 3,
+    "footprints": 4,
+    "footprint_create": 2,
+    "footprint_complete": 1,
+    "paths": 3,
+    "login": 1,
+}
+CHAT_TURNS_PER_CONVERSATION = 10
+PASSWORD = "bench-password"
+MESSAGES = [
+    "I want to run a half marathon this year",
+    "I keep skipping my morning workouts",
+    "How do I stay consistent with studying?",
+    "I finished yesterday's steps!",
+    "What should I focus on this week?",
+]
+
+
+class User:
+    def __init__(self, index: int, id: int, email: str, token: str):
+        self.index = index
+        self.id = id
+        self.email = email
+        self.token = token
+        self.conversation_id = None
+        self.turns = 0
+        self.open_footprints = []
+
+
+def footprint_payload(user: User, action: str, rng: random.Random) -> dict:
+    return {
+        "user_id": user.id,
+        "action": action,
+        "path_name": "Load test",
+        "path_color": "bg-blue-100 text-blue-800",
+        "due_time": f"2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "priority": rng.randint(1, 5),
+    }
+
+
+# Each scenario sends one request and returns (route label, response)
+
+async def chat(client, user, rng):
+    if user.turns >= CHAT_TURNS_PER_CONVERSATION:
+        user.conversation_id, user.turns = None, 0
+    payload = {"message": rng.choice(MESSAGES), "conversation_id": user.conversation_id}
+    response = await client.post("/chat", params={"token": user.token}, json=payload)
+    if response.status_code == 200:
+        user.conversation_id = response.json()["conversation_id"]
+        user.turns += 1
+    return "POST /chat", response
+
+
+async def chat_stream(client, user, rng):
+    async with client.stream("POST", "/chat/stream", params={"token": user.token},
+                             json={"message": rng.choice(MESSAGES)}) as response:
+        await response.aread()
+    return "POST /chat/stream", response
+
+
+async def footprints(client, user, rng):
+    response = await client.get(f"/footprints/{user.id}", params={"limit": 20, "is_completed": False})
+    return "GET /footprints/{user_id}", response
+
+
+async def footprint_create(client, user, rng):
+    response = await client.post("/footprints/", json=footprint_payload(user, f"Step {rng.randint(1, 10**6)}", rng))
+    if response.status_code == 200:
+        user.open_footprints.append(response.json()["id"])
+    return "POST /footprints/", response
+
+
+async def footprint_complete(client, user, rng):
+    if not user.open_footprints:
+        return await footprint_create(client, user, rng)
+    footprint_id = user.open_footprints.pop(rng.randrange(len(user.open_footprints)))
+    response = await client.patch(f"/footprints/{footprint_id}/complete")
+    return "PATCH /footprints/{footprint_id}/complete", response
+
+
+async def paths(client, user, rng):
+    response = await client.get(f"/paths/{user.id}", params={"limit": 10})
+    return "GET /paths/{user_id}", response
+
+
+async def login(client, user, rng):
+    response = await client.post("/auth/login", json={"email": user.email, "password": PASSWORD})
+    return "POST /auth/login", response
+
+
+async def dream(client, user, rng):
+    response = await client.post("/generate-footprints-from-dream",
+                                 json={"dream": f"{rng.choice(MESSAGES)} #{rng.randint(1, 50)}", "user_id": user.id})
+    return "POST /generate-footprints-from-dream", response
+
+
+async def image(client, user, rng):
+    response = await client.post("/generate-image", params={"token": user.token},
+                                 json={"prompt": f"A mountain trail at dawn, variant {rng.randint(1, 10**6)}"})
+    return "POST /generate-image", response
+
+
+SCENARIOS = {
+    "chat": chat,
+    "chat_stream": chat_stream,
+    "footprints": footprints,
+    "footprint_create": footprint_create,
+    "footprint_complete": footprint_complete,
+    "paths": paths,
+    "login": login,
+    "dream": dream,
+    "image": image,
+}
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+
+def summarize(latencies_ms, errors: int, statuses: dict, seconds: float) -> dict:
+    values = sorted(latencies_ms)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / seconds, 2) if seconds else 0.0,
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+        "status": dict(sorted(statuses.items())),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, route: str, status: int, elapsed_ms: float) -> None:
+        if not self.recording:
+            return
+        self.latencies.setdefault(route, []).append(elapsed_ms)
+        statuses = self.statuses.setdefault(route, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if status >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, seconds: float) -> dict:
+        routes = {
+            route: summarize(latencies, self.errors.get(route, 0), self.statuses[route], seconds)
+            for route, latencies in sorted(self.latencies.items())
+        }
+        all_latencies = [value for latencies in self.latencies.values() for value in latencies]
+        all_statuses = {}
+        for statuses in self.statuses.values():
+            for status, count in statuses.items():
+                all_statuses[status] = all_statuses.get(status, 0) + count
+        return {"summary": summarize(all_latencies, sum(self.errors.values()), all_statuses, seconds), "routes": routes}
+
+
+async def seed(client: httpx.AsyncClient, count: int, footprints_per_user: int, rng: random.Random):
+    """Register users, each with a path of footprints"""
+    run_id = f"{int(time.time())}-{rng.randint(0, 10**6)}"
+    users = []
+    for index in range(count):
+        email = f"bench-{run_id}-{index}@example.com"
+        response = await client.post("/auth/register", json={
+            "name": f"Bench User {index}", "email": email, "password": PASSWORD,
+            "ocean_scores": {trait: rng.randint(1, 100) for trait in
+                             ("openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism")},
+        })
+        response.raise_for_status()
+        body = response.json()
+        user = User(index, body["id"], email, body["access_token"])
+        response = await client.post("/paths/", json={
+            "user_id": user.id,
+            "name": "Get fit",
+            "footprints": [footprint_payload(user, f"Seed step {i}", rng) for i in range(footprints_per_user)],
+        })
+        response.raise_for_status()
+        user.open_footprints = [footprint["id"] for footprint in response.json()["footprints"]]
+        users.append(user)
+    return users
+
+
+async def run_load(base_url: str, args, mix: dict) -> dict:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        users = await seed(client, args.users, args.footprints_per_user, rng)
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        recorder = Recorder()
+        deadline = time.perf_counter() + args.warmup + args.duration
+
+        async def worker(worker_id: int):
+            worker_rng = random.Random(f"{args.seed}-{worker_id}")
+            while time.perf_counter() < deadline:
+                scenario = SCENARIOS[worker_rng.choices(names, weights)[0]]
+                user = users[worker_rng.randrange(len(users))]
+                start = time.perf_counter()
+                try:
+                    route, response = await scenario(client, user, worker_rng)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    route, status = f"{scenario.__name__} ({type(e).__name__})", 599
+                recorder.record(route, status, (time.perf_counter() - start) * 1000)
+
+        tasks = [asyncio.create_task(worker(i)) for i in range(args.concurrency)]
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        # Requests still in flight at the deadline finish and count, so measure until they do
+        return recorder.report(time.perf_counter() - started)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(args, fake_llm_url: str, workdir: str):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "GOOGLE_API_KEY": "bench-key",
+        "GEMINI_API_ENDPOINT": fake_llm_url,
+        "IMAGEN_API_ENDPOINT": fake_llm_url,
+        "GOOGLE_CLOUD_CREDENTIALS": service_account_credentials(f"{fake_llm_url}/token"),
+        "IMAGE_STORE_DIR": os.path.join(workdir, "images"),
+        "LOG_LEVEL": "WARNING",
+    })
+    if args.llm == "stub":
+        env.update({
+            "LLM_PROVIDER": "stub",
+            "LLM_STUB_LATENCY_SECONDS": str(args.latency),
+            "LLM_STUB_JITTER_SECONDS": str(args.jitter),
+        })
+    if args.workers > 1:
+        env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(workdir, "metrics")
+        os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        cwd=REPO_ROOT, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The app did not become healthy within 60 seconds")
+
+
+def git_revision() -> dict:
+    def git(*command):
+        return subprocess.run(["git", *command], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def print_report(results: dict) -> None:
+    print(f"{'route':<44} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(results["routes"].items()) + [("all", results["summary"])]
+    for route, stats in rows:
+        print(f"{route:<44} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>8.1f} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print per-route changes; True if any route's p95 or req/s got worse by more than threshold"""
+    def change(old, new):
+        return (new - old) / old * 100 if old else 0.0
+
+    regressed = False
+    print(f"baseline {baseline['git']['commit']} vs current {current['git']['commit']}")
+    print(f"{'route':<44} {'req/s':>17} {'change':>8} {'p95 ms':>19} {'change':>8}")
+    routes = sorted(set(baseline["routes"]) & set(current["routes"])) + ["all"]
+    for route in routes:
+        old = baseline["summary"] if route == "all" else baseline["routes"][route]
+        new = current["summary"] if route == "all" else current["routes"][route]
+        rps_change, p95_change = change(old["rps"], new["rps"]), change(old["p95_ms"], new["p95_ms"])
+        worse = rps_change < -threshold or p95_change > threshold
+        regressed = regressed or worse
+        print(f"{route:<44} {old['rps']:>8.1f}->{new['rps']:<8.1f} {rps_change:>+7.1f}% "
+              f"{old['p95_ms']:>9.1f}->{new['p95_ms']:<9.1f} {p95_change:>+7.1f}%{'  REGRESSED' if worse else ''}")
+    return regressed
+
+
+def parse_mix(items) -> dict:
+    if not items:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown route {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(args) -> int:
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            return 1 if compare(json.load(old), json.load(new), args.threshold) and args.fail_on_regression else 0
+
+    mix = parse_mix(args.mix)
+    llm_config = FakeLLMConfig(args.latency, args.jitter, args.footprint_ratio, seed=args.seed)
+    with tempfile.TemporaryDirectory(prefix="omeyo-bench-") as workdir, FakeLLMServer(llm_config) as fake_llm:
+        if args.app_url:
+            process, base_url = None, args.app_url.rstrip("/")
+        else:
+            process, base_url = start_app(args, fake_llm.url, workdir)
+        try:
+            results = asyncio.run(run_load(base_url, args, mix))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+
+    results = {
+        "version": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "config": {
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "users": args.users,
+            "seed": args.seed,
+            "mix": mix,
+            "database": "external" if args.database_url else "sqlite",
+            "llm": args.llm,
+            "fake_llm": llm_config.as_dict(),
+        },
+        **results,
+        "fake_llm_requests": llm_config.requests,
+    }
+    print_report(results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{results['timestamp'].replace(':', '')}-{results['git']['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            print()
+            if compare(json.load(f), results, args.threshold) and args.fail_on_regression:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--users", type=int, default=20, help="seeded users the clients act as")
+    parser.add_argument("--footprints-per-user", type=int, default=20)
+    parser.add_argument("--mix", nargs="+", metavar="ROUTE=WEIGHT", help="route weights (default: %s)" %
+                        " ".join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items()))
+    parser.add_argument("--llm", choices=["fake", "stub"], default="fake",
+                        help="the HTTP stand-in for Gemini/Imagen, or the app's stub provider (LLM_PROVIDER=stub)")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake Gemini/Imagen latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="uniform +/- jitter on the fake latency")
+    parser.add_argument("--footprint-ratio", type=float, default=0.5, help="fraction of chat replies with footprints")
+    parser.add_argument("--timeout", type=float, default=60, help="client timeout per request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help="run against this database instead of a fresh SQLite file")
+    parser.add_argument("--app-url", help="load an already running app instead of starting one "
+                                          "(it must point at the fake backend itself)")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS",
+                        help="compare this run with a baseline file, or two files without running")
+    parser.add_argument("--threshold", type=float, default=10, help="percent change that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if --compare finds a regression")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,23 @@
+-- Composite indexes for the hot list queries.
+-- Equivalent to `python -m app.migrations`. The API only logs missing indexes on startup.
+-- CONCURRENTLY avoids locking writes on large tables; run each statement outside a transaction.
+
+-- GET /footprints/{user_id}: keyset pages ordered by (due_time, id), due date ranges
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_footprints_user_due
+    ON footprints (user_id, due_time, id);
+
+-- "Open items" / "done today" views filter on completion before due date
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_footprints_user_completed_due
+    ON footprints (user_id, is_completed, due_time);
+
+-- Footprints of a path in priority order (GET /paths/{user_id})
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_footprints_path_priority
+    ON footprints (path_id, priority);
+
+-- GET /paths/{user_id}: keyset pages ordered by (created_at, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_paths_user_created
+    ON paths (user_id, created_at, id);
+
+-- GET /goals/{user_id}
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_goals_user_id
+    ON goals (user_id);
@@ -0,0 +1,43 @@
+-- OCEAN scores as one column per trait plus the precomputed coach personality.
+-- Equivalent to `python -m app.migrations`, which the API also runs on startup.
+-- The legacy users.ocean_scores JSON string is kept; new writes leave it NULL.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS openness DOUBLE PRECISION;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS conscientiousness DOUBLE PRECISION;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS extraversion DOUBLE PRECISION;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS agreeableness DOUBLE PRECISION;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS neuroticism DOUBLE PRECISION;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS coach_personality VARCHAR;
+
+-- Backfill from the JSON column. Mirrors utils.match_ocean_to_coach_personality:
+-- missing traits count as 0, the first highest trait wins, below 60 is "Default".
+-- Non-numeric values abort the statement; run `python -m app.migrations` for those rows.
+UPDATE users SET
+    openness = (ocean_scores::jsonb ->> 'openness')::double precision,
+    conscientiousness = (ocean_scores::jsonb ->> 'conscientiousness')::double precision,
+    extraversion = (ocean_scores::jsonb ->> 'extraversion')::double precision,
+    agreeableness = (ocean_scores::jsonb ->> 'agreeableness')::double precision,
+    neuroticism = (ocean_scores::jsonb ->> 'neuroticism')::double precision
+WHERE ocean_scores IS NOT NULL AND coach_personality IS NULL;
+
+UPDATE users SET coach_personality = CASE
+        WHEN top < 60 THEN 'Default'
+        WHEN COALESCE(openness, 0) = top THEN 'Openness'
+        WHEN COALESCE(conscientiousness, 0) = top THEN 'Conscientiousness'
+        WHEN COALESCE(extraversion, 0) = top THEN 'Extraversion'
+        WHEN COALESCE(agreeableness, 0) = top THEN 'Agreeableness'
+        ELSE 'Neuroticism'
+    END
+FROM (
+    SELECT id AS scored_id, GREATEST(
+        COALESCE(openness, 0), COALESCE(conscientiousness, 0), COALESCE(extraversion, 0),
+        COALESCE(agreeableness, 0), COALESCE(neuroticism, 0)
+    ) AS top
+    FROM users
+    WHERE ocean_scores IS NOT NULL AND coach_personality IS NULL
+) AS scored
+WHERE users.id = scored.scored_id;
+
+-- Analytics and cohort queries by coach personality
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_coach_personality
+    ON users (coach_personality);
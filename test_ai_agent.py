@@ -100,3 +100,275 @@ async def test_generate_image_with_imagen_unexpected_response_structure():
         prompt = "A vintage car"
         result = await generate_image_with_imagen(prompt)
         assert result == "Error: Could not extract image from AI response."
+
+@pytest.mark.asyncio
+async def test_call_gemini_api_does_not_block_event_loop():
+    """
+    The synchronous SDK call must run off the event loop so other coroutines keep running.
+    """
+    import time
+    from app.ai_agent import call_gemini_api
+
+    mock_model = MagicMock()
+    def slow_generate(prompt):
+        time.sleep(0.2)
+        return MagicMock(text=f"echo: {prompt}")
+    mock_model.generate_content.side_effect = slow_generate
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    with patch("app.ai_agent.model", mock_model):
+        ticker_task = asyncio.create_task(ticker())
+        result = await call_gemini_api("hello")
+        ticker_task.cancel()
+
+    assert result == "echo: hello"
+    assert ticks >= 5
+
+@pytest.mark.asyncio
+async def test_call_gemini_api_respects_max_concurrency():
+    """
+    No more than LLM_MAX_CONCURRENCY calls run at once; the rest wait in the queue.
+    """
+    import threading
+    import time
+    from app import ai_agent
+
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def tracked_generate(prompt):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return MagicMock(text="ok")
+
+    mock_model = MagicMock()
+    mock_model.generate_content.side_effect = tracked_generate
+
+    previous_size = ai_agent.LLM_MAX_CONCURRENCY
+    ai_agent.configure_llm_pool(2)
+    try:
+        with patch("app.ai_agent.model", mock_model):
+            results = await asyncio.gather(*(ai_agent.call_gemini_api(f"p{i}") for i in range(6)))
+        stats = ai_agent.get_llm_pool_stats()
+    finally:
+        ai_agent.configure_llm_pool(previous_size)
+
+    assert results == ["ok"] * 6
+    assert peak == 2
+    assert stats["max_concurrency"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+    assert stats["max_queue_depth"] >= 4
+
+@pytest.mark.asyncio
+async def test_stream_gemini_api_yields_chunks_in_order():
+    """
+    Chunks from the SDK's streaming iterator are forwarded as they are produced.
+    """
+    from app.ai_agent import stream_gemini_api
+
+    mock_model = MagicMock()
+    mock_model.generate_content.return_value = iter([MagicMock(text="Hel"), MagicMock(text="lo"), MagicMock(text="!")])
+
+    with patch("app.ai_agent.model", mock_model):
+        chunks = [chunk async for chunk in stream_gemini_api("hi")]
+
+    assert chunks == ["Hel", "lo", "!"]
+    mock_model.generate_content.assert_called_once_with("hi", stream=True)
+
+@pytest.mark.asyncio
+async def test_generate_image_with_imagen_uses_shared_http_client():
+    """
+    The predict call goes through the shared async client with the cached bearer token.
+    """
+    import httpx
+    from app import http_client
+
+    seen = {}
+    def handler(request):
+        seen["authorization"] = request.headers["Authorization"]
+        seen["url"] = str(request.url)
+        return httpx.Response(200, json={"predictions": [{"bytesBase64Encoded": "aW1hZ2U="}]})
+
+    mock_provider = MagicMock()
+    async def get_token():
+        return "cached-token"
+    mock_provider.get_token.side_effect = get_token
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    with patch.dict("os.environ", {"GOOGLE_CLOUD_CREDENTIALS": "e30="}), \
+         patch("app.ai_agent.get_imagen_token_provider", return_value=mock_provider), \
+         patch.object(http_client, "_client", client):
+        result = await generate_image_with_imagen("A calm lake")
+    await client.aclose()
+
+    assert result == "data:image/png;base64,aW1hZ2U="
+    assert seen["authorization"] == "Bearer cached-token"
+    assert seen["url"].endswith(":predict")
+
+@pytest.mark.asyncio
+async def test_call_gemini_api_reuses_a_model_handle_per_system_instruction():
+    """
+    The persona is passed as a system_instruction, and each distinct instruction gets one
+    model handle that later calls reuse.
+    """
+    from app import ai_agent
+
+    handles = []
+    def make_handle(model_name, system_instruction=None):
+        handle = MagicMock()
+        handle.generate_content.side_effect = lambda prompt: MagicMock(text=f"{system_instruction}: {prompt}")
+        handles.append(system_instruction)
+        return handle
+
+    ai_agent._model_handles.clear()
+    with patch("app.ai_agent.model", MagicMock()), \
+         patch("app.ai_agent.genai.GenerativeModel", side_effect=make_handle):
+        first = await ai_agent.call_gemini_api("hi", system_instruction="Be a coach.")
+        second = await ai_agent.call_gemini_api("again", system_instruction="Be a coach.")
+        third = await ai_agent.call_gemini_api("hi", system_instruction="Be a mentor.")
+    ai_agent._model_handles.clear()
+
+    assert (first, second, third) == ("Be a coach.: hi", "Be a coach.: again", "Be a mentor.: hi")
+    assert handles == ["Be a coach.", "Be a mentor."]
+
+def test_long_system_instructions_use_context_caching():
+    """
+    With context caching enabled, instructions above the token threshold are uploaded once
+    as cached content; failures fall back to a plain system instruction.
+    """
+    from app import ai_agent
+
+    cached_model = MagicMock()
+    with patch.object(ai_agent, "GEMINI_CONTEXT_CACHE_TTL_SECONDS", 3600), \
+         patch.object(ai_agent, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 10), \
+         patch("app.ai_agent.genai") as mock_genai:
+        mock_genai.GenerativeModel.from_cached_content.return_value = cached_model
+        assert ai_agent._create_model_handle("x" * 100) is cached_model
+        create_kwargs = mock_genai.caching.CachedContent.create.call_args[1]
+        assert create_kwargs["system_instruction"] == "x" * 100
+        assert create_kwargs["ttl"].total_seconds() == 3600
+
+        # Too short to be worth caching
+        ai_agent._create_model_handle("short")
+        mock_genai.GenerativeModel.assert_called_with(ai_agent.GEMINI_MODEL, system_instruction="short")
+        assert mock_genai.caching.CachedContent.create.call_count == 1
+
+        mock_genai.caching.CachedContent.create.side_effect = RuntimeError("unsupported model")
+        failures = ai_agent.get_model_stats()["context_cache_failures"]
+        ai_agent._create_model_handle("y" * 100)
+        mock_genai.GenerativeModel.assert_called_with(ai_agent.GEMINI_MODEL, system_instruction="y" * 100)
+        assert ai_agent.get_model_stats()["context_cache_failures"] == failures + 1
+
+def test_concurrent_first_calls_create_one_context_cache():
+    import threading
+    import time
+    from app import ai_agent
+
+    def slow_create(**kwargs):
+        time.sleep(0.1)
+        return MagicMock()
+
+    ai_agent._model_handles.clear()
+    barrier = threading.Barrier(8)
+    handles = []
+    def first_call():
+        barrier.wait()
+        handles.append(ai_agent.get_model_for("z" * 100))
+    with patch.object(ai_agent, "GEMINI_CONTEXT_CACHE_TTL_SECONDS", 3600), \
+         patch.object(ai_agent, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 10), \
+         patch("app.ai_agent.model", MagicMock()), \
+         patch("app.ai_agent.genai") as mock_genai:
+        mock_genai.caching.CachedContent.create.side_effect = slow_create
+        threads = [threading.Thread(target=first_call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    ai_agent._model_handles.clear()
+
+    assert mock_genai.caching.CachedContent.create.call_count == 1
+    assert len(handles) == 8 and all(handle is handles[0] for handle in handles)
+    assert ai_agent._model_handle_locks == {}
+
+@pytest.mark.asyncio
+async def test_gemini_calls_record_latency_errors_and_tokens():
+    from prometheus_client import REGISTRY
+    from app.ai_agent import call_gemini_api
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    mock_model = MagicMock()
+    mock_model.generate_content.return_value = MagicMock(
+        text="ok", usage_metadata=MagicMock(prompt_token_count=12, candidates_token_count=5)
+    )
+    calls = sample("omeyo_llm_request_duration_seconds_count", provider="gemini", operation="generate")
+    prompt_tokens = sample("omeyo_llm_tokens_total", provider="gemini", kind="prompt")
+    output_tokens = sample("omeyo_llm_tokens_total", provider="gemini", kind="output")
+    errors = sample("omeyo_llm_errors_total", provider="gemini", operation="generate")
+
+    with patch("app.ai_agent.model", mock_model):
+        assert await call_gemini_api("hello") == "ok"
+        mock_model.generate_content.side_effect = RuntimeError("quota exceeded")
+        assert (await call_gemini_api("hello")).startswith("Error communicating")
+
+    assert sample("omeyo_llm_request_duration_seconds_count", provider="gemini", operation="generate") == calls + 2
+    assert sample("omeyo_llm_tokens_total", provider="gemini", kind="prompt") == prompt_tokens + 12
+    assert sample("omeyo_llm_tokens_total", provider="gemini", kind="output") == output_tokens + 5
+    assert sample("omeyo_llm_errors_total", provider="gemini", operation="generate") == errors + 1
+    assert sample("omeyo_llm_requests_in_progress", provider="gemini") == 0
+
+def test_stub_provider_replays_canned_responses_deterministically():
+    from app.llm_providers import StubProvider
+
+    stub = StubProvider({"responses": [
+        {"match": "dream", "text": "A plan"},
+        {"text": ["First", "Second", "Third"]},
+    ]}, latency=0.2, jitter=0.1)
+
+    assert stub.generate("my dream is to sing").text == "A plan"
+    replies = {stub.reply(f"message {i}") for i in range(20)}
+    assert replies == {"First", "Second", "Third"}
+    assert stub.reply("message 1") == stub.reply("message 1")
+    assert stub.delay("message 1") == stub.delay("message 1")
+    assert all(0.1 <= stub.delay(f"message {i}") <= 0.3 for i in range(20))
+
+    stub.latency = stub.jitter = 0
+    chunks = list(stub.stream("message 1"))
+    assert "".join(chunk.text for chunk in chunks) == stub.reply("message 1")
+    assert chunks[-1].output_tokens > 0
+    assert stub.stats()["calls"] == {"generate": 1, "stream": 1, "image": 0}
+
+@pytest.mark.asyncio
+async def test_model_calls_go_through_the_selected_provider():
+    from prometheus_client import REGISTRY
+    from app import ai_agent
+    from app.llm_providers import StubProvider, PLACEHOLDER_IMAGE_BASE64
+
+    stub = StubProvider({"responses": [{"text": "Keep going!"}]})
+    previous = ai_agent.set_llm_provider(stub)
+    try:
+        assert await ai_agent.call_gemini_api("hello") == "Keep going!"
+        assert await ai_agent.generate_text("hello") == "Keep going!"
+        assert "".join([chunk async for chunk in ai_agent.stream_gemini_api("hello")]) == "Keep going!"
+        assert await ai_agent.generate_image_with_imagen("A lake") == f"data:image/png;base64,{PLACEHOLDER_IMAGE_BASE64}"
+        stats = ai_agent.get_model_stats()
+    finally:
+        ai_agent.set_llm_provider(previous)
+
+    assert stats["provider"] == "stub" and stats["calls"] == {"generate": 2, "stream": 1, "image": 1}
+    assert REGISTRY.get_sample_value("omeyo_llm_requests_in_progress", {"provider": "stub"}) == 0
+    assert REGISTRY.get_sample_value("omeyo_llm_tokens_total", {"provider": "stub", "kind": "output"}) > 0
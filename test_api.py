@@ -2,6 +2,10 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
 import os
+import json
+import base64
+import hashlib
+import tempfile
 
 # Set environment variables for tests if needed, e.g., for database or API keys
 os.environ["GOOGLE_API_KEY"] = "test_google_api_key"
@@ -9,12 +13,13 @@ os.environ["DATABASE_URL"] = "sqlite:///:memory:" # Use in-memory SQLite for tes
 os.environ["SECRET_KEY"] = "test_secret_key"
 os.environ["ALGORITHM"] = "HS256"
 os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "30"
+os.environ["IMAGE_STORE_DIR"] = tempfile.mkdtemp(prefix="omeyo-images-")
 
 
 # It's important that app is imported *after* the environment variables are set,
 # especially if the app's configuration depends on them at import time.
 from app.main import app
-from app.database import engine, SessionLocal # Base is in app.models
+from app.database import engine, async_engine, SessionLocal # Base is in app.models
 from app.models import User, Base # Import User model and Base for table creation
 from app.auth import create_access_token # If creating tokens for tests
 
@@ -86,6 +91,41 @@ def test_generate_image_internal_server_error(mock_generate_image_with_imagen, c
     assert "Image generation failed: Unexpected internal error" in json_response["detail"]
     mock_generate_image_with_imagen.assert_called_once_with("A robot dog")
 
+@patch("app.api.generate_image_with_imagen")
+def test_generate_image_is_stored_and_served_by_url(mock_generate_image_with_imagen, client: TestClient):
+    """
+    Generated images are written to the content-addressed store and returned as a short URL.
+    Repeating the prompt is served from the store without calling Imagen again.
+    """
+    image_bytes = b"\x89PNG\r\n\x1a\n" + b"fake image payload" * 10
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    mock_generate_image_with_imagen.return_value = "data:image/png;base64," + base64.b64encode(image_bytes).decode()
+
+    first = client.post("/generate-image", json={"prompt": "A lighthouse at dawn"})
+    second = client.post("/generate-image", json={"prompt": "A lighthouse at dawn"})
+
+    assert first.status_code == 200
+    assert first.json()["imageUrl"].endswith(f"/images/{digest}")
+    assert second.json()["imageUrl"] == first.json()["imageUrl"]
+    mock_generate_image_with_imagen.assert_called_once_with("A lighthouse at dawn")
+
+    image = client.get(f"/images/{digest}")
+    assert image.status_code == 200
+    assert image.content == image_bytes
+    assert image.headers["etag"] == f'"{digest}"'
+    assert "immutable" in image.headers["cache-control"]
+
+    partial = client.get(f"/images/{digest}", headers={"Range": "bytes=0-7"})
+    assert partial.status_code == 206
+    assert partial.content == image_bytes[:8]
+
+    not_modified = client.get(f"/images/{digest}", headers={"If-None-Match": f'"{digest}"'})
+    assert not_modified.status_code == 304
+
+def test_get_image_unknown_digest(client: TestClient):
+    assert client.get("/images/" + "0" * 64).status_code == 404
+    assert client.get("/images/not-a-digest").status_code == 404
+
 def test_generate_image_invalid_request_no_prompt(client: TestClient):
     """
     Tests the /generate-image endpoint with a missing prompt.
@@ -153,6 +193,530 @@ def test_health_check(client: TestClient):
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
+@patch("app.api.stream_gemini_api")
+def test_chat_stream_emits_tokens_and_footprints(mock_stream_gemini_api, client: TestClient):
+    """
+    /chat/stream forwards text as SSE token events and reports the footprint block separately.
+    """
+    async def fake_stream(prompt, system_instruction=None):
+        assert prompt == "Help me move more"
+        assert system_instruction.startswith("You are a motivational coach.")
+        for chunk in ["Let's begin. ", "[FOOTPRINTS][{\"action\": \"Walk\", ", "\"due_time\": \"Today\"}][/FOOTPRINTS]", " Enjoy!"]:
+            yield chunk
+    mock_stream_gemini_api.side_effect = fake_stream
+
+    response = client.post("/chat/stream", json={"message": "Help me move more"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event_line, data_line = block.split("\n")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+
+    tokens = "".join(data["text"] for event, data in events if event == "token")
+    assert tokens == "Let's begin.  Enjoy!"
+    assert ("footprints", {"footprints": [{"action": "Walk", "due_time": "Today"}], "footprint_errors": []}) in events
+    assert events[-1][0] == "done"
+    assert events[-1][1]["response"] == "Let's begin.  Enjoy!"
+
+@patch("app.api.call_gemini_api")
+def test_dream_plan_cache_reuses_plan_for_similar_dreams(mock_call_gemini_api, client: TestClient, db):
+    """
+    A second, differently formatted submission of the same dream is served from the
+    plan cache but still gets its own Path and footprints.
+    """
+    from app.api import dream_plan_cache
+    from app.models import Path as PathModel
+
+    dream_plan_cache.clear()
+    mock_call_gemini_api.return_value = (
+        'Here is your plan [FOOTPRINTS][{"action": "Buy a guitar", "due_time": "Today"},'
+        ' {"action": "Learn three chords", "due_time": "Next week"}][/FOOTPRINTS]'
+    )
+
+    first = client.post("/generate-footprints-from-dream", json={"dream": "learn guitar", "user_id": 7})
+    second = client.post("/generate-footprints-from-dream", json={"dream": "Learn Guitar!", "user_id": 8})
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert mock_call_gemini_api.call_count == 1
+    assert first.json()["cached"] is False
+    assert second.json()["cached"] is True
+    assert second.json()["total_generated"] == 2
+    assert first.json()["path_id"] != second.json()["path_id"]
+    assert [fp["action"] for fp in second.json()["footprints"]] == ["Buy a guitar", "Learn three chords"]
+    assert db.query(PathModel).filter(PathModel.user_id == 8).count() == 1
+
+    stats = client.get("/stats").json()["dream_plan_cache"]
+    assert stats["hits"] >= 1 and stats["misses"] >= 1
+
+def test_create_path_reports_invalid_footprints(client: TestClient):
+    response = client.post("/paths/", json={
+        "user_id": 11,
+        "name": "Run a marathon",
+        "footprints": [
+            {"user_id": 11, "action": "Buy running shoes", "path_name": "", "path_color": "", "due_time": "2030-01-01", "priority": 1},
+            {"user_id": 11, "action": "  ", "path_name": "", "path_color": "", "due_time": "2030-01-02", "priority": 2},
+            {"user_id": 11, "action": "Run 5k", "path_name": "", "path_color": "", "due_time": "not a date", "priority": 3},
+        ]
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [fp["action"] for fp in body["footprints"]] == ["Buy running shoes", "Run 5k"]
+    assert all(fp["path_name"] == "Run a marathon" for fp in body["footprints"])
+    assert body["footprint_errors"] == [{"index": 1, "error": "missing action"}]
+
+def _footprint_payload(user_id, action, priority=1):
+    return {"user_id": user_id, "action": action, "path_name": "Health", "path_color": "bg-green",
+            "due_time": "2030-03-04", "priority": priority}
+
+def test_footprint_batch_applies_mixed_operations(client: TestClient, db):
+    from app.models import Footprint
+
+    existing = [client.post("/footprints/", json=_footprint_payload(21, f"Existing {i}")).json()["id"] for i in range(3)]
+
+    response = client.post("/footprints/batch", json={"operations": [
+        {"op": "create", "footprint": _footprint_payload(21, "New step", priority=4)},
+        {"op": "complete", "id": existing[0]},
+        {"op": "delete", "id": existing[1]},
+        {"op": "complete", "id": existing[1]},
+        {"op": "delete", "id": 999999},
+        {"op": "complete"},
+    ]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [r["status"] for r in body["results"]] == ["ok", "ok", "ok", "error", "error", "error"]
+    assert body["succeeded"] == 3 and body["failed"] == 3
+    created = body["results"][0]["footprint"]
+    assert created["action"] == "New step" and created["priority"] == 4
+    assert body["results"][1]["footprint"]["is_completed"] is True
+    assert body["results"][3]["error"] == "Footprint not found"
+
+    db.expire_all()
+    remaining = {fp.id: fp for fp in db.query(Footprint).filter(Footprint.user_id == 21).all()}
+    assert existing[1] not in remaining
+    assert remaining[existing[0]].is_completed == 1
+    assert remaining[existing[2]].is_completed == 0
+    assert created["id"] in remaining
+
+def test_footprint_batch_rejects_unknown_op(client: TestClient):
+    response = client.post("/footprints/batch", json={"operations": [{"op": "archive", "id": 1}]})
+    assert response.status_code == 422
+
+def _create_paths(client, user_id, count, footprints_per_path=3):
+    for i in range(count):
+        client.post("/paths/", json={
+            "user_id": user_id,
+            "name": f"Path {i}",
+            "footprints": [_footprint_payload(user_id, f"Path {i} step {j}", priority=j + 1) for j in range(footprints_per_path)]
+        })
+
+def _count_selects(client, url):
+    from sqlalchemy import event
+    statements = []
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return response, len(statements)
+
+def test_get_user_paths_query_count_is_constant(client: TestClient):
+    _create_paths(client, 31, 1)
+    _create_paths(client, 32, 12)
+
+    small, small_queries = _count_selects(client, "/paths/31")
+    large, large_queries = _count_selects(client, "/paths/32")
+
+    assert len(small.json()) == 1 and len(large.json()) == 12
+    assert all(len(p["footprints"]) == 3 for p in large.json())
+    assert small_queries == large_queries == 2
+
+def test_get_user_paths_cursor_pagination_and_footprint_cap(client: TestClient):
+    _create_paths(client, 33, 5, footprints_per_path=4)
+
+    first = client.get("/paths/33", params={"limit": 2, "footprints_limit": 2})
+    assert [p["name"] for p in first.json()] == ["Path 0", "Path 1"]
+    assert [fp["priority"] for fp in first.json()[0]["footprints"]] == [1, 2]
+
+    seen = [p["name"] for p in first.json()]
+    cursor = first.headers["x-next-cursor"]
+    while cursor:
+        page = client.get("/paths/33", params={"limit": 2, "cursor": cursor})
+        seen += [p["name"] for p in page.json()]
+        cursor = page.headers.get("x-next-cursor")
+    assert seen == [f"Path {i}" for i in range(5)]
+
+    assert client.get("/paths/33", params={"cursor": "garbage"}).status_code == 400
+
+@pytest.mark.parametrize("route, values", [
+    ("/footprints/41", [[], 1]),
+    ("/footprints/41", [{"dt": "2030-01-01T00:00:00"}, 1]),
+    ("/footprints/41", [{"d": "2030-01-01"}, "1"]),
+    ("/footprints/41", [{"d": "not a date"}, 1]),
+    ("/paths/33", [{"d": "2030-01-01"}, 1]),
+    ("/paths/33", [{"dt": "2030-01-01T00:00:00"}, True]),
+    ("/paths/33", [{}, 1]),
+])
+def test_well_formed_cursors_with_wrong_types_are_rejected(client: TestClient, route, values):
+    from app.pagination import encode_cursor
+
+    # Encoded like a real cursor, but the values do not match the sort key
+    response = client.get(route, params={"cursor": encode_cursor(*values)})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid cursor")
+    # The forged cursor from the report, decoding to [[],1]
+    assert client.get(route, params={"cursor": "W1tdLDFd"}).status_code == 400
+
+def test_get_footprints_keyset_pagination_and_filters(client: TestClient):
+    dates = ["2030-01-03", "2030-01-01", "2030-01-02", "2030-01-01", "2030-01-05"]
+    ids = []
+    for i, due in enumerate(dates):
+        payload = dict(_footprint_payload(41, f"Step {i}", priority=1 + i % 2), due_time=due)
+        ids.append(client.post("/footprints/", json=payload).json()["id"])
+    client.patch(f"/footprints/{ids[2]}/complete")
+
+    collected = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/footprints/41", params=params)
+        assert len(page.json()) <= 2
+        collected += page.json()
+        cursor = page.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert [fp["due_time"] for fp in collected] == sorted(dates)
+    assert [fp["id"] for fp in collected][:2] == [ids[1], ids[3]]
+
+    in_range = client.get("/footprints/41", params={"due_from": "2030-01-02", "due_to": "2030-01-03"}).json()
+    assert [fp["id"] for fp in in_range] == [ids[2], ids[0]]
+    assert [fp["id"] for fp in client.get("/footprints/41", params={"is_completed": True}).json()] == [ids[2]]
+    assert {fp["priority"] for fp in client.get("/footprints/41", params={"priority": 2}).json()} == {2}
+    assert client.get("/footprints/41", params={"path_id": 123456}).json() == []
+
+def _register(client, email, **extra):
+    payload = {"name": "Test User", "email": email, "password": "secret", **extra}
+    response = client.post("/auth/register", json=payload)
+    assert response.status_code == 200
+    return response.json()
+
+def test_auth_me_accepts_query_token_and_bearer_header(client: TestClient):
+    registered = _register(client, "me@example.com", totem_title="The Explorer", ocean_scores={"openness": 80})
+    token = registered["access_token"]
+
+    by_query = client.get("/auth/me", params={"token": token})
+    by_header = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert by_query.status_code == by_header.status_code == 200
+    assert by_query.json() == by_header.json()
+    assert by_query.json()["totem_title"] == "The Explorer"
+    assert by_query.json()["ocean_scores"] == {"openness": 80}
+    assert client.get("/auth/me").status_code == 401
+    assert client.get("/auth/me", params={"token": "not-a-jwt"}).status_code == 401
+
+@patch("app.api.generate_text")
+def test_chat_resolves_the_user_once(mock_generate_text, client: TestClient):
+    """
+    The token is decoded and the user loaded once per /chat request, including when
+    footprints from the reply are saved for that user.
+    """
+    from sqlalchemy import event
+
+    registered = _register(client, "chatter@example.com", ocean_scores={"conscientiousness": 90})
+    mock_generate_text.return_value = 'Plan it. [FOOTPRINTS][{"action": "Write a list", "due_time": "Today"}][/FOOTPRINTS]'
+
+    user_queries = []
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            user_queries.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.post("/chat", params={"token": registered["access_token"]}, json={"message": "Help me plan"})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert [fp["user_id"] for fp in response.json()["footprints"]] == [registered["id"]]
+    assert len(user_queries) == 1
+    assert "password_hash" not in user_queries[0]
+    assert mock_generate_text.call_args[0][0] == "Help me plan"
+    # The persona matched from the OCEAN scores is sent as the system instruction
+    system_instruction = mock_generate_text.call_args[1]["system_instruction"]
+    assert system_instruction.startswith("You are an AI coach who is extremely organized")
+
+@patch("app.api.generate_text")
+def test_chat_reports_model_failure_instead_of_replying_with_it(mock_generate_text, client: TestClient, db):
+    from app.models import Message
+
+    registered = _register(client, "unlucky@example.com")
+    mock_generate_text.side_effect = RuntimeError("deadline exceeded")
+
+    response = client.post("/chat", params={"token": registered["access_token"]}, json={"message": "Hello?"})
+
+    assert response.status_code == 503
+    assert "deadline exceeded" in response.json()["detail"]
+    assert db.query(Message).filter(Message.content == "Hello?").count() == 0
+
+@patch("app.api.stream_gemini_api")
+@patch("app.api.generate_text")
+def test_failed_chat_leaves_no_conversation(mock_generate_text, mock_stream, client: TestClient, db):
+    from app.models import Conversation
+
+    registered = _register(client, "orphan@example.com")
+    user_id = registered["id"]
+    mock_generate_text.side_effect = RuntimeError("deadline exceeded")
+    async def failing_stream(*args, **kwargs):
+        raise RuntimeError("deadline exceeded")
+        yield
+    mock_stream.side_effect = failing_stream
+
+    assert client.post("/chat", params={"token": registered["access_token"]}, json={"message": "Hello?"}).status_code == 503
+    streamed = client.post("/chat/stream", params={"token": registered["access_token"]}, json={"message": "Hello?"})
+    assert "event: error" in streamed.text
+    assert db.query(Conversation).filter(Conversation.user_id == user_id).count() == 0
+
+    mock_generate_text.side_effect = None
+    mock_generate_text.return_value = "Hello!"
+    reply = client.post("/chat", params={"token": registered["access_token"]}, json={"message": "Hello?"}).json()
+    assert db.query(Conversation).filter(Conversation.user_id == user_id).one().id == reply["conversation_id"]
+
+@patch("app.api.generate_text")
+def test_chat_reply_starting_with_error_is_a_normal_reply(mock_generate_text, client: TestClient, db):
+    from app.models import Message
+
+    registered = _register(client, "curious@example.com")
+    reply = "Error 404 means the page was not found. Check the address and try again."
+    mock_generate_text.return_value = reply
+
+    response = client.post("/chat", params={"token": registered["access_token"]}, json={"message": "What does error 404 mean?"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == reply
+    assert db.query(Message).filter(Message.content == reply).count() == 1
+
+@patch("app.api.generate_text")
+def test_chat_continues_a_stored_conversation(mock_generate_text, client: TestClient):
+    registered = _register(client, "historian@example.com")
+    token = registered["access_token"]
+    other = _register(client, "stranger@example.com")["access_token"]
+
+    mock_generate_text.return_value = 'Start small. [FOOTPRINTS][{"action": "Walk", "due_time": "Today"}][/FOOTPRINTS]'
+    first = client.post("/chat", params={"token": token}, json={"message": "I want to get fit"}).json()
+    conversation_id = first["conversation_id"]
+    assert conversation_id is not None
+    assert mock_generate_text.call_args[0][0] == "I want to get fit"
+
+    mock_generate_text.return_value = "Walk again tomorrow."
+    second = client.post("/chat", params={"token": token},
+                         json={"message": "Done!", "conversation_id": conversation_id}).json()
+    assert second["conversation_id"] == conversation_id
+    # Only the new message was sent by the client; the history comes from the store
+    assert mock_generate_text.call_args[0][0] == [
+        {"role": "user", "parts": ["I want to get fit"]},
+        {"role": "model", "parts": ["Start small."]},
+        {"role": "user", "parts": ["Done!"]},
+    ]
+
+    response = client.get(f"/conversations/{conversation_id}/messages", params={"token": token, "limit": 3})
+    assert [m["content"] for m in response.json()] == ["Walk again tomorrow.", "Done!", "Start small."]
+    older = client.get(f"/conversations/{conversation_id}/messages",
+                       params={"token": token, "cursor": response.headers["X-Next-Cursor"]})
+    assert [m["role"] for m in older.json()] == ["user"]
+
+    assert client.get(f"/conversations/{conversation_id}/messages", params={"token": other}).status_code == 404
+    assert client.post("/chat", params={"token": other},
+                       json={"message": "Hi", "conversation_id": conversation_id}).status_code == 404
+
+    # Guests stay stateless
+    assert client.post("/chat", json={"message": "Hi"}).json()["conversation_id"] is None
+
+@patch("app.api.generate_text")
+def test_metrics_report_routes_and_chat_stages(mock_generate_text, client: TestClient):
+    mock_generate_text.return_value = 'Go. [FOOTPRINTS][{"action": "Walk", "due_time": "Today"}][/FOOTPRINTS]'
+    client.post("/chat", json={"message": "Hi"})
+    client.get("/paths/12345")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    # Routes are labelled by template, not by the requested path
+    assert 'omeyo_http_requests_total{method="GET",route="/paths/{user_id}",status="200"}' in body
+    assert "/paths/12345" not in body
+    for stage in ("auth", "prompt_build", "llm_call", "footprint_parse", "db_write"):
+        assert f'omeyo_chat_stage_duration_seconds_count{{endpoint="chat",stage="{stage}"}}' in body
+    assert 'omeyo_http_requests_in_progress{method="GET"} 1.0' in body
+
+@pytest.fixture
+def span_exporter():
+    """Tracing with query spans on the app's async engine, both undone after the test"""
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from app import tracing
+
+    exporter = InMemorySpanExporter()
+    tracing.configure_tracing(exporter, batch=False)
+    tracing.trace_engine(async_engine.sync_engine)
+    yield exporter
+    tracing.untrace_engine(async_engine.sync_engine)
+    tracing.shutdown_tracing()
+
+@patch("app.api.generate_text")
+def test_chat_trace_covers_each_stage_and_query(mock_generate_text, client: TestClient, span_exporter):
+    token = _register(client, "traced@example.com")["access_token"]
+    span_exporter.clear()
+    mock_generate_text.return_value = 'Go. [FOOTPRINTS][{"action": "Walk", "due_time": "Today"}][/FOOTPRINTS]'
+    response = client.post("/chat", params={"token": token}, json={"message": "Trace me"})
+    assert response.status_code == 200
+
+    spans = span_exporter.get_finished_spans()
+    by_id = {span.context.span_id: span for span in spans}
+    root = next(span for span in spans if span.name == "POST /chat")
+    assert root.attributes["http.response.status_code"] == 200
+    assert root.attributes["request.id"] == response.headers["X-Request-ID"]
+    assert {span.context.trace_id for span in spans} == {root.context.trace_id}
+    stages = {span.name: span for span in spans if span.name.startswith("chat.")}
+    assert set(stages) == {"chat.auth", "chat.prompt_build", "chat.llm_call", "chat.footprint_parse", "chat.db_write"}
+    assert all(span.parent.span_id == root.context.span_id for span in stages.values())
+
+    # Queries run through AsyncSession.run_sync still land under the stage that issued them
+    writes = [span for span in spans if span.name == "db.query" and by_id[span.parent.span_id].name == "chat.db_write"]
+    assert any(span.attributes["db.operation"] == "INSERT" for span in writes)
+
+def test_register_stores_ocean_scores_as_columns(client: TestClient, db):
+    from app.models import User
+
+    registered = _register(client, "ocean@example.com", ocean_scores={"extraversion": "75", "openness": 50})
+    assert registered["ocean_scores"] == {"openness": 50.0, "extraversion": 75.0}
+    assert registered["coach_personality"] == "Extraversion"
+
+    user = db.query(User).filter(User.email == "ocean@example.com").first()
+    assert (user.extraversion, user.openness, user.neuroticism) == (75.0, 50.0, None)
+    assert user.ocean_scores_json is None
+    me = client.get("/auth/me", params={"token": registered["access_token"]}).json()
+    assert me["coach_personality"] == "Extraversion"
+
+def test_profile_cache_skips_database_and_invalidates_on_write(client: TestClient, db):
+    from sqlalchemy import event
+    from app.auth import profile_cache
+    from app.models import User
+
+    registered = _register(client, "cached@example.com", totem_title="The Owl")
+    token = registered["access_token"]
+
+    queries = []
+    def record(conn, cursor, statement, *args):
+        queries.append(statement)
+    before = profile_cache.stats()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        assert client.get("/auth/me", params={"token": token}).json()["totem_title"] == "The Owl"
+        assert client.get("/auth/me", params={"token": token}).json()["totem_title"] == "The Owl"
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert len(queries) == 1
+    after = profile_cache.stats()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+    user = db.query(User).filter(User.email == "cached@example.com").first()
+    user.totem_title = "The Fox"
+    db.commit()
+    assert client.get("/auth/me", params={"token": token}).json()["totem_title"] == "The Fox"
+    assert "profile_cache" in client.get("/stats").json()
+
+def test_profile_cache_is_invalidated_on_commit_not_flush(client: TestClient, db):
+    from app.auth import profile_cache
+    from app.models import User
+
+    token = _register(client, "flushed@example.com", totem_title="The Owl")["access_token"]
+    assert client.get("/auth/me", params={"token": token}).json()["totem_title"] == "The Owl"
+
+    user = db.query(User).filter(User.email == "flushed@example.com").first()
+    user.totem_title = "The Fox"
+    db.flush()
+    # Flushed but uncommitted: a reader must not re-cache the old row in between
+    assert profile_cache.get("flushed@example.com").totem_title == "The Owl"
+    db.rollback()
+    assert profile_cache.get("flushed@example.com").totem_title == "The Owl"
+    assert "pending_profile_invalidations" not in db.info
+
+    user = db.query(User).filter(User.email == "flushed@example.com").first()
+    user.totem_title = "The Fox"
+    db.commit()
+    assert profile_cache.get("flushed@example.com") is None
+    assert client.get("/auth/me", params={"token": token}).json()["totem_title"] == "The Fox"
+
+@patch("app.api.generate_image_with_imagen")
+def test_generate_image_rejects_invalid_token(mock_generate_image_with_imagen, client: TestClient):
+    response = client.post("/generate-image", params={"token": "not-a-jwt"}, json={"prompt": "A locked door"})
+    assert response.status_code == 401
+    mock_generate_image_with_imagen.assert_not_called()
+
+def test_chat_dream_and_image_run_end_to_end_on_the_stub_provider(client: TestClient):
+    from app import ai_agent
+    from app.api import dream_plan_cache
+    from app.llm_providers import StubProvider
+
+    dream_plan_cache.clear()
+    previous = ai_agent.set_llm_provider(StubProvider())
+    try:
+        chat = client.post("/chat", json={"message": "I want to get fit"})
+        dream = client.post("/generate-footprints-from-dream", json={"dream": "run a marathon", "user_id": 11})
+        image = client.post("/generate-image", json={"prompt": "A finish line"})
+        models = client.get("/stats").json()["models"]
+    finally:
+        ai_agent.set_llm_provider(previous)
+        dream_plan_cache.clear()
+
+    assert chat.status_code == 200 and chat.json()["response"]
+    assert dream.status_code == 200 and dream.json()["total_generated"] == 5
+    assert image.status_code == 200 and "/images/" in image.json()["imageUrl"]
+    assert models["provider"] == "stub" and models["calls"]["generate"] == 2
+
+def test_continued_conversation_runs_on_the_stub_provider(client: TestClient):
+    from app import ai_agent
+    from app.llm_providers import StubProvider
+
+    token = _register(client, "stubbed@example.com")["access_token"]
+    previous = ai_agent.set_llm_provider(StubProvider())
+    try:
+        first = client.post("/chat", params={"token": token}, json={"message": "I want to get fit"})
+        conversation_id = first.json()["conversation_id"]
+        # Follow-ups send the stored history as a list of Gemini contents
+        second = client.post("/chat", params={"token": token},
+                             json={"message": "Done!", "conversation_id": conversation_id})
+        third = client.post("/chat", params={"token": token},
+                            json={"message": "Done!", "conversation_id": conversation_id})
+        streamed = client.post("/chat/stream", params={"token": token},
+                               json={"message": "What next?", "conversation_id": conversation_id})
+    finally:
+        ai_agent.set_llm_provider(previous)
+
+    assert first.status_code == 200 and second.status_code == 200 and third.status_code == 200
+    assert second.json()["response"]
+    assert streamed.status_code == 200 and "event: done" in streamed.text
+
+def test_stats_reports_llm_pool(client: TestClient):
+    response = client.get("/stats")
+    assert response.status_code == 200
+    llm_pool = response.json()["llm_pool"]
+    assert llm_pool["max_concurrency"] >= 1
+    assert llm_pool["queued"] == 0
+    dream_prompt = response.json()["prompts"]["templates"]["dream"]
+    assert dream_prompt["version"] == "1"
+    assert dream_prompt["tokens"] > 0
+    db_pool = response.json()["db_pool"]
+    assert db_pool["sync"]["checked_out"] >= 0
+    assert db_pool["async"]["pool"] == "NullPool"
+
 # Remember to install test dependencies:
 # pip install pytest httpx requests types-requests
 # (httpx is used by TestClient, requests might be useful for other tests)
@@ -0,0 +1,60 @@
+import pytest
+
+from app.cache import TTLCache
+from app.utils import normalize_dream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_and_counters():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recently used
+    cache.set("c", 3)           # evicts "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("plan", ["step"])
+    clock.now = 4.9
+    assert cache.get("plan") == ["step"]
+    clock.now = 5.0
+    assert cache.get("plan", "missing") == "missing"
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_invalidate_and_clear():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    cache.clear()
+    assert cache.get("b") is None
+
+
+@pytest.mark.parametrize("dream", ["learn guitar", "Learn Guitar!", "  LEARN   guitar...  "])
+def test_normalize_dream_collapses_case_punctuation_and_spacing(dream):
+    assert normalize_dream(dream) == "learn guitar"
+
+
+def test_normalize_dream_keeps_distinct_dreams_apart():
+    assert normalize_dream("run a marathon") != normalize_dream("run a half marathon")
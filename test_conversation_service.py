@@ -0,0 +1,168 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.conversation_service import (
+    append_turn, build_context, open_conversation, summarize_conversation, visible_text
+)
+from app.models import Base, Conversation, Message, User
+
+
+@pytest.fixture
+def database_file(tmp_path):
+    """A file database, so the sync test session and the async summarizer see the same rows"""
+    return tmp_path / "conversations.db"
+
+
+@pytest.fixture
+def session_factory(database_file):
+    engine = create_engine(f"sqlite:///{database_file}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_session_factory(database_file):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{database_file}", poolclass=NullPool)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    session.add(User(id=1, email="talker@example.com"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def stored_conversation(db):
+    conversation = Conversation(user_id=1)
+    db.add(conversation)
+    db.commit()
+    return conversation
+
+
+def add_turns(db, conversation_id, count, size=40):
+    """count user/assistant pairs of roughly size tokens per message"""
+    for turn in range(count):
+        append_turn(db, conversation_id, f"question {turn} " + "q" * size * 4, f"answer {turn} " + "a" * size * 4)
+
+
+def test_visible_text_drops_the_footprints_block():
+    reply = 'Try this. [FOOTPRINTS][{"action": "Walk", "due_time": "Today"}][/FOOTPRINTS]'
+    assert visible_text(reply) == "Try this."
+
+
+def test_first_turn_sends_only_the_message(db):
+    conversation = open_conversation(db, 1)
+    context = build_context(db, conversation)
+    assert context.contents("Hello") == "Hello"
+    assert not context.needs_summary
+    # Nothing is stored until the turn is
+    assert db.query(Conversation).count() == 0
+
+
+def test_first_turn_creates_the_conversation_with_its_messages(db):
+    messages = append_turn(db, None, "Hello", "Hi! [FOOTPRINTS][][/FOOTPRINTS]", user_id=1)
+
+    conversation = db.get(Conversation, messages[0].conversation_id)
+    assert conversation.user_id == 1
+    assert [(m.role, m.content) for m in db.query(Message).order_by(Message.id)] == [("user", "Hello"), ("assistant", "Hi!")]
+    assert open_conversation(db, 1, conversation.id).id == conversation.id
+
+
+def test_open_conversation_checks_the_owner(db):
+    from fastapi import HTTPException
+
+    conversation = stored_conversation(db)
+    assert open_conversation(db, 1, conversation.id).id == conversation.id
+    with pytest.raises(HTTPException) as excinfo:
+        open_conversation(db, 2, conversation.id)
+    assert excinfo.value.status_code == 404
+
+
+def test_context_keeps_the_newest_turns_within_budget(db):
+    conversation = stored_conversation(db)
+    add_turns(db, conversation.id, 10)
+
+    context = build_context(db, conversation, reserve_tokens=10, budget_tokens=200)
+
+    assert context.tokens <= 190
+    assert context.history[0].role == "user"
+    assert context.history[-1].content.startswith("answer 9")
+    assert len(context.history) + len(context.omitted) == 20
+    assert [m.id for m in context.omitted] == sorted(m.id for m in context.omitted)
+    assert context.omitted[-1].id < context.history[0].id
+
+    contents = context.contents("What next?")
+    assert [turn["role"] for turn in contents] == ["user", "model"] * (len(context.history) // 2) + ["user"]
+    assert contents[-1]["parts"] == ["What next?"]
+
+
+def test_summary_leads_the_first_user_turn(db):
+    conversation = stored_conversation(db)
+    add_turns(db, conversation.id, 2, size=5)
+    conversation.summary = "The user is training for a 10k."
+    conversation.summary_tokens = 8
+    db.commit()
+
+    contents = build_context(db, conversation).contents("Ready?")
+
+    assert contents[0]["role"] == "user"
+    assert contents[0]["parts"][0] == "Summary of our conversation so far:\nThe user is training for a 10k."
+    assert len(contents) == 5
+
+
+@pytest.mark.asyncio
+async def test_summarize_folds_old_turns_into_the_summary(db, async_session_factory):
+    conversation = stored_conversation(db)
+    add_turns(db, conversation.id, 30)
+    conversation_id = conversation.id
+
+    generate = AsyncMock(return_value=" Wants to run a 10k. ")
+    with patch("app.conversation_service.AsyncSessionLocal", async_session_factory), \
+         patch("app.conversation_service.generate_text", generate), \
+         patch("app.conversation_service.CHAT_SUMMARY_MIN_TOKENS", 100):
+        assert await summarize_conversation(conversation_id) is True
+
+    prompt = generate.call_args[0][0]
+    assert "User: question 0" in prompt and "Assistant: answer 0" in prompt
+    db.expire_all()
+    conversation = db.get(Conversation, conversation_id)
+    assert conversation.summary == "Wants to run a 10k."
+    assert conversation.summary_tokens > 0
+
+    # The window now starts after the summarized messages and still fits the budget
+    context = build_context(db, conversation)
+    assert context.summary == "Wants to run a 10k."
+    assert all(m.id > conversation.summarized_through_id for m in context.history)
+    assert context.tokens <= 2000
+
+
+@pytest.mark.asyncio
+async def test_summarize_skips_short_conversations_and_survives_errors(db, async_session_factory):
+    conversation = stored_conversation(db)
+    add_turns(db, conversation.id, 2)
+    conversation_id = conversation.id
+
+    generate = AsyncMock(side_effect=RuntimeError("AI service is not configured."))
+    with patch("app.conversation_service.AsyncSessionLocal", async_session_factory), \
+         patch("app.conversation_service.generate_text", generate):
+        assert await summarize_conversation(conversation_id) is False
+        generate.assert_not_called()
+
+        add_turns(db, conversation_id, 40)
+        assert await summarize_conversation(conversation_id) is False
+        generate.assert_called_once()
+
+    db.expire_all()
+    assert db.get(Conversation, conversation_id).summarized_through_id == 0
+    assert db.query(Message).filter(Message.conversation_id == conversation_id).count() == 84
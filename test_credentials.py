@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.credentials import ServiceAccountTokenProvider
+
+
+class FakeCredentials:
+    """Stands in for service_account.Credentials; refresh() sleeps like a network round trip."""
+
+    def __init__(self, token=None, expires_in=None, refresh_delay=0.05):
+        self.token = token
+        self.expiry = datetime.utcnow() + expires_in if expires_in is not None else None
+        self.refresh_delay = refresh_delay
+        self.refresh_calls = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, request):
+        time.sleep(self.refresh_delay)
+        with self._lock:
+            self.refresh_calls += 1
+            self.token = f"token-{self.refresh_calls}"
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_refresh():
+    credentials = FakeCredentials()
+    provider = ServiceAccountTokenProvider(credentials=credentials)
+
+    tokens = await asyncio.gather(*(provider.get_token() for _ in range(20)))
+
+    assert credentials.refresh_calls == 1
+    assert set(tokens) == {"token-1"}
+
+
+@pytest.mark.asyncio
+async def test_valid_token_is_reused_without_refresh():
+    credentials = FakeCredentials(token="cached", expires_in=timedelta(hours=1))
+    provider = ServiceAccountTokenProvider(credentials=credentials)
+
+    assert await provider.get_token() == "cached"
+    assert await provider.get_token() == "cached"
+    assert credentials.refresh_calls == 0
+
+
+@pytest.mark.asyncio
+async def test_token_near_expiry_is_refreshed_in_background():
+    credentials = FakeCredentials(token="old", expires_in=timedelta(minutes=3))
+    provider = ServiceAccountTokenProvider(credentials=credentials)
+
+    # The caller is not blocked: it gets the still-valid token immediately
+    assert await provider.get_token() == "old"
+    await provider._refresh_task
+    assert credentials.refresh_calls == 1
+    assert await provider.get_token() == "token-1"
+
+
+@pytest.mark.asyncio
+async def test_expired_token_blocks_until_refreshed():
+    credentials = FakeCredentials(token="stale", expires_in=timedelta(seconds=10))
+    provider = ServiceAccountTokenProvider(credentials=credentials)
+
+    assert await provider.get_token() == "token-1"
+
+
+@pytest.mark.asyncio
+async def test_refresh_errors_propagate_to_waiting_callers():
+    credentials = FakeCredentials()
+    provider = ServiceAccountTokenProvider(credentials=credentials)
+
+    with patch.object(credentials, "refresh", side_effect=RuntimeError("oauth down")):
+        with pytest.raises(RuntimeError, match="oauth down"):
+            await provider.get_token()
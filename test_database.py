@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import NullPool, StaticPool
+
+from app import database
+
+
+def make_engine(tmp_path, **pool_options):
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    options = database.engine_options(url)
+    options.update(pool_options)
+    engine = create_engine(url, **options)
+    return engine, database.instrument_engine(engine)
+
+
+def test_engine_options_for_postgres(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = database.engine_options("postgresql://db/omeyo")
+    assert options["poolclass"] is database.TimedQueuePool
+    assert options["pool_size"] == database.DB_POOL_SIZE
+    assert options["pool_pre_ping"] == database.DB_POOL_PRE_PING
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+    async_options = database.engine_options("postgresql://db/omeyo", async_driver=True)
+    assert async_options["poolclass"] is database.TimedAsyncQueuePool
+    assert async_options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+
+
+def test_server_pooler_mode_disables_client_pooling(monkeypatch):
+    monkeypatch.setattr(database, "DB_SERVER_POOLER", True)
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = database.engine_options("postgresql://pooler/omeyo")
+    # The timeout is set per transaction instead of as a startup option the pooler rejects
+    assert options == {"poolclass": NullPool}
+    async_options = database.engine_options("postgresql://pooler/omeyo", async_driver=True)
+    assert async_options["poolclass"] is NullPool
+    assert async_options["connect_args"] == {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+
+
+def test_engine_options_for_sqlite():
+    assert database.engine_options("sqlite:///file:omeyo?mode=memory&cache=shared&uri=true")["poolclass"] is StaticPool
+    assert database.engine_options("sqlite:///omeyo.db", async_driver=True) == {"poolclass": NullPool}
+
+
+def test_pool_stats_track_checkouts_overflow_and_timeouts(tmp_path):
+    engine, stats = make_engine(tmp_path, pool_size=1, max_overflow=1, pool_timeout=0.05)
+    first = engine.connect()
+    second = engine.connect()
+    snapshot = database.pool_snapshot(engine.pool, stats)
+    assert snapshot["pool"] == "TimedQueuePool"
+    assert snapshot["checked_out"] == 2
+    assert snapshot["overflow"] == 1
+
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    first.close()
+    second.close()
+
+    snapshot = database.pool_snapshot(engine.pool, stats)
+    assert snapshot["checkouts"] == 2
+    assert snapshot["checked_out"] == 0
+    assert snapshot["timeouts"] == 1
+    assert snapshot["wait_seconds_max"] >= 0.05
+
+
+def test_pool_stats_survive_dispose(tmp_path):
+    engine, stats = make_engine(tmp_path)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    engine.dispose()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    snapshot = database.pool_snapshot(engine.pool, stats)
+    assert snapshot["checkouts"] == 2
+    assert snapshot["wait_seconds_total"] > 0
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.footprint_service import parse_due_time, persist_footprints
+from app.models import Base, Footprint, Path as PathModel
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    session = sessionmaker(bind=engine)()
+    session.statements = statements
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_parse_due_time():
+    today = datetime.now().date()
+    assert parse_due_time("Today") == today
+    assert parse_due_time("tonight") == today
+    assert parse_due_time("Tomorrow") == today + timedelta(days=1)
+    assert parse_due_time("Next week") == today + timedelta(days=7)
+    assert parse_due_time("This month") == today + timedelta(days=30)
+    assert parse_due_time("2030-01-02").isoformat() == "2030-01-02"
+    assert parse_due_time("someday") is None
+    assert parse_due_time(None) is None
+
+
+def test_path_and_footprints_use_one_transaction_and_one_insert(db):
+    commits = []
+    event.listen(db, "after_commit", lambda session: commits.append(session))
+    items = [{"action": f"Step {i}", "due_time": "Today"} for i in range(8)]
+
+    result = persist_footprints(db, 1, items, path={"name": "Learn guitar", "color": "bg-red"})
+
+    assert len(commits) == 1
+    footprint_inserts = [s for s in db.statements if s.startswith("INSERT INTO footprints")]
+    assert len(footprint_inserts) == 1
+    assert not [s for s in db.statements if s.startswith("SELECT")]
+
+    assert result.errors == []
+    assert [fp["priority"] for fp in result.footprints] == list(range(1, 9))
+    assert len({fp["id"] for fp in result.footprints}) == 8
+    stored = db.query(Footprint).filter(Footprint.path_id == result.path["id"]).order_by(Footprint.priority).all()
+    assert [fp.id for fp in stored] == [fp["id"] for fp in result.footprints]
+    assert {fp.path_name for fp in stored} == {"Learn guitar"}
+    assert {fp.path_color for fp in stored} == {"bg-red"}
+
+
+def test_invalid_rows_are_reported_not_skipped(db):
+    items = [
+        {"action": "Valid", "due_time": "Tomorrow"},
+        {"due_time": "Today"},
+        "not an object",
+        {"action": "Bad date", "due_time": "whenever"},
+        {"action": "Bad priority", "priority": "high"},
+    ]
+
+    result = persist_footprints(db, 1, items, path_name="Personal Journey", path_color="bg-blue", priority=None)
+
+    assert [fp["action"] for fp in result.footprints] == ["Valid"]
+    assert [error["index"] for error in result.errors] == [1, 2, 3, 4]
+    assert "missing action" in result.errors[0]["error"]
+    assert result.path is None
+
+
+def test_due_fallback_replaces_unparseable_dates(db):
+    fallback = datetime(2031, 5, 6).date()
+    result = persist_footprints(db, 1, [{"action": "Soon", "due_time": "whenever"}], due_fallback=fallback)
+    assert result.footprints[0]["due_time"] == "2031-05-06"
+    assert result.errors == []
+
+
+def test_failure_rolls_back_the_path(db):
+    event.listen(db.get_bind(), "before_cursor_execute", _fail_footprint_insert)
+    with pytest.raises(RuntimeError):
+        persist_footprints(db, 1, [{"action": "Step", "due_time": "Today"}], path={"name": "Doomed"})
+    event.remove(db.get_bind(), "before_cursor_execute", _fail_footprint_insert)
+    assert db.query(PathModel).count() == 0
+
+
+def _fail_footprint_insert(conn, cursor, statement, *args):
+    if statement.startswith("INSERT INTO footprints"):
+        raise RuntimeError("insert failed")
@@ -0,0 +1,60 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from app import http_client
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = HTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shared_client_reuses_connections(local_server):
+    await http_client.close_http_client()
+    before = http_client.get_http_client_stats()
+
+    await http_client.start_http_client()
+    client = http_client.get_http_client()
+    for _ in range(5):
+        response = await client.post(f"{local_server}/predict", json={"instances": []})
+        assert response.json() == {"ok": True}
+    await http_client.close_http_client()
+
+    after = http_client.get_http_client_stats()
+    assert after["requests"] - before["requests"] == 5
+    assert after["responses"] - before["responses"] == 5
+    assert after["new_connections"] - before["new_connections"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_http_client_is_shared():
+    await http_client.close_http_client()
+    first = http_client.get_http_client()
+    assert http_client.get_http_client() is first
+    await http_client.close_http_client()
+    assert http_client.get_http_client() is not first
+    await http_client.close_http_client()
@@ -0,0 +1,110 @@
+"""
+Query plan audit for the hot list queries: each must be answered through an index
+(SQLite reports SEARCH ... USING INDEX), never by scanning the table or sorting
+the whole result in a temp B-tree.
+"""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select, text, tuple_
+from sqlalchemy.pool import StaticPool
+
+from app.migrations import backfill_ocean_scores, ensure_columns, ensure_indexes, missing_indexes
+from app.models import Base, Footprint, Goal, Path as PathModel, User
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, statement):
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as connection:
+        return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+HOT_QUERIES = {
+    "footprints page": select(Footprint)
+        .where(Footprint.user_id == 1)
+        .order_by(Footprint.due_time, Footprint.id).limit(101),
+    "footprints next page": select(Footprint)
+        .where(Footprint.user_id == 1, tuple_(Footprint.due_time, Footprint.id) > tuple_(date(2030, 1, 1), 5))
+        .order_by(Footprint.due_time, Footprint.id).limit(101),
+    "footprints due today": select(Footprint)
+        .where(Footprint.user_id == 1, Footprint.due_time >= date(2030, 1, 1), Footprint.due_time <= date(2030, 1, 1))
+        .order_by(Footprint.due_time, Footprint.id),
+    "open footprints": select(Footprint)
+        .where(Footprint.user_id == 1, Footprint.is_completed == 0)
+        .order_by(Footprint.due_time),
+    "path footprints": select(Footprint)
+        .where(Footprint.path_id.in_([1, 2, 3]))
+        .order_by(Footprint.path_id, Footprint.priority),
+    "paths page": select(PathModel)
+        .where(PathModel.user_id == 1, tuple_(PathModel.created_at, PathModel.id) > tuple_(datetime(2030, 1, 1), 5))
+        .order_by(PathModel.created_at, PathModel.id).limit(51),
+    "user goals": select(Goal).where(Goal.user_id == 1),
+    "footprint count": select(func.count()).select_from(Footprint).where(Footprint.user_id == 1),
+    "users by coach personality": select(func.count()).select_from(User)
+        .where(User.coach_personality == "Openness"),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_an_index(engine, name):
+    plan = query_plan(engine, HOT_QUERIES[name])
+    assert any(step.startswith("SEARCH") and "INDEX" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_ensure_indexes_adds_missing_indexes(engine):
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_footprints_user_due"))
+        connection.execute(text("DROP INDEX ix_paths_user_created"))
+
+    assert sorted(index.name for index in missing_indexes(engine)) == ["ix_footprints_user_due", "ix_paths_user_created"]
+    # Reporting does not create anything
+    assert len(missing_indexes(engine)) == 2
+    assert sorted(ensure_indexes(engine)) == ["ix_footprints_user_due", "ix_paths_user_created"]
+    assert missing_indexes(engine) == []
+    assert ensure_indexes(engine) == []
+
+
+def test_ocean_scores_migrate_from_legacy_json():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR, "
+                                "password_hash VARCHAR, personality VARCHAR, totem_animal VARCHAR, "
+                                "totem_emoji VARCHAR, totem_title VARCHAR, ocean_scores VARCHAR)"))
+        connection.execute(text(
+            "INSERT INTO users (id, email, ocean_scores) VALUES "
+            "(1, 'a@example.com', '{\"openness\": \"85\", \"neuroticism\": 20}'), "
+            "(2, 'b@example.com', '{\"agreeableness\": 40}'), "
+            "(3, 'c@example.com', 'not json'), "
+            "(4, 'd@example.com', NULL)"
+        ))
+
+    assert ensure_columns(engine) == [
+        "users.openness", "users.conscientiousness", "users.extraversion",
+        "users.agreeableness", "users.neuroticism", "users.coach_personality",
+    ]
+    assert ensure_columns(engine) == []
+    assert "ix_users_coach_personality" in ensure_indexes(engine)
+    assert backfill_ocean_scores(engine, batch_size=2) == 3
+    assert backfill_ocean_scores(engine) == 0
+
+    with engine.connect() as connection:
+        rows = connection.execute(select(
+            User.id, User.openness, User.neuroticism, User.agreeableness, User.coach_personality
+        ).order_by(User.id)).all()
+    assert [tuple(row) for row in rows] == [
+        (1, 85.0, 20.0, None, "Openness"),
+        (2, None, None, 40.0, "Default"),
+        (3, None, None, None, "Default"),
+        (4, None, None, None, None),
+    ]
+    engine.dispose()
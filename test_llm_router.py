@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+
+from app.llm_providers import Completion, StubProvider
+from app.llm_router import ModelRouter
+
+
+def make_attempt(behaviour, calls=None):
+    """attempt(model) that sleeps for behaviour[model] seconds, then returns or raises it"""
+    async def attempt(model):
+        if calls is not None:
+            calls.append(model)
+        delay, outcome = behaviour[model]
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return attempt
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    router = ModelRouter(["backup"], hedge_delay=0.05)
+    calls = []
+    start = time.perf_counter()
+    result = await router.run("test", "primary", make_attempt({"primary": (1.0, "slow"), "backup": (0.01, "fast")}, calls))
+
+    assert result == ("fast", "backup", "hedge")
+    assert time.perf_counter() - start < 0.5
+    assert calls == ["primary", "backup"]
+    stats = router.stats()
+    assert stats["served"] == {"backup": {"hedge": 1}}
+    assert stats["attempts"] == {"primary": {"cancelled": 1}, "backup": {"ok": 1}}
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    router = ModelRouter(["backup"], hedge_delay=0.2)
+    calls = []
+    result = await router.run("test", "primary", make_attempt({"primary": (0.01, "ok"), "backup": (0.01, "no")}, calls))
+    assert result == ("ok", "primary", "primary")
+    assert calls == ["primary"]
+
+
+@pytest.mark.asyncio
+async def test_errors_and_timeouts_fall_back_in_order():
+    router = ModelRouter(["second", "third"], attempt_timeout=0.1)
+    behaviour = {
+        "first": (0.0, RuntimeError("quota exceeded")),
+        "second": (5.0, "too late"),
+        "third": (0.01, "answer"),
+    }
+    calls = []
+    assert await router.run("test", "first", make_attempt(behaviour, calls)) == ("answer", "third", "fallback")
+    assert calls == ["first", "second", "third"]
+    assert router.stats()["attempts"] == {"first": {"error": 1}, "second": {"timeout": 1}, "third": {"ok": 1}}
+
+
+@pytest.mark.asyncio
+async def test_last_error_is_raised_when_every_model_fails():
+    router = ModelRouter(["second"])
+    behaviour = {"first": (0.0, RuntimeError("first down")), "second": (0.0, RuntimeError("second down"))}
+    with pytest.raises(RuntimeError, match="second down"):
+        await router.run("test", "first", make_attempt(behaviour))
+
+
+def test_hedge_delay_follows_the_recent_percentile():
+    router = ModelRouter(hedge_delay=2.0, hedge_percentile=95, min_samples=20)
+    assert ModelRouter().hedge_delay_for("m") is None
+    for i in range(19):
+        router.record_latency("m", 0.1)
+    assert router.hedge_delay_for("m") == 2.0
+    for i in range(81):
+        router.record_latency("m", 0.1 if i < 75 else 0.5)
+    assert router.hedge_delay_for("m") == 0.5
+    assert router.stats()["latency_seconds"]["m"]["p50"] == 0.1
+
+
+class SlowPrimaryProvider(StubProvider):
+    """The stub, with a primary model that takes half a second"""
+
+    def generate(self, prompt, system_instruction=None, model_name=None):
+        if model_name == self.chat_model:
+            time.sleep(0.5)
+        return super().generate(prompt, system_instruction, model_name)
+
+
+@pytest.mark.asyncio
+async def test_model_calls_are_hedged_and_losers_still_timed(monkeypatch):
+    from app import ai_agent
+
+    router = ModelRouter(["fast"], hedge_delay=0.05)
+    monkeypatch.setattr(ai_agent, "model_router", router)
+    previous = ai_agent.set_llm_provider(SlowPrimaryProvider({"responses": [{"text": "Keep going!"}]}))
+    try:
+        start = time.perf_counter()
+        assert await ai_agent.call_gemini_api("hello") == "Keep going!"
+        assert time.perf_counter() - start < 0.4
+        # The losing primary finishes in its pool thread
+        await asyncio.sleep(0.6)
+    finally:
+        ai_agent.set_llm_provider(previous)
+
+    stats = router.stats()
+    assert stats["served"] == {"fast": {"hedge": 1}}
+    assert stats["latency_seconds"]["stub"]["samples"] == 1
+    assert stats["latency_seconds"]["stub"]["p50"] >= 0.5
+
+
+@pytest.mark.asyncio
+async def test_a_call_cancelled_while_queued_never_runs():
+    from app import ai_agent
+
+    ran = []
+    previous_size = ai_agent.LLM_MAX_CONCURRENCY
+    ai_agent.configure_llm_pool(1)
+    try:
+        busy = asyncio.ensure_future(ai_agent.run_in_llm_pool(time.sleep, 0.2))
+        queued = asyncio.ensure_future(ai_agent.run_in_llm_pool(ran.append, "hedge"))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await busy
+        await asyncio.sleep(0.05)
+        stats = ai_agent.get_llm_pool_stats()
+    finally:
+        ai_agent.configure_llm_pool(previous_size)
+
+    assert queued.cancelled()
+    assert ran == []
+    assert stats["queued"] == 0 and stats["in_flight"] == 0 and stats["cancelled"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_stream_falls_back_before_the_first_chunk(monkeypatch):
+    from app import ai_agent
+
+    class BrokenPrimary(StubProvider):
+        def stream(self, prompt, system_instruction=None, model_name=None):
+            if model_name == self.chat_model:
+                raise RuntimeError("model unavailable")
+            yield Completion("from fallback", model_name)
+
+    router = ModelRouter(["fast"])
+    monkeypatch.setattr(ai_agent, "model_router", router)
+    previous = ai_agent.set_llm_provider(BrokenPrimary())
+    try:
+        chunks = [chunk async for chunk in ai_agent.stream_gemini_api("hello")]
+    finally:
+        ai_agent.set_llm_provider(previous)
+
+    assert chunks == ["from fallback"]
+    assert router.stats()["attempts"] == {"stub": {"error": 1}, "fast": {"ok": 1}}
+    assert router.stats()["served"] == {"fast": {"fallback": 1}}
@@ -0,0 +1,94 @@
+import json
+import logging
+import queue
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import logging_config
+from app.logging_config import (
+    JsonFormatter, NonBlockingQueueHandler, RequestIdMiddleware, log_payload, request_id_var
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(logging_config.RequestContextFilter())
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def capture(name):
+    logger = logging.getLogger(name)
+    handler = ListHandler()
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    return logger, handler
+
+
+def test_json_formatter_includes_request_id_and_extras():
+    logger, handler = capture("app.test.json")
+    token = request_id_var.set("req-1")
+    try:
+        logger.info("Saved %d footprints", 3, extra={"user_id": 7})
+    finally:
+        request_id_var.reset(token)
+    entry = json.loads(JsonFormatter().format(handler.records[0]))
+    assert entry["message"] == "Saved 3 footprints"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "req-1"
+    assert entry["user_id"] == 7
+
+
+def test_request_id_middleware_tags_records_and_responses():
+    logger, handler = capture("app.test.middleware")
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        logger.info("pong")
+        return {"ok": True}
+
+    client = TestClient(app)
+    response = client.get("/ping", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["X-Request-ID"] == "abc-123"
+    assert handler.records[-1].request_id == "abc-123"
+
+    # Anything that could break the log line is replaced with a fresh id
+    response = client.get("/ping", headers={"X-Request-ID": "bad id\n"})
+    assert response.headers["X-Request-ID"] != "bad id\n"
+    assert handler.records[-1].request_id == response.headers["X-Request-ID"]
+    assert request_id_var.get() is None
+
+
+def test_payloads_are_sampled_and_truncated(monkeypatch):
+    logger, handler = capture("app.test.payload")
+    monkeypatch.setattr(logging_config, "LOG_PAYLOAD_MAX_CHARS", 10)
+
+    monkeypatch.setattr(logging_config, "LOG_PAYLOAD_SAMPLE_RATE", 0.0)
+    token = logging_config._payload_sampled.set(None)
+    log_payload(logger, "Chat response", response="x" * 100)
+    logging_config._payload_sampled.reset(token)
+    assert handler.records == []
+
+    monkeypatch.setattr(logging_config, "LOG_PAYLOAD_SAMPLE_RATE", 1.0)
+    token = logging_config._payload_sampled.set(None)
+    log_payload(logger, "Chat response", response="x" * 100)
+    logging_config._payload_sampled.reset(token)
+    assert handler.records[0].response == "x" * 10 + "... (100 chars)"
+
+
+def test_queue_handler_drops_records_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger("app.test.queue")
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.warning("first %s", "record")
+    logger.warning("second")
+    assert handler.dropped == 1
+    record = handler.queue.get_nowait()
+    assert record.msg == "first record" and record.args is None
@@ -0,0 +1,65 @@
+import pytest
+
+from app.prompts import (
+    FOOTPRINTS_FORMAT_INSTRUCTIONS, PromptRegistry, chat_persona_prompt, coach_system_prompt,
+    estimate_tokens, prompt_registry
+)
+from app.utils import get_personalized_coach_prompt
+
+
+def test_chat_personas_share_the_footprints_suffix():
+    for persona in ("coach", "mentor", "friend", "therapist"):
+        prompt = chat_persona_prompt(persona)
+        assert prompt.endswith(FOOTPRINTS_FORMAT_INSTRUCTIONS)
+        assert prompt.count("[FOOTPRINTS]") == 2  # the instruction and the example
+    assert chat_persona_prompt("unknown") == chat_persona_prompt("coach")
+    # Static templates are rendered once and reused
+    assert chat_persona_prompt("mentor") is chat_persona_prompt("mentor")
+
+
+def test_coach_prompt_is_memoized_per_profile():
+    totem = {"title": "The Owl", "animal": "Owl"}
+    first = coach_system_prompt("Openness", totem)
+    before = prompt_registry.stats()["coach_prompt_cache"]
+    # Another user with the same profile: the animal is not part of the prompt
+    assert coach_system_prompt("Neuroticism", {"title": "The Owl", "animal": "Fox"}) is first
+    after = prompt_registry.stats()["coach_prompt_cache"]
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+    assert "Title: The Owl" in first
+    assert first.endswith(FOOTPRINTS_FORMAT_INSTRUCTIONS)
+    assert get_personalized_coach_prompt({"openness": 90}, totem) is first
+
+
+def test_coach_prompt_without_totem_uses_the_personality():
+    prompt = get_personalized_coach_prompt({"conscientiousness": 90}, {})
+    assert prompt.startswith("You are an AI coach who is extremely organized")
+    assert get_personalized_coach_prompt({"openness": 90}, None, coach_personality="Conscientiousness") is prompt
+
+
+def test_registry_reports_sizes_and_renders():
+    registry = PromptRegistry()
+    registry.register("greeting", "Hello {name}. ", version="2", footprints=True)
+    registry.register("static", "Be brief.")
+    with pytest.raises(ValueError):
+        registry.register("static", "Be verbose.")
+
+    assert registry.render("greeting", name="Ada") == "Hello Ada. " + FOOTPRINTS_FORMAT_INSTRUCTIONS
+    registry.render("static")
+    registry.render("static")
+
+    templates = registry.stats()["templates"]
+    assert templates["static"] == {
+        "version": "1", "bytes": 9, "tokens": 3, "renders": 2, "rendered_bytes": 18
+    }
+    assert templates["greeting"]["version"] == "2"
+    assert templates["greeting"]["bytes"] == len("Hello {name}. " + FOOTPRINTS_FORMAT_INSTRUCTIONS)
+    assert templates["greeting"]["rendered_bytes"] == len("Hello Ada. " + FOOTPRINTS_FORMAT_INSTRUCTIONS)
+
+
+def test_estimate_tokens_counts_utf8_bytes():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("—") == 1
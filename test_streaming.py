@@ -0,0 +1,72 @@
+from app.streaming import FootprintStreamParser, format_sse
+
+
+def collect(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.close())
+    return events
+
+
+def visible_text(events):
+    return "".join(payload for event, payload in events if event == "text")
+
+
+def test_plain_text_passes_through():
+    parser = FootprintStreamParser()
+    events = collect(parser, ["Hello ", "there, ", "keep going!"])
+    assert visible_text(events) == "Hello there, keep going!"
+    assert parser.footprints == []
+
+
+def test_footprint_block_is_hidden_and_parsed():
+    parser = FootprintStreamParser()
+    response = (
+        "Start small today.\n"
+        "[FOOTPRINTS]\n[\n  {\"action\": \"Drink a glass of water\", \"due_time\": \"Today\"}\n]\n[/FOOTPRINTS]"
+        " You got this."
+    )
+    events = collect(parser, [response])
+    assert visible_text(events) == "Start small today.\n You got this."
+    footprint_events = [payload for event, payload in events if event == "footprints"]
+    assert footprint_events == [[{"action": "Drink a glass of water", "due_time": "Today"}]]
+
+
+def test_tags_split_across_chunks():
+    parser = FootprintStreamParser()
+    response = "Try this: [FOOTPRINTS][{\"action\": \"Stretch\", \"due_time\": \"Tomorrow\"}][/FOOTPRINTS]"
+    # Feed one character at a time so every tag boundary is split
+    events = collect(parser, list(response))
+    assert visible_text(events) == "Try this: "
+    assert parser.footprints == [{"action": "Stretch", "due_time": "Tomorrow"}]
+
+
+def test_text_resembling_a_tag_is_released():
+    parser = FootprintStreamParser()
+    events = collect(parser, ["Use [FOOT", "NOTES] for refs ["])
+    assert visible_text(events) == "Use [FOOTNOTES] for refs ["
+
+
+def test_invalid_json_and_unterminated_block_are_reported():
+    parser = FootprintStreamParser()
+    events = collect(parser, ["A [FOOTPRINTS]not json[/FOOTPRINTS] B [FOOTPRINTS][{\"action\""])
+    assert visible_text(events) == "A  B "
+    assert parser.footprints == []
+    assert len(parser.errors) == 2
+
+
+
+def test_footprint_blocks_that_are_not_lists_are_reported():
+    parser = FootprintStreamParser()
+    events = collect(parser, ["A [FOOTPRINTS]5[/FOOTPRINTS] B [FOOTPRINTS]\"walk\"[/FOOTPRINTS] C"])
+    assert visible_text(events) == "A  B  C"
+    assert [event for event, _ in events if event == "footprints"] == []
+    assert parser.footprints == []
+    assert parser.errors == [
+        "Footprints block is a JSON int, expected a list",
+        "Footprints block is a JSON str, expected a list",
+    ]
+
+def test_format_sse():
+    assert format_sse("token", {"text": "hi"}) == 'event: token\ndata: {"text": "hi"}\n\n'
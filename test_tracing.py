@@ -0,0 +1,89 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from sqlalchemy import create_engine, text
+
+from app import tracing
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemorySpanExporter()
+    tracing.configure_tracing(exporter, batch=False)
+    yield exporter
+    tracing.shutdown_tracing()
+
+
+def test_tracing_is_off_by_default():
+    assert tracing.configure_tracing() is False
+    assert not tracing.tracing_enabled()
+    with tracing.start_span("ignored") as span:
+        assert not span.is_recording()
+
+
+def test_query_spans_record_statements_and_failures(exporter, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'trace.db'}")
+    tracing.trace_engine(engine)
+    with tracing.start_span("request"):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            with pytest.raises(Exception):
+                connection.execute(text("SELECT * FROM missing_table"))
+
+    spans = {span.name: span for span in exporter.get_finished_spans() if span.name != "db.query"}
+    queries = [span for span in exporter.get_finished_spans() if span.name == "db.query"]
+    assert [span.attributes["db.statement"] for span in queries] == ["SELECT 1", "SELECT * FROM missing_table"]
+    assert all(span.parent.span_id == spans["request"].context.span_id for span in queries)
+    assert queries[0].status.is_ok
+    assert queries[1].status.status_code.name == "ERROR"
+
+
+@pytest.mark.asyncio
+async def test_model_calls_on_the_llm_pool_join_the_request_trace(exporter):
+    from app.ai_agent import call_gemini_api
+
+    mock_model = MagicMock()
+    mock_model.generate_content.return_value = MagicMock(
+        text="ok", usage_metadata=MagicMock(prompt_token_count=7, candidates_token_count=3)
+    )
+    with patch("app.ai_agent.model", mock_model):
+        with tracing.start_span("request") as parent:
+            assert await call_gemini_api("hello") == "ok"
+
+    generate = next(span for span in exporter.get_finished_spans() if span.name == "gemini.generate")
+    assert generate.parent.span_id == parent.get_span_context().span_id
+    assert generate.attributes["gen_ai.usage.input_tokens"] == 7
+    assert generate.attributes["gen_ai.usage.output_tokens"] == 3
+
+
+def test_file_exporter_writes_one_span_per_line(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure_tracing(tracing.JsonLinesSpanExporter(str(path)), batch=False)
+    try:
+        with tracing.start_span("outer"):
+            with tracing.start_span("inner", stage="parse"):
+                pass
+    finally:
+        tracing.shutdown_tracing()
+
+    inner, outer = [json.loads(line) for line in path.read_text().splitlines()]
+    assert inner["name"] == "inner" and inner["attributes"] == {"stage": "parse"}
+    assert inner["parent_span_id"] == outer["span_id"]
+    assert inner["trace_id"] == outer["trace_id"]
+    assert outer["parent_span_id"] is None
+    assert outer["duration_ms"] >= inner["duration_ms"]
+
+
+def test_untrace_engine_removes_the_query_listeners(exporter, tmp_path):
+    from sqlalchemy import event
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'trace.db'}")
+    tracing.trace_engine(engine)
+    tracing.trace_engine(engine)
+    tracing.untrace_engine(engine)
+    assert not event.contains(engine, "before_cursor_execute", tracing._start_query_span)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert [span for span in exporter.get_finished_spans() if span.name == "db.query"] == []